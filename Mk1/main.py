@@ -3,11 +3,21 @@ import numpy as np
 import cv2
 import math
 import random
-import subprocess
-import tempfile
 import os
-import wave
-import struct
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from musicvis.audio import load_audio, stream_audio, AudioDecodeError
+from musicvis.beats import detect_beats_tempo, detect_beats_adaptive, detect_beats_adaptive_coarse
+from musicvis.features import BandEnergies, ChunkFeatureStream, normalize_peak, normalize_percentile
+from musicvis.feature_store import add_feature_arguments, feature_store_from_args, resolve_features
+from musicvis.parallel import chunk_features, resolve_workers
+from musicvis.pipeline import PIPELINE_BLOCK_SECONDS, PipelinedFeatures, frame_aligned_rate
+from musicvis.pcm_cache import add_cache_arguments, cache_from_args
+from musicvis.probe import probe_media, ProbeError
+from musicvis.render import Gauge, GradientBackground, HudLayer, RotationCache, TextCache
+from musicvis.timeline import FeatureTimeline
 
 # === Enhanced Endless Platformer with Dynamic Animations ===
 # New features:
@@ -25,6 +35,17 @@ WIDTH, HEIGHT = 768, 768
 FPS = 60
 BACKGROUND_COLOR = (15, 15, 25)  # Darker, more cinematic background
 
+# Audio analysis settings; all of them are part of the feature store key
+FEATURE_VERSION = 1  # Bump whenever the analysis output changes
+BEAT_WINDOW = 20
+BEAT_THRESHOLD = 0.3
+MIN_BEAT_GAP = 6
+
+# Robot size, and the angular resolution of its pre-rotated flip sprites
+ROBOT_WIDTH, ROBOT_HEIGHT = 40, 50
+FLIP_ROTATION_STEP = 2.0  # Degrees; smaller turns more smoothly but bakes more sprites
+FLIP_SPRITE_MARGIN = 12  # Room around the body for the eyes
+
 # Robot colors
 ROBOT_ORANGE = (255, 165, 0)
 ROBOT_DARK_ORANGE = (255, 140, 0)
@@ -143,12 +164,40 @@ class Coin:
             # Inner highlight
             pygame.draw.circle(screen, COIN_YELLOW, (int(draw_x - 3), int(draw_y - 3)), max(1, size // 3))
 
+def draw_robot_body(surface, body_rect, body_color, left_eye, right_eye, look):
+    """Body, eye whites and pupils; look is (eye_size, pupil_size, pupil_offset_x, pupil_offset_y)"""
+    eye_size, pupil_size, pupil_offset_x, pupil_offset_y = look
+    pygame.draw.rect(surface, body_color, body_rect, border_radius=8)
+    pygame.draw.rect(surface, ROBOT_DARK_ORANGE, body_rect, 3, border_radius=8)
+    
+    pygame.draw.circle(surface, (255, 255, 255), left_eye, eye_size)
+    pygame.draw.circle(surface, (255, 255, 255), right_eye, eye_size)
+    pygame.draw.circle(surface, (0, 0, 0), 
+                     (left_eye[0] + pupil_offset_x, left_eye[1] + pupil_offset_y), pupil_size)
+    pygame.draw.circle(surface, (0, 0, 0), 
+                     (right_eye[0] + pupil_offset_x, right_eye[1] + pupil_offset_y), pupil_size)
+
+def render_upright_robot(key):
+    """The upright robot for flip sprites, with its body's center as origin.
+
+    key is ((body_width, body_height), body_color, left_eye, right_eye, look)
+    with the eyes relative to the body's top left corner.
+    """
+    (body_width, body_height), body_color, left_eye, right_eye, look = key
+    margin = FLIP_SPRITE_MARGIN
+    sprite = pygame.Surface((body_width + 2 * margin, body_height + 2 * margin), pygame.SRCALPHA)
+    body_rect = pygame.Rect(margin, margin, body_width, body_height)
+    draw_robot_body(sprite, body_rect, body_color,
+                    (margin + left_eye[0], margin + left_eye[1]),
+                    (margin + right_eye[0], margin + right_eye[1]), look)
+    return sprite, body_rect.center
+
 class Robot:
-    def __init__(self, x, y):
+    def __init__(self, x, y, rotation_step=FLIP_ROTATION_STEP):
         self.x = x
         self.y = y
-        self.width = 40
-        self.height = 50
+        self.width = ROBOT_WIDTH
+        self.height = ROBOT_HEIGHT
         self.vel_x = 0
         self.vel_y = 0
         self.on_ground = False
@@ -160,6 +209,7 @@ class Robot:
         self.flip_rotation = 0  # For spinning jumps
         self.flip_speed = 0
         self.is_flipping = False
+        self.flip_sprites = RotationCache(render_upright_robot, rotation_step)
         
         # Dance move states
         self.dance_state = "normal"  # normal, head_bob, arm_swing, shoulder_shrug
@@ -190,7 +240,8 @@ class Robot:
         # Particle trail system
         self.trail_particles = []
         
-    def update(self, platforms, coins, particles, audio_energy, beat_detected, frame_num):
+    def update(self, platforms, coins, particles, audio_energy, beat_detected, frame_num, bands=None):
+        # bands: optional (bass, mid, treble) levels in [0, 1] for this frame
         # Handle jump buffering and coyote time
         if self.on_ground:
             self.coyote_timer = 10
@@ -231,6 +282,8 @@ class Robot:
                 
                 # Jump strength based on audio energy and distance
                 base_jump = 15 + audio_energy * 10
+                if bands is not None:
+                    base_jump += bands[0] * 6  # Bass hits launch higher
                 if distance_y < -100:  # Platform is higher
                     jump_strength = base_jump + 8
                 else:
@@ -400,6 +453,10 @@ class Robot:
             self.on_ground = True
             self.landing_animation = 10
         
+        # Treble-heavy frames keep a faint glow around the robot
+        if bands is not None and bands[2] > 0.7:
+            self.glow_intensity = max(self.glow_intensity, int(bands[2] * 12))
+        
         # Decay effects
         if self.speed_boost > 0:
             self.speed_boost -= 0.03
@@ -525,6 +582,16 @@ class Robot:
         self.flip_rotation = 0
         self.flip_speed = 0
     
+    def draw_body(self, screen, body_rect, body_color, left_eye, right_eye, look):
+        if self.is_flipping or self.flip_rotation != 0:
+            # Mid-flip: one blit of the squashed robot turned to the nearest cached angle
+            key = (body_rect.size, body_color,
+                   (left_eye[0] - body_rect.x, left_eye[1] - body_rect.y),
+                   (right_eye[0] - body_rect.x, right_eye[1] - body_rect.y), look)
+            self.flip_sprites.draw(screen, key, self.flip_rotation, body_rect.center)
+        else:
+            draw_robot_body(screen, body_rect, body_color, left_eye, right_eye, look)
+    
     def draw(self, screen, camera_x):
         draw_x = self.x - camera_x
         
@@ -560,9 +627,8 @@ class Robot:
             swing_amount = math.sin(self.animation_frame * 0.5) * self.dance_intensity * 2
             body_x_offset = int(swing_amount)
         
-        # Handle flip rotation
+        # Squash the body with the flip
         if self.is_flipping or self.flip_rotation != 0:
-            # Draw rotated robot (simplified - just flip the drawing)
             flip_factor = math.sin(math.radians(self.flip_rotation))
             body_height = max(10, int(self.height * abs(math.cos(math.radians(self.flip_rotation)))))
             body_width = int(self.width * (1 + abs(flip_factor) * 0.5))
@@ -575,9 +641,6 @@ class Robot:
         if self.dance_state != "normal":
             body_color = tuple(min(255, c + 20) for c in ROBOT_ORANGE)
         
-        pygame.draw.rect(screen, body_color, body_rect, border_radius=8)
-        pygame.draw.rect(screen, ROBOT_DARK_ORANGE, body_rect, 3, border_radius=8)
-        
         # Enhanced eyes with expressions
         eye_size = 8
         eye_y_offset = 0
@@ -607,9 +670,6 @@ class Robot:
         left_eye = (draw_x + body_x_offset + 10, body_y + 12 + eye_y_offset)
         right_eye = (draw_x + body_x_offset + body_width - 18, body_y + 12 + eye_y_offset)
         
-        pygame.draw.circle(screen, (255, 255, 255), left_eye, eye_size)
-        pygame.draw.circle(screen, (255, 255, 255), right_eye, eye_size)
-        
         # Enhanced pupil direction and expression
         pupil_offset_x = 0
         pupil_offset_y = 0
@@ -621,10 +681,8 @@ class Robot:
         elif self.expression == "surprised":
             pupil_offset_y = -1
         
-        pygame.draw.circle(screen, (0, 0, 0), 
-                         (left_eye[0] + pupil_offset_x, left_eye[1] + pupil_offset_y), pupil_size)
-        pygame.draw.circle(screen, (0, 0, 0), 
-                         (right_eye[0] + pupil_offset_x, right_eye[1] + pupil_offset_y), pupil_size)
+        look = (eye_size, pupil_size, pupil_offset_x, pupil_offset_y)
+        self.draw_body(screen, body_rect, body_color, left_eye, right_eye, look)
         
         # Enhanced running animation with dance moves
         if self.on_ground:
@@ -684,17 +742,8 @@ class Robot:
                     pygame.draw.rect(screen, trail_color, 
                                    (trail_x, trail_y, trail_width, trail_height), border_radius=1)
             
-            # Redraw robot on top of trail
-            pygame.draw.rect(screen, body_color, body_rect, border_radius=8)
-            pygame.draw.rect(screen, ROBOT_DARK_ORANGE, body_rect, 3, border_radius=8)
-            
-            # Redraw eyes on top
-            pygame.draw.circle(screen, (255, 255, 255), left_eye, eye_size)
-            pygame.draw.circle(screen, (255, 255, 255), right_eye, eye_size)
-            pygame.draw.circle(screen, (0, 0, 0), 
-                             (left_eye[0] + pupil_offset_x, left_eye[1] + pupil_offset_y), pupil_size)
-            pygame.draw.circle(screen, (0, 0, 0), 
-                             (right_eye[0] + pupil_offset_x, right_eye[1] + pupil_offset_y), pupil_size)
+            # Redraw robot and eyes on top of trail
+            self.draw_body(screen, body_rect, body_color, left_eye, right_eye, look)
             
             # Air trick visual effects
             if self.air_trick == "spin":
@@ -867,6 +916,7 @@ class PlatformGenerator:
         self.platforms = []
         self.coins = []
         self.last_platform_x = 0
+        self.bands = None
         self.generate_initial_platforms()
     
     def generate_initial_platforms(self):
@@ -884,12 +934,17 @@ class PlatformGenerator:
         height = random.randint(10, 50)
         y = random.randint(HEIGHT - 500, HEIGHT - 150)
         
+        # Heavy bass makes bounce platforms more likely
+        bounce_cutoff = 0.35
+        if self.bands is not None:
+            bounce_cutoff += self.bands[0] * 0.15
+        
         # Enhanced platform type distribution
         platform_type = random.random()
         if platform_type < 0.25:  # Increased special platform chance
             special = True
             bounce = False
-        elif platform_type < 0.35:  # Increased bounce platform chance
+        elif platform_type < bounce_cutoff:  # Increased bounce platform chance
             special = False
             bounce = True
         else:
@@ -899,8 +954,13 @@ class PlatformGenerator:
         platform = Platform(self.last_platform_x + gap, y, width, height, special, bounce)
         self.platforms.append(platform)
         
+        # Bright treble-heavy passages scatter more coins
+        coin_cutoff = 0.7
+        if self.bands is not None:
+            coin_cutoff += self.bands[2] * 0.2
+        
         # Enhanced coin placement with patterns
-        if random.random() < 0.7:  # Increased coin chance
+        if random.random() < coin_cutoff:  # Increased coin chance
             coin_count = random.randint(1, 4)  # More coins possible
             
             # Different coin patterns
@@ -942,7 +1002,10 @@ class PlatformGenerator:
         
         self.last_platform_x = platform.x + platform.width
     
-    def update(self, camera_x):
+    def update(self, camera_x, bands=None):
+        # Current (bass, mid, treble) levels shape the platforms generated next
+        self.bands = bands
+        
         # Remove old platforms and coins
         self.platforms = [p for p in self.platforms if p.x + p.width > camera_x - 200]
         self.coins = [c for c in self.coins if c.x > camera_x - 200]
@@ -963,192 +1026,271 @@ class PlatformGenerator:
     def get_coins(self):
         return self.coins
 
-def extract_audio_with_ffmpeg(video_path):
-    """Extract audio from video using ffmpeg and return raw audio data"""
-    print("Extracting audio from video...")
+class Hud:
+    """Score, combo and move labels plus the energy gauge.
+
+    Fonts load once, text goes through a TextCache, and the label layout is
+    only rebuilt when a value it shows changes.
+    """
+    EXPRESSIONS = {"excited": "😄", "surprised": "😲", "focused": "😤"}
     
-    # Create temporary WAV file
-    temp_wav = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
-    temp_wav.close()
+    def __init__(self):
+        font_size = 24
+        if hasattr(pygame.font, 'Font'):
+            self.font = pygame.font.Font(None, font_size)
+        else:
+            self.font = pygame.font.SysFont('Arial', font_size)
+        self.dance_font = pygame.font.Font(None, 20)
+        self.trick_font = pygame.font.Font(None, 18)
+        self.expr_font = pygame.font.Font(None, 16)
+        self.text = TextCache()
+        self.layer = HudLayer()
+        
+        # Energy gauge: dark track with a green-to-red gradient fill
+        track = pygame.Surface((100, 12))
+        track.fill((60, 60, 60))
+        fill = pygame.Surface((100, 8))
+        for i in range(100):
+            fill_color_intensity = int(255 * (i / 100))
+            fill.fill((fill_color_intensity, 255 - fill_color_intensity//2, 100), (i, 0, 1, 8))
+        self.energy_gauge = Gauge(track, fill, 100, fill_offset=(2, 2))
     
-    try:
-        # Use ffmpeg to extract audio as WAV
-        cmd = [
-            'ffmpeg', '-i', video_path, 
-            '-vn', '-acodec', 'pcm_s16le', 
-            '-ar', '22050', '-ac', '1', 
-            '-y', temp_wav.name
+    def state(self, robot):
+        """The values the labels show"""
+        combo = robot.combo_multiplier
+        return (
+            robot.coins_collected,
+            f"{combo:.1f}" if combo > 1.1 else None,
+            combo > 2.0,
+            min(255, int(robot.speed_boost * 30)) if robot.speed_boost > 1 else None,
+            robot.dance_state if robot.dance_state != "normal" else None,
+            robot.air_trick if robot.air_trick and robot.air_trick_timer > 0 else None,
+            robot.expression if robot.expression != "normal" and robot.expression_timer > 10 else None
+        )
+    
+    def build(self, coins, combo, combo_high, boost_intensity, dance_state, air_trick, expression):
+        render = self.text.render
+        # Coins collected counter with a shadow
+        blits = [
+            (render(self.font, f"Coins: {coins}", (100, 70, 0)), (12, 12)),
+            (render(self.font, f"Coins: {coins}", COIN_GOLD), (10, 10))
         ]
         
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        if result.returncode != 0:
-            print(f"FFmpeg error: {result.stderr}")
-            # Fallback to simpler command
-            cmd = ['ffmpeg', '-i', video_path, '-vn', '-y', temp_wav.name]
-            subprocess.run(cmd, capture_output=True)
-        
-        # Read WAV file
-        with wave.open(temp_wav.name, 'rb') as wav_file:
-            frames = wav_file.getnframes()
-            sample_rate = wav_file.getframerate()
-            duration = frames / sample_rate
-            
-            # Read audio data
-            raw_audio = wav_file.readframes(frames)
-            audio_data = np.frombuffer(raw_audio, dtype=np.int16).astype(np.float32)
-            audio_data = audio_data / 32768.0  # Normalize to [-1, 1]
+        # Enhanced combo multiplier display
+        if combo is not None:
+            combo_color = ROBOT_HIGHLIGHT if combo_high else (255, 200, 100)
+            blits.append((render(self.font, f"Combo: {combo}x", (80, 60, 0)), (12, 42)))
+            blits.append((render(self.font, f"Combo: {combo}x", combo_color), (10, 40)))
         
+        # Enhanced speed boost indicator
+        if boost_intensity is not None:
+            speed_color = (255, boost_intensity, boost_intensity // 2)
+            blits.append((render(self.font, "Speed Boost!", speed_color), (10, 70)))
+        
+        # Dance move indicator
+        if dance_state is not None:
+            blits.append((render(self.dance_font, f"♪ {dance_state.replace('_', ' ').title()} ♪",
+                                 ROBOT_HIGHLIGHT), (10, 100)))
+        
+        # Air trick indicator
+        if air_trick is not None:
+            trick_name = air_trick.replace('_', ' ').title()
+            blits.append((render(self.trick_font, f"✦ {trick_name} ✦", (255, 255, 255)), (WIDTH - 150, 80)))
+        
+        # Expression indicator (subtle)
+        if expression in self.EXPRESSIONS:
+            blits.append((render(self.expr_font, self.EXPRESSIONS[expression], (255, 255, 255)),
+                          (WIDTH - 200, 50)))
+        return blits
+    
+    def draw(self, screen, robot):
+        self.layer.update(self.state(robot), self.build)
+        self.layer.draw(screen)
+
+def extract_audio_with_ffmpeg(video_path, duration_hint=None, cache=None):
+    """Extract audio from video by streaming ffmpeg's PCM output into memory"""
+    print("Extracting audio from video...")
+    
+    try:
+        try:
+            audio_data, sample_rate = load_audio(video_path, 22050, cache=cache,
+                                                 expected_duration=duration_hint)
+        except AudioDecodeError as e:
+            print(f"FFmpeg error: {e}")
+            # Fallback to a more tolerant decode
+            audio_data, sample_rate = load_audio(video_path, 22050, cache=cache, tolerant=True)
+        
+        duration = len(audio_data) / sample_rate
         return audio_data, sample_rate, duration
     
     except Exception as e:
         print(f"Error extracting audio: {e}")
         # Return dummy data if extraction fails
         return np.array([0.0] * 22050), 22050, 1.0
-    
-    finally:
-        # Clean up temp file
-        if os.path.exists(temp_wav.name):
-            os.unlink(temp_wav.name)
 
 def get_video_duration(video_path):
-    """Get video duration using ffprobe"""
+    """Get video duration from the shared ffprobe media info"""
     try:
-        cmd = [
-            'ffprobe', '-v', 'quiet', '-show_entries', 
-            'format=duration', '-of', 'csv=p=0', video_path
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        return float(result.stdout.strip())
-    except:
-        return 10.0  # Default fallback
+        duration = probe_media(video_path).duration
+        if duration:
+            return duration
+    except ProbeError:
+        pass
+    return 10.0  # Default fallback
+
+def generate_synthetic_features(duration):
+    """Musical-looking synthetic energy and beats for when there is no usable audio"""
+    # Generate more sophisticated synthetic features
+    total_frames = int(duration * FPS)
+    energy_values = []
+    beats = []
+    
+    for i in range(total_frames):
+        # Create more musical synthetic energy pattern
+        t = i / FPS
+        # Base rhythm
+        energy = 0.4 + 0.3 * math.sin(t * 2 * math.pi * 2)  # 2 Hz base
+        # Add higher frequency components
+        energy += 0.2 * math.sin(t * 2 * math.pi * 4)  # 4 Hz
+        energy += 0.1 * math.sin(t * 2 * math.pi * 8)  # 8 Hz
+        # Add some randomness
+        energy += 0.1 * random.random()
+        energy_values.append(max(0, min(1, energy)))
+        
+        # Add beats with musical timing (roughly 120 BPM)
+        if i % 30 == 0 and random.random() > 0.2:  # Every 0.5 seconds
+            beats.append(i)
+        # Add some off-beat elements
+        elif i % 45 == 0 and random.random() > 0.6:
+            beats.append(i)
+    
+    return energy_values, beats, duration, None
 
-def extract_audio_features(video_path):
+def extract_audio_features(video_path, cache=None, streaming=False, beat_source='peaks', workers=1):
     """Extract audio from video and compute energy features with enhanced beat detection"""
     
     # Get video duration
     duration = get_video_duration(video_path)
     
+    if streaming:
+        # Bounded-memory analysis for long inputs
+        try:
+            energy_values, spectral_values, bands, audio_duration = stream_audio_features(video_path, cache)
+            return finish_audio_features(energy_values, spectral_values, min(duration, audio_duration), bands,
+                                         beat_source)
+        except AudioDecodeError as e:
+            print(f"Streaming decode failed, falling back to a full decode: {e}")
+    
     # Try to extract audio
     try:
-        audio_data, sample_rate, audio_duration = extract_audio_with_ffmpeg(video_path)
+        audio_data, sample_rate, audio_duration = extract_audio_with_ffmpeg(video_path, duration, cache)
         duration = min(duration, audio_duration)
     except Exception as e:
         print(f"Audio extraction failed: {e}")
         print("Using enhanced synthetic audio features based on video duration...")
-        # Generate more sophisticated synthetic features
-        total_frames = int(duration * FPS)
-        energy_values = []
-        beats = []
-        
-        for i in range(total_frames):
-            # Create more musical synthetic energy pattern
-            t = i / FPS
-            # Base rhythm
-            energy = 0.4 + 0.3 * math.sin(t * 2 * math.pi * 2)  # 2 Hz base
-            # Add higher frequency components
-            energy += 0.2 * math.sin(t * 2 * math.pi * 4)  # 4 Hz
-            energy += 0.1 * math.sin(t * 2 * math.pi * 8)  # 8 Hz
-            # Add some randomness
-            energy += 0.1 * random.random()
-            energy_values.append(max(0, min(1, energy)))
-            
-            # Add beats with musical timing (roughly 120 BPM)
-            if i % 30 == 0 and random.random() > 0.2:  # Every 0.5 seconds
-                beats.append(i)
-            # Add some off-beat elements
-            elif i % 45 == 0 and random.random() > 0.6:
-                beats.append(i)
-        
-        return energy_values, beats, duration
-    
-    # Enhanced audio processing
-    chunk_size = max(1, sample_rate // FPS)
-    energy_values = []
-    spectral_values = []
+        return generate_synthetic_features(duration)
     
-    # Apply simple high-pass filter to emphasize beats
-    if len(audio_data) > 1:
-        audio_data = np.diff(audio_data, prepend=audio_data[0])
+    energy_values, spectral_values, bands = compute_audio_features(audio_data, sample_rate, workers)
+    return finish_audio_features(energy_values, spectral_values, duration, bands, beat_source)
+
+def compute_audio_features(audio_data, sample_rate, workers=1):
+    """Raw per-frame energy, spectral novelty and band energies of a decoded signal"""
+    if workers > 1:
+        # Same features, with time segments spread over a process pool
+        return chunk_features(audio_data, max(1, sample_rate // FPS), sample_rate, workers)
+    stream = ChunkFeatureStream(max(1, sample_rate // FPS), sample_rate=sample_rate)
+    stream.push(audio_data)
+    energy_values, spectral_values = stream.finish()
+    return energy_values, spectral_values, stream.band_energies()
+
+def stream_audio_features(video_path, cache=None, sample_rate=22050):
+    """Compute the raw features block by block without holding the whole track.
+
+    Memory stays flat however long the input is: only one decoded block and
+    the per-frame feature arrays are resident.
+    """
+    stream = ChunkFeatureStream(max(1, sample_rate // FPS), sample_rate=sample_rate)
+    for block in stream_audio(video_path, sample_rate, cache=cache):
+        stream.push(block)
+    energy_values, spectral_values = stream.finish()
+    return energy_values, spectral_values, stream.band_energies(), stream.samples / sample_rate
+
+def finish_audio_features(energy_values, spectral_values, duration, bands=None, beat_source='peaks'):
+    """Normalize the raw features and detect beats"""
+    # Use percentile-based normalization to avoid outliers
+    energy_values = normalize_percentile(energy_values, 95)
+    spectral_values = normalize_peak(spectral_values)
     
-    for i in range(0, len(audio_data), chunk_size):
-        chunk = audio_data[i:i+chunk_size]
-        if len(chunk) > 0:
-            # Enhanced RMS energy calculation
-            energy = np.sqrt(np.mean(chunk**2))
-            
-            # Add peak detection within chunk
-            if len(chunk) > 10:
-                peaks = np.where(np.abs(chunk) > np.std(chunk) * 2)[0]
-                if len(peaks) > 0:
-                    energy *= 1.3  # Boost energy for chunks with peaks
-            
-            energy_values.append(energy)
-            
-            # Enhanced spectral analysis
-            if len(chunk) > 1:
-                # Simple measure of spectral change/novelty
-                spectral = np.mean(np.abs(np.diff(chunk)))
-                spectral_values.append(spectral)
-            else:
-                spectral_values.append(0)
+    if beat_source == 'tempo':
+        bpm, beats = detect_beats_tempo(energy_values, FPS, bands)
+        print(f"Tempo estimate: {bpm:.1f} BPM")
+    elif beat_source == 'coarse':
+        beats = detect_beats_adaptive_coarse(energy_values, spectral_values, duration,
+                                             BEAT_WINDOW, BEAT_THRESHOLD, MIN_BEAT_GAP)
+    else:
+        beats = detect_beats_adaptive(energy_values, spectral_values, duration,
+                                      BEAT_WINDOW, BEAT_THRESHOLD, MIN_BEAT_GAP)
     
-    # Normalize values with better scaling
-    if energy_values:
-        # Use percentile-based normalization to avoid outliers
-        p95 = np.percentile(energy_values, 95)
-        energy_values = [min(1.0, e / p95) for e in energy_values]
+    print(f"Detected {len(beats)} beats in {duration:.1f} seconds ({len(beats)/duration:.1f} BPS)")
+    return energy_values, beats, duration, bands.normalized() if bands is not None else None
+
+def analyze_audio(video_path, cache=None, streaming=False, beat_source='peaks', workers=1, store=None,
+                  features_file=None, analyze_only=False):
+    """extract_audio_features through the feature store, or from a saved feature file"""
+    def analyze():
+        energy_values, beats, duration, bands = extract_audio_features(video_path, cache, streaming,
+                                                                       beat_source, workers)
+        features = {'energy': np.asarray(energy_values), 'beats': np.asarray(beats, dtype=np.int64),
+                    'duration': duration}
+        if bands is not None:
+            features['band_energy'] = bands.energy
+            features['band_onset'] = bands.onset
+        # Synthetic fallback features (no usable audio) are not worth keeping
+        return features, bands is not None
     
-    if spectral_values:
-        max_spectral = max(spectral_values) if spectral_values else 1
-        if max_spectral > 0:
-            spectral_values = [s / max_spectral for s in spectral_values]
+    params = {'fps': FPS, 'sample_rate': 22050, 'beat_source': beat_source, 'beat_window': BEAT_WINDOW,
+              'beat_threshold': BEAT_THRESHOLD, 'min_beat_gap': MIN_BEAT_GAP}
+    features = resolve_features(video_path, 'mk1', FEATURE_VERSION, params, analyze, store,
+                                features_file, analyze_only)
+    bands = None
+    if 'band_energy' in features:
+        bands = BandEnergies(features['band_energy'], features['band_onset'])
+    return features['energy'], features['beats'].tolist(), features['duration'], bands
+
+def pipelined_features(video_path, cache=None):
+    """Video duration and a PipelinedFeatures timeline that fills in while rendering"""
+    duration = get_video_duration(video_path)
+    sample_rate = frame_aligned_rate(22050, FPS)
+    blocks = stream_audio(video_path, sample_rate, cache=cache, block_seconds=PIPELINE_BLOCK_SECONDS)
     
-    # Much enhanced beat detection
-    beats = []
-    if len(energy_values) > 4:
-        # Adaptive threshold based on local energy
-        window_size = 20
-        beat_threshold = 0.3
-        min_beat_gap = 6  # Reduced for more responsive beats
-        
-        for i in range(window_size, len(energy_values) - window_size):
-            local_window = energy_values[max(0, i-window_size):min(len(energy_values), i+window_size)]
-            local_mean = np.mean(local_window)
-            local_std = np.std(local_window)
-            
-            # Adaptive threshold
-            threshold = max(beat_threshold, local_mean + local_std * 0.5)
-            
-            # Peak detection with multiple criteria
-            is_peak = (energy_values[i] > threshold and 
-                      energy_values[i] > energy_values[i-1] and 
-                      energy_values[i] > energy_values[i+1])
-            
-            # Additional spectral novelty check
-            if i < len(spectral_values) and spectral_values[i] > 0.6:
-                is_peak = is_peak or energy_values[i] > local_mean * 1.2
-            
-            if is_peak:
-                # Check minimum gap
-                if not beats or i - beats[-1] >= min_beat_gap:
-                    beats.append(i)
-        
-        # Add some guaranteed beats if too few detected
-        if len(beats) < duration * 0.5:  # Less than 0.5 beats per second
-            for i in range(0, len(energy_values), 30):  # Every 0.5 seconds
-                if not any(abs(i - beat) < 5 for beat in beats):
-                    beats.append(i)
+    def fallback():
+        # The same synthetic features the non-pipelined path falls back to
+        energy_values, beats, _, _ = generate_synthetic_features(duration)
+        return FeatureTimeline(int(duration * FPS), energy_values, beats)
     
-    print(f"Detected {len(beats)} beats in {duration:.1f} seconds ({len(beats)/duration:.1f} BPS)")
-    return energy_values, beats, duration
+    return duration, PipelinedFeatures(blocks, sample_rate, FPS, int(duration * FPS), fallback=fallback)
 
-def main(input_video_path, output_path):
-    # Extract audio features
-    energy_values, beats, duration = extract_audio_features(input_video_path)
-    total_frames = int(duration * FPS)
+def main(input_video_path, output_path, cache=None, streaming=False, beat_source='peaks', workers=1,
+         store=None, features_file=None, analyze_only=False, pipelined=False, rotation_step=FLIP_ROTATION_STEP):
+    if analyze_only:
+        # Analyzing only stores the whole-track analysis, which the pipelined path never makes
+        pipelined = False
+    if pipelined:
+        # Analysis runs ahead of the render loop on a background thread
+        duration, timeline = pipelined_features(input_video_path, cache)
+        total_frames = len(timeline)
+    else:
+        # Extract audio features
+        energy_values, beats, duration, bands = analyze_audio(
+            input_video_path, cache, streaming, beat_source, workers, store, features_file, analyze_only)
+        if analyze_only:
+            return
+        total_frames = int(duration * FPS)
+        timeline = FeatureTimeline(total_frames, energy_values, beats,
+                                   bands=bands.energy if bands is not None else None)
     
     # Initialize game objects
-    robot = Robot(50, HEIGHT - 350)
+    robot = Robot(50, HEIGHT - 350, rotation_step)
     platform_generator = PlatformGenerator()
     particles = []
     
@@ -1161,17 +1303,14 @@ def main(input_video_path, output_path):
     
     # Create pygame surface
     screen = pygame.Surface((WIDTH, HEIGHT))
+    background = GradientBackground((WIDTH, HEIGHT), 3, BACKGROUND_COLOR, (25, 25, 40))
+    hud = Hud()
     
     print(f"Generating {total_frames} frames with enhanced animations...")
     
     for frame in range(total_frames):
         # Get audio features for current frame
-        audio_energy = 0
-        beat_detected = False
-        
-        if frame < len(energy_values):
-            audio_energy = energy_values[frame]
-            beat_detected = frame in beats
+        audio_energy, beat_detected, _, _, band_levels = timeline[frame]
         
         # Enhanced camera shake effect
         camera_shake = 0
@@ -1187,45 +1326,26 @@ def main(input_video_path, output_path):
         
         # Update game objects with particle tracking
         robot.update(platform_generator.get_platforms(), platform_generator.get_coins(), 
-                    particles, audio_energy, beat_detected, frame)
-        platform_generator.update(camera_x)
+                    particles, audio_energy, beat_detected, frame, band_levels)
+        platform_generator.update(camera_x, band_levels)
         
         # Update particles with robot position for following effects
         particles = [p for p in particles if p.update(robot.x + robot.width/2, robot.y + robot.height/2)]
         
-        # Enhanced background rendering
-        screen.fill(BACKGROUND_COLOR)
+        # Multi-layered gradient background (covers the whole screen)
+        tint = [0, 0, 0]
         
-        # Dynamic background with multiple layers
-        pulse_strength = int(audio_energy * 30)
-        beat_flash = 20 if beat_detected and audio_energy > 0.6 else 0
+        # Add beat-reactive color shifts
+        if beat_detected:
+            tint = [int(audio_energy * 30)] * 3
         
-        background_base = tuple(min(255, c + pulse_strength + beat_flash) for c in BACKGROUND_COLOR)
-        screen.fill(background_base)
+        # Add combo-based color enhancement
+        if robot.combo_multiplier > 2.0:
+            combo_bonus = int((robot.combo_multiplier - 2.0) * 20)
+            tint[0] += combo_bonus
+            tint[1] += combo_bonus // 2
         
-        # Multi-layered gradient background
-        for i in range(HEIGHT // 3):
-            layer_progress = i / (HEIGHT // 3)
-            
-            # Base gradient
-            color = (
-                int(BACKGROUND_COLOR[0] + layer_progress * 25),
-                int(BACKGROUND_COLOR[1] + layer_progress * 25),
-                int(BACKGROUND_COLOR[2] + layer_progress * 40)
-            )
-            
-            # Add beat-reactive color shifts
-            if beat_detected:
-                color = tuple(min(255, c + int(audio_energy * 30)) for c in color)
-            
-            # Add combo-based color enhancement
-            if robot.combo_multiplier > 2.0:
-                combo_bonus = int((robot.combo_multiplier - 2.0) * 20)
-                color = (min(255, color[0] + combo_bonus), 
-                        min(255, color[1] + combo_bonus//2), 
-                        color[2])
-            
-            pygame.draw.rect(screen, color, (0, i * 3, WIDTH, 3))
+        background.draw(screen, tint)
         
         # Add moving background elements for depth
         if frame % 5 == 0 and audio_energy > 0.4:
@@ -1260,47 +1380,13 @@ def main(input_video_path, output_path):
         for particle in foreground_particles:
             particle.draw(screen, camera_x)
         
-        # Enhanced UI elements with better styling
-        font_size = 24
-        if hasattr(pygame.font, 'Font'):
-            font = pygame.font.Font(None, font_size)
-        else:
-            font = pygame.font.SysFont('Arial', font_size)
-        
-        # Coins collected counter with glow effect
-        coin_text = font.render(f"Coins: {robot.coins_collected}", True, COIN_GOLD)
-        # Add text shadow/glow
-        shadow_text = font.render(f"Coins: {robot.coins_collected}", True, (100, 70, 0))
-        screen.blit(shadow_text, (12, 12))
-        screen.blit(coin_text, (10, 10))
-        
-        # Enhanced combo multiplier display
-        if robot.combo_multiplier > 1.1:
-            combo_color = ROBOT_HIGHLIGHT if robot.combo_multiplier > 2.0 else (255, 200, 100)
-            combo_text = font.render(f"Combo: {robot.combo_multiplier:.1f}x", True, combo_color)
-            shadow_text = font.render(f"Combo: {robot.combo_multiplier:.1f}x", True, (80, 60, 0))
-            screen.blit(shadow_text, (12, 42))
-            screen.blit(combo_text, (10, 40))
-        
-        # Enhanced speed boost indicator
-        if robot.speed_boost > 1:
-            boost_intensity = min(255, int(robot.speed_boost * 30))
-            speed_color = (255, boost_intensity, boost_intensity // 2)
-            speed_text = font.render("Speed Boost!", True, speed_color)
-            screen.blit(speed_text, (10, 70))
+        # Labels (rebuilt only when a shown value changes)
+        hud.draw(screen, robot)
         
         # Enhanced audio visualization
         if audio_energy > 0:
             # Audio energy bar with gradient
-            energy_bar_width = int(audio_energy * 100)
-            bar_rect = pygame.Rect(WIDTH - 120, 10, 100, 12)
-            pygame.draw.rect(screen, (60, 60, 60), bar_rect)
-            
-            # Gradient energy fill
-            for i in range(energy_bar_width):
-                fill_color_intensity = int(255 * (i / 100))
-                fill_color = (fill_color_intensity, 255 - fill_color_intensity//2, 100)
-                pygame.draw.rect(screen, fill_color, (WIDTH - 118 + i, 12, 1, 8))
+            hud.energy_gauge.draw(screen, (WIDTH - 120, 10), audio_energy)
         
         # Enhanced beat indicator with rings
         if beat_detected:
@@ -1316,30 +1402,6 @@ def main(input_video_path, output_path):
             pygame.draw.circle(screen, (255, 255, 255), beat_center, 8)
             pygame.draw.circle(screen, (255, 0, 0), beat_center, 6)
         
-        # Dance move indicator
-        if robot.dance_state != "normal":
-            dance_font = pygame.font.Font(None, 20)
-            dance_text = dance_font.render(f"♪ {robot.dance_state.replace('_', ' ').title()} ♪", 
-                                         True, ROBOT_HIGHLIGHT)
-            screen.blit(dance_text, (10, 100))
-        
-        # Air trick indicator
-        if robot.air_trick and robot.air_trick_timer > 0:
-            trick_font = pygame.font.Font(None, 18)
-            trick_name = robot.air_trick.replace('_', ' ').title()
-            trick_text = trick_font.render(f"✦ {trick_name} ✦", True, (255, 255, 255))
-            screen.blit(trick_text, (WIDTH - 150, 80))
-        
-        # Expression indicator (subtle)
-        if robot.expression != "normal" and robot.expression_timer > 10:
-            expr_font = pygame.font.Font(None, 16)
-            expressions = {
-                "excited": "😄", "surprised": "😲", "focused": "😤"
-            }
-            if robot.expression in expressions:
-                expr_text = expr_font.render(expressions[robot.expression], True, (255, 255, 255))
-                screen.blit(expr_text, (WIDTH - 200, 50))
-        
         # Convert pygame surface to opencv format
         frame_array = pygame.surfarray.array3d(screen)
         frame_array = np.transpose(frame_array, (1, 0, 2))
@@ -1360,6 +1422,9 @@ def main(input_video_path, output_path):
     # Cleanup
     out.release()
     pygame.quit()
+    if pipelined:
+        timeline.close()
+        beats = timeline.beat_frames
     
     # Final statistics
     print(f"\n🎮 Animation Complete! 🎮")
@@ -1370,11 +1435,10 @@ def main(input_video_path, output_path):
     print(f"   ⏱️  Video duration: {duration:.1f} seconds")
     print(f"   💾 Output saved to: {output_path}")
     print(f"   🎵 Detected beats: {len(beats)} ({len(beats)/duration:.1f} BPS)")
+    print(f"   🤸 Flip sprites ({robot.flip_sprites.step:g}° steps): {robot.flip_sprites.report()}")
 
 if __name__ == "__main__":
-    import sys
-    
-    if len(sys.argv) != 3:
+    if len(sys.argv) < 3:
         print("🤖 Enhanced Music Visualizer - Dynamic Robot Platformer")
         print("Usage: python enhanced_platformer.py <input_video.mp4> <output_animation.mp4>")
         print("\nNew Features:")
@@ -1387,8 +1451,31 @@ if __name__ == "__main__":
         print("  🎵 Better audio analysis and beat detection")
         sys.exit(1)
     
-    input_video = sys.argv[1]
-    output_video = sys.argv[2]
+    parser = argparse.ArgumentParser(description='Enhanced Music Visualizer - Dynamic Robot Platformer')
+    parser.add_argument('input_video', help='Input music video file (mp4)')
+    parser.add_argument('output_video', nargs='?', help='Output animation file (mp4)')
+    parser.add_argument('--streaming', action='store_true',
+                        help='Analyze audio in fixed-size blocks (flat memory use for long inputs)')
+    parser.add_argument('--beats', choices=['peaks', 'coarse', 'tempo'], default='peaks',
+                        help='Beat source: local energy peaks, the same peaks found coarse-to-fine, '
+                             'or a tracked tempo grid')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Processes for feature extraction (0 = one per CPU core; ignored with --streaming)')
+    parser.add_argument('--pipelined', action='store_true',
+                        help='Start rendering right away while a background thread analyzes the audio '
+                             '(causal analysis; ignores --beats/--workers/--features)')
+    parser.add_argument('--rotation-step', type=float, default=FLIP_ROTATION_STEP, metavar='DEGREES',
+                        help='Angle between the pre-rotated flip sprites (smaller is smoother but uses more memory)')
+    add_cache_arguments(parser)
+    add_feature_arguments(parser)
+    args = parser.parse_args()
+    if not args.output_video and not args.analyze_only:
+        parser.error('output_video is required unless --analyze-only is given')
+    if not 0 < args.rotation_step <= 180:
+        parser.error('--rotation-step must be between 0 and 180 degrees')
+    
+    input_video = args.input_video
+    output_video = args.output_video
     
     if not os.path.exists(input_video):
         print(f"❌ Error: Input video {input_video} not found")
@@ -1399,4 +1486,6 @@ if __name__ == "__main__":
     print(f"📹 Output: {output_video}")
     print("🚀 Initializing enhanced robot animations...\n")
     
-    main(input_video, output_video)
\ No newline at end of file
+    main(input_video, output_video, cache_from_args(args), args.streaming, args.beats,
+         resolve_workers(args.workers), feature_store_from_args(args), args.features, args.analyze_only,
+         args.pipelined, args.rotation_step)
\ No newline at end of file
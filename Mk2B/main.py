@@ -3,11 +3,22 @@ import numpy as np
 import cv2
 import math
 import random
-import subprocess
-import tempfile
 import os
-import wave
-import struct
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from musicvis.audio import load_audio, stream_audio, AudioDecodeError
+from musicvis.beats import beat_agreement, detect_beats_tempo, detect_beats_enhanced, detect_beats_enhanced_coarse
+from musicvis.features import BandEnergies, WindowFeatureStream, normalize_peak
+from musicvis.feature_store import add_feature_arguments, feature_store_from_args, resolve_features
+from musicvis.parallel import resolve_workers, window_features
+from musicvis.pipeline import PIPELINE_BLOCK_SECONDS, PipelinedFeatures, frame_aligned_rate
+from musicvis.pcm_cache import add_cache_arguments, cache_from_args
+from musicvis.probe import probe_media, ProbeError
+from musicvis.render import Gauge, GradientBackground, HudLayer, SpriteAtlas, SurfacePool, TextCache, blend_toward
+from musicvis.timeline import FeatureTimeline, rise_strength
 
 # === Enhanced Music Platformer with Better Graphics & Effects ===
 
@@ -18,6 +29,17 @@ WIDTH, HEIGHT = 768, 768
 FPS = 60
 BACKGROUND_COLOR = (15, 15, 25)
 
+# Audio analysis settings; all of them are part of the feature store key
+FEATURE_VERSION = 1  # Bump whenever the analysis output changes
+MIN_BEAT_GAP = 6
+CONFIRMATION_WINDOW = 3
+
+# Decode rate per analysis profile. Rates are multiples of FPS so a hop is a
+# whole number of samples; ffmpeg's resampler low-passes at the new Nyquist
+# frequency, so the fast profile is anti-aliased.
+ANALYSIS_PROFILES = {'full': 44100, 'fast': 9600}
+BEAT_TOLERANCE = 0.07  # Seconds within which two analyses' beats agree
+
 # Enhanced Robot colors with gradients
 ROBOT_ORANGE = (255, 165, 0)
 ROBOT_DARK_ORANGE = (255, 140, 0)
@@ -40,6 +62,9 @@ COIN_YELLOW = (190, 190, 0)
 ENEMY_RED = (255, 80, 80)
 ENEMY_DARK_RED = (200, 40, 40)
 
+# Surfaces reused by per-frame effects (overlays, panels, ripples)
+effect_surfaces = SurfacePool()
+
 class Particle:
     def __init__(self, x, y, vel_x, vel_y, color, life=30, particle_type="normal"):
         self.x = x
@@ -291,12 +316,115 @@ class Coin:
                              (int(draw_x + highlight_offset), int(draw_y - 3)), 
                              max(1, size // 3))
 
+ROBOT_WIDTH, ROBOT_HEIGHT = 40, 50
+SPRITE_MARGIN = 40  # Room around the body for eyes, legs and the spin's corners
+
+def render_robot_pose(pose):
+    """Bake the robot's body, eyes and legs for one pose into a sprite.
+
+    pose is (body_width, body_height, rotation_degrees, eye_size, eye_y_offset,
+    pupil_offset_x, pupil_offset_y, leg_offset), leg_offset being None when
+    the robot is not running. The sprite's origin is the robot's draw
+    position (its x on screen, the body's top).
+    """
+    (body_width, body_height, rotation_degrees, eye_size, eye_y_offset,
+     pupil_offset_x, pupil_offset_y, leg_offset) = pose
+    sprite = pygame.Surface((max(body_width, ROBOT_WIDTH) + 2 * SPRITE_MARGIN, body_height + 2 * SPRITE_MARGIN),
+                            pygame.SRCALPHA)
+    draw_x = body_y = SPRITE_MARGIN
+    
+    # Enhanced robot drawing with gradient effect
+    body_rect = pygame.Rect(draw_x - (body_width - ROBOT_WIDTH)//2, body_y, body_width, body_height)
+    
+    # Gradient body effect
+    if rotation_degrees == 0:
+        # Shadow
+        shadow_rect = pygame.Rect(body_rect.x + 3, body_rect.y + 3, body_rect.width, body_rect.height)
+        pygame.draw.rect(sprite, ROBOT_SHADOW, shadow_rect, border_radius=10)
+        
+        # Main body
+        pygame.draw.rect(sprite, ROBOT_ORANGE, body_rect, border_radius=10)
+        
+        # Highlight gradient
+        highlight_rect = pygame.Rect(body_rect.x, body_rect.y, body_rect.width, body_rect.height//3)
+        pygame.draw.rect(sprite, ROBOT_LIGHT_ORANGE, highlight_rect, border_radius=10)
+        
+        # Outline
+        pygame.draw.rect(sprite, ROBOT_DARK_ORANGE, body_rect, 4, border_radius=10)
+    else:
+        # Rotated body for spin dance
+        body_rotation = math.radians(rotation_degrees)
+        center_x = draw_x + ROBOT_WIDTH // 2
+        center_y = body_y + body_height // 2
+        
+        # Create rotated rectangle points
+        corners = [
+            (-body_width//2, -body_height//2),
+            (body_width//2, -body_height//2),
+            (body_width//2, body_height//2),
+            (-body_width//2, body_height//2)
+        ]
+        
+        rotated_corners = []
+        for corner_x, corner_y in corners:
+            rot_x = corner_x * math.cos(body_rotation) - corner_y * math.sin(body_rotation)
+            rot_y = corner_x * math.sin(body_rotation) + corner_y * math.cos(body_rotation)
+            rotated_corners.append((center_x + rot_x, center_y + rot_y))
+        
+        pygame.draw.polygon(sprite, ROBOT_ORANGE, rotated_corners)
+        pygame.draw.polygon(sprite, ROBOT_DARK_ORANGE, rotated_corners, 4)
+    
+    # Eye whites
+    left_eye = (draw_x + 12, body_y + 15 + eye_y_offset)
+    right_eye = (draw_x + body_width - 20, body_y + 15 + eye_y_offset)
+    pygame.draw.circle(sprite, (255, 255, 255), left_eye, eye_size)
+    pygame.draw.circle(sprite, (255, 255, 255), right_eye, eye_size)
+    
+    # Pupils
+    pupil_size = max(2, eye_size // 2)
+    pygame.draw.circle(sprite, (0, 0, 0), 
+                     (left_eye[0] + pupil_offset_x, left_eye[1] + pupil_offset_y), pupil_size)
+    pygame.draw.circle(sprite, (0, 0, 0), 
+                     (right_eye[0] + pupil_offset_x, right_eye[1] + pupil_offset_y), pupil_size)
+    
+    # Eye shine
+    shine_size = max(1, pupil_size // 2)
+    pygame.draw.circle(sprite, (255, 255, 255), 
+                     (left_eye[0] + pupil_offset_x - 1, left_eye[1] + pupil_offset_y - 1), shine_size)
+    pygame.draw.circle(sprite, (255, 255, 255), 
+                     (right_eye[0] + pupil_offset_x - 1, right_eye[1] + pupil_offset_y - 1), shine_size)
+    
+    # Running legs with joints
+    if leg_offset is not None:
+        leg_y = body_y + body_height
+        left_leg_x = draw_x + 10
+        right_leg_x = draw_x + body_width - 18
+        for leg_x, leg_height in [(left_leg_x, 18 + leg_offset), (right_leg_x, 18 - leg_offset)]:
+            pygame.draw.rect(sprite, ROBOT_DARK_ORANGE, 
+                           (leg_x, leg_y, 10, max(8, leg_height)))
+            # Knee joint
+            pygame.draw.circle(sprite, ROBOT_ORANGE, 
+                             (leg_x + 5, leg_y + leg_height//2), 4)
+            # Foot
+            pygame.draw.ellipse(sprite, ROBOT_SHADOW, 
+                              (leg_x - 2, leg_y + leg_height, 14, 6))
+    
+    return sprite, (draw_x, body_y)
+
+def common_robot_poses():
+    """Poses of a plain run or stand, baked before the first frame"""
+    poses = []
+    for pupil_offset_x in (0, 3):
+        for leg_offset in [None] + list(range(-12, 13)):
+            poses.append((ROBOT_WIDTH, ROBOT_HEIGHT, 0, 10, 0, pupil_offset_x, 0, leg_offset))
+    return poses
+
 class Robot:
     def __init__(self, x, y):
         self.x = x
         self.y = y
-        self.width = 40
-        self.height = 50
+        self.width = ROBOT_WIDTH
+        self.height = ROBOT_HEIGHT
         self.vel_x = 0
         self.vel_y = 0
         self.on_ground = False
@@ -318,6 +446,7 @@ class Robot:
         self.dance_timer = 0
         self.invulnerable_timer = 0
         self.lives = 3
+        self.sprites = SpriteAtlas(render_robot_pose)
         self.trail_positions = []
         
         # Dance moves
@@ -328,7 +457,8 @@ class Robot:
             self.dance_move = random.choice(self.dance_moves)
             self.dance_timer = 40
     
-    def update(self, platforms, coins, particles, enemies, audio_energy, beat_detected, frame_num):
+    def update(self, platforms, coins, particles, enemies, audio_energy, beat_detected, frame_num, bands=None):
+        # bands: optional (bass, mid, treble) levels in [0, 1] for this frame
         # Invulnerability countdown
         if self.invulnerable_timer > 0:
             self.invulnerable_timer -= 1
@@ -374,6 +504,8 @@ class Robot:
                 
                 # Enhanced jump calculation
                 base_jump = 16 + audio_energy * 12
+                if bands is not None:
+                    base_jump += bands[0] * 6  # Bass hits launch higher
                 if distance_y < -120:
                     jump_strength = base_jump + 8
                 else:
@@ -587,6 +719,10 @@ class Robot:
             self.on_ground = True
             self.landing_animation = 15
         
+        # Treble-heavy frames keep a faint glow around the robot
+        if bands is not None and bands[2] > 0.7:
+            self.glow_intensity = max(self.glow_intensity, int(bands[2] * 12))
+        
         # Decay effects
         if self.speed_boost > 0:
             self.speed_boost -= 0.02
@@ -666,46 +802,6 @@ class Robot:
             body_height = int(body_height * (1 - squash_factor * 0.3))
             body_y = self.y + (self.height - body_height)
         
-        # Enhanced robot drawing with gradient effect
-        body_rect = pygame.Rect(draw_x - (body_width - self.width)//2, body_y, body_width, body_height)
-        
-        # Gradient body effect
-        if body_rotation == 0:
-            # Shadow
-            shadow_rect = pygame.Rect(body_rect.x + 3, body_rect.y + 3, body_rect.width, body_rect.height)
-            pygame.draw.rect(screen, ROBOT_SHADOW, shadow_rect, border_radius=10)
-            
-            # Main body
-            pygame.draw.rect(screen, ROBOT_ORANGE, body_rect, border_radius=10)
-            
-            # Highlight gradient
-            highlight_rect = pygame.Rect(body_rect.x, body_rect.y, body_rect.width, body_rect.height//3)
-            pygame.draw.rect(screen, ROBOT_LIGHT_ORANGE, highlight_rect, border_radius=10)
-            
-            # Outline
-            pygame.draw.rect(screen, ROBOT_DARK_ORANGE, body_rect, 4, border_radius=10)
-        else:
-            # Rotated body for spin dance
-            center_x = draw_x + self.width // 2
-            center_y = body_y + body_height // 2
-            
-            # Create rotated rectangle points
-            corners = [
-                (-body_width//2, -body_height//2),
-                (body_width//2, -body_height//2),
-                (body_width//2, body_height//2),
-                (-body_width//2, body_height//2)
-            ]
-            
-            rotated_corners = []
-            for corner_x, corner_y in corners:
-                rot_x = corner_x * math.cos(body_rotation) - corner_y * math.sin(body_rotation)
-                rot_y = corner_x * math.sin(body_rotation) + corner_y * math.cos(body_rotation)
-                rotated_corners.append((center_x + rot_x, center_y + rot_y))
-            
-            pygame.draw.polygon(screen, ROBOT_ORANGE, rotated_corners)
-            pygame.draw.polygon(screen, ROBOT_DARK_ORANGE, rotated_corners, 4)
-        
         # Enhanced eyes with more expressions
         eye_size = 10
         eye_y_offset = 0
@@ -725,12 +821,6 @@ class Robot:
             eye_y_offset = int(math.sin(self.animation_frame * 0.5) * 2)
         
         eye_size = int(eye_size * eye_scale)
-        left_eye = (draw_x + 12, body_y + 15 + eye_y_offset)
-        right_eye = (draw_x + body_width - 20, body_y + 15 + eye_y_offset)
-        
-        # Eye whites
-        pygame.draw.circle(screen, (255, 255, 255), left_eye, eye_size)
-        pygame.draw.circle(screen, (255, 255, 255), right_eye, eye_size)
         
         # Pupils with enhanced movement
         pupil_offset_x = 0
@@ -743,59 +833,26 @@ class Robot:
         elif self.vel_y > 8:  # Looking down when falling fast
             pupil_offset_y = 2
         
-        pupil_size = max(2, eye_size // 2)
-        pygame.draw.circle(screen, (0, 0, 0), 
-                         (left_eye[0] + pupil_offset_x, left_eye[1] + pupil_offset_y), pupil_size)
-        pygame.draw.circle(screen, (0, 0, 0), 
-                         (right_eye[0] + pupil_offset_x, right_eye[1] + pupil_offset_y), pupil_size)
-        
-        # Eye shine
-        shine_size = max(1, pupil_size // 2)
-        pygame.draw.circle(screen, (255, 255, 255), 
-                         (left_eye[0] + pupil_offset_x - 1, left_eye[1] + pupil_offset_y - 1), shine_size)
-        pygame.draw.circle(screen, (255, 255, 255), 
-                         (right_eye[0] + pupil_offset_x - 1, right_eye[1] + pupil_offset_y - 1), shine_size)
-        
         # Enhanced running animation
-        if self.on_ground and abs(self.vel_x) > 2:
+        running = self.on_ground and abs(self.vel_x) > 2
+        leg_offset = None
+        if running:
             leg_speed = 0.6 + (self.vel_x / 15)
-            leg_offset = math.sin(self.animation_frame * leg_speed) * 12
+            leg_offset = int(math.sin(self.animation_frame * leg_speed) * 12)
+        
+        # Body, eyes and legs in one blit from the pose's baked sprite
+        pose = (body_width, body_height, round(math.degrees(body_rotation)) % 360, eye_size, eye_y_offset,
+                pupil_offset_x, pupil_offset_y, leg_offset)
+        self.sprites.draw(screen, pose, (int(draw_x), int(body_y)))
+        
+        # Running dust particles
+        if running and self.vel_x > 10 and self.animation_frame % 6 == 0:
             leg_y = body_y + body_height
-            
-            # Enhanced legs with joints
-            left_leg_x = draw_x + 10
-            right_leg_x = draw_x + body_width - 18
-            
-            # Left leg
-            leg_height = 18 + int(leg_offset)
-            pygame.draw.rect(screen, ROBOT_DARK_ORANGE, 
-                           (left_leg_x, leg_y, 10, max(8, leg_height)))
-            # Knee joint
-            pygame.draw.circle(screen, ROBOT_ORANGE, 
-                             (left_leg_x + 5, leg_y + leg_height//2), 4)
-            # Foot
-            pygame.draw.ellipse(screen, ROBOT_SHADOW, 
-                              (left_leg_x - 2, leg_y + leg_height, 14, 6))
-            
-            # Right leg
-            leg_height = 18 - int(leg_offset)
-            pygame.draw.rect(screen, ROBOT_DARK_ORANGE, 
-                           (right_leg_x, leg_y, 10, max(8, leg_height)))
-            # Knee joint
-            pygame.draw.circle(screen, ROBOT_ORANGE, 
-                             (right_leg_x + 5, leg_y + leg_height//2), 4)
-            # Foot
-            pygame.draw.ellipse(screen, ROBOT_SHADOW, 
-                              (right_leg_x - 2, leg_y + leg_height, 14, 6))
-            
-            # Running dust particles
-            if self.vel_x > 10 and self.animation_frame % 6 == 0:
-                dust_particles = []
-                for i in range(3):
-                    dust_x = draw_x + random.randint(-5, 5)
-                    dust_y = leg_y + 20 + random.randint(-3, 3)
-                    pygame.draw.circle(screen, (120, 120, 120), (dust_x, dust_y), 
-                                     random.randint(1, 3))
+            for i in range(3):
+                dust_x = draw_x + random.randint(-5, 5)
+                dust_y = leg_y + 20 + random.randint(-3, 3)
+                pygame.draw.circle(screen, (120, 120, 120), (dust_x, dust_y), 
+                                 random.randint(1, 3))
         
         # Enhanced jump animation with better trail
         if self.jump_animation > 0:
@@ -836,9 +893,7 @@ class Robot:
         
         # Invulnerability flashing effect
         if self.invulnerable_timer > 0 and self.invulnerable_timer % 8 < 4:
-            overlay = pygame.Surface((body_width + 10, body_height + 10))
-            overlay.set_alpha(100)
-            overlay.fill((255, 100, 100))
+            overlay = effect_surfaces.get((body_width + 10, body_height + 10), color=(255, 100, 100), alpha=100)
             screen.blit(overlay, (draw_x - 5, body_y - 5))
         
         # Lives indicator hearts (only when damaged)
@@ -988,6 +1043,7 @@ class PlatformGenerator:
         self.coins = []
         self.enemies = []
         self.last_platform_x = 0
+        self.bands = None
         self.generate_initial_platforms()
     
     def generate_initial_platforms(self):
@@ -1005,17 +1061,24 @@ class PlatformGenerator:
         height = random.randint(12, 60)
         y = random.randint(HEIGHT - 550, HEIGHT - 150)
         
+        # Heavy bass makes bounce platforms more likely
+        bounce_cutoff = 0.25
+        moving_cutoff = 0.35
+        if self.bands is not None:
+            bounce_cutoff += self.bands[0] * 0.1
+            moving_cutoff += self.bands[0] * 0.1
+        
         # Enhanced platform type distribution
         platform_type = random.random()
         if platform_type < 0.15:
             special = True
             bounce = False
             moving = False
-        elif platform_type < 0.25:
+        elif platform_type < bounce_cutoff:
             special = False
             bounce = True
             moving = False
-        elif platform_type < 0.35:
+        elif platform_type < moving_cutoff:
             special = False
             bounce = False
             moving = True
@@ -1027,9 +1090,14 @@ class PlatformGenerator:
         platform = Platform(self.last_platform_x + gap, y, width, height, special, bounce, moving)
         self.platforms.append(platform)
         
+        # Bright treble-heavy passages scatter more coins
+        coin_cutoff = 0.7
+        if self.bands is not None:
+            coin_cutoff += self.bands[2] * 0.2
+        
         # Enhanced coin generation
         coin_chance = random.random()
-        if coin_chance < 0.7:  # 70% chance for coins
+        if coin_chance < coin_cutoff:  # 70% chance for coins
             coin_count = random.randint(1, 4)
             for i in range(coin_count):
                 coin_x = platform.x + random.randint(10, platform.width - 10)
@@ -1061,7 +1129,10 @@ class PlatformGenerator:
         
         self.last_platform_x = platform.x + platform.width
     
-    def update(self, camera_x):
+    def update(self, camera_x, bands=None):
+        # Current (bass, mid, treble) levels shape the platforms generated next
+        self.bands = bands
+        
         # Remove old objects
         self.platforms = [p for p in self.platforms if p.x + p.width > camera_x - 300]
         self.coins = [c for c in self.coins if c.x > camera_x - 300]
@@ -1093,44 +1164,153 @@ class PlatformGenerator:
     def get_enemies(self):
         return self.enemies
 
-# Enhanced audio processing functions (keeping the existing ones but with improvements)
-def extract_audio_with_ffmpeg(video_path):
-    """Extract audio from video using ffmpeg with better error handling"""
-    print("Extracting audio from video...")
+def draw_heart(surface, heart_x, heart_y, alive):
+    """Full or empty life heart centered on (heart_x, heart_y)"""
+    if alive:
+        pygame.draw.circle(surface, (255, 50, 50), (heart_x - 3, heart_y - 2), 8)
+        pygame.draw.circle(surface, (255, 50, 50), (heart_x + 3, heart_y - 2), 8)
+        pygame.draw.polygon(surface, (255, 50, 50), [
+            (heart_x - 8, heart_y + 2),
+            (heart_x, heart_y + 12),
+            (heart_x + 8, heart_y + 2)
+        ])
+        # Shine
+        pygame.draw.circle(surface, (255, 150, 150), (heart_x - 2, heart_y - 1), 3)
+    else:
+        pygame.draw.circle(surface, (100, 100, 100), (heart_x - 3, heart_y - 2), 8, 2)
+        pygame.draw.circle(surface, (100, 100, 100), (heart_x + 3, heart_y - 2), 8, 2)
+        pygame.draw.polygon(surface, (100, 100, 100), [
+            (heart_x - 8, heart_y + 2),
+            (heart_x, heart_y + 12),
+            (heart_x + 8, heart_y + 2)
+        ], 2)
+
+def rounded_bar(width, height, color):
+    """A solid bar with rounded corners on a transparent surface"""
+    bar = pygame.Surface((width, height), pygame.SRCALPHA)
+    pygame.draw.rect(bar, color, (0, 0, width, height), border_radius=4)
+    return bar
+
+class Hud:
+    """Coins, combo, speed boost and lives, plus the energy gauge.
+
+    Fonts, icons and gauge bars are made once, text goes through a
+    TextCache, and the layout is only rebuilt when a value it shows changes.
+    """
+    ICON_SIZE = 32  # Icons are drawn centered on a transparent square
+    
+    def __init__(self):
+        try:
+            self.font_large = pygame.font.Font(None, 32)
+            self.font_medium = pygame.font.Font(None, 24)
+            self.font_small = pygame.font.Font(None, 20)
+        except:
+            self.font_large = pygame.font.SysFont('Arial', 28, bold=True)
+            self.font_medium = pygame.font.SysFont('Arial', 20, bold=True)
+            self.font_small = pygame.font.SysFont('Arial', 16)
+        self.text = TextCache()
+        self.layer = HudLayer()
+        
+        center = self.ICON_SIZE // 2
+        self.coin_icon = self.icon()
+        pygame.draw.circle(self.coin_icon, COIN_GOLD, (center, center), 8)
+        pygame.draw.circle(self.coin_icon, COIN_YELLOW, (center, center), 6)
+        self.super_coin_icon = self.icon()
+        pygame.draw.circle(self.super_coin_icon, COIN_GOLD, (center, center), 10)
+        pygame.draw.circle(self.super_coin_icon, (255, 255, 255), (center, center), 8)
+        pygame.draw.circle(self.super_coin_icon, COIN_GOLD, (center, center), 6)
+        self.hearts = {}
+        for alive in (True, False):
+            self.hearts[alive] = self.icon()
+            draw_heart(self.hearts[alive], center, center, alive)
+        
+        # Energy gauges, one per color band, with rounded fills made per width
+        track = rounded_bar(120, 8, (50, 50, 50))
+        self.energy_gauges = {
+            color: Gauge(track, lambda width, color=color: rounded_bar(width, 8, color), 120)
+            for color in [(255, 100, 100), (255, 200, 100), (100, 255, 100)]
+        }
     
-    temp_wav = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
-    temp_wav.close()
+    def icon(self):
+        return pygame.Surface((self.ICON_SIZE, self.ICON_SIZE), pygame.SRCALPHA)
     
-    try:
-        # Primary extraction command
-        cmd = [
-            'ffmpeg', '-i', video_path, 
-            '-vn', '-acodec', 'pcm_s16le', 
-            '-ar', '44100', '-ac', '1', 
-            '-y', temp_wav.name
+    def icon_position(self, x, y):
+        return (x - self.ICON_SIZE // 2, y - self.ICON_SIZE // 2)
+    
+    def state(self, robot):
+        """The values the display shows"""
+        combo = robot.combo_multiplier
+        combo_glow = int((combo - 1) * 100)
+        return (
+            robot.coins_collected,
+            robot.super_coins_collected,
+            f"{combo:.1f}" if combo > 1.2 else None,
+            (255, min(255, 200 + combo_glow), min(255, 100 + combo_glow)),
+            combo > 2.0,
+            (255, min(255, int(robot.speed_boost * 25)), 0) if robot.speed_boost > 2 else None,
+            robot.lives
+        )
+    
+    def build(self, coins, super_coins, combo, combo_color, combo_glow, speed_color, lives):
+        render = self.text.render
+        # Coins collected with icon
+        blits = [
+            (self.coin_icon, self.icon_position(25, 25)),
+            (render(self.font_medium, f": {coins}", COIN_GOLD), (40, 18))
         ]
         
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        if result.returncode != 0:
-            print(f"FFmpeg primary command failed: {result.stderr}")
-            # Fallback command
-            cmd = ['ffmpeg', '-i', video_path, '-vn', '-ar', '22050', '-y', temp_wav.name]
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            
-            if result.returncode != 0:
-                print(f"FFmpeg fallback failed: {result.stderr}")
-                raise Exception("Both FFmpeg commands failed")
+        # Super coins
+        if super_coins > 0:
+            blits.append((self.super_coin_icon, self.icon_position(25, 45)))
+            blits.append((render(self.font_small, f": {super_coins}", (255, 255, 255)), (40, 40)))
         
-        # Read the WAV file
-        with wave.open(temp_wav.name, 'rb') as wav_file:
-            frames = wav_file.getnframes()
-            sample_rate = wav_file.getframerate()
-            duration = frames / sample_rate
-            
-            raw_audio = wav_file.readframes(frames)
-            audio_data = np.frombuffer(raw_audio, dtype=np.int16).astype(np.float32)
-            audio_data = audio_data / 32768.0  # Normalize
+        # Combo multiplier with glow effect
+        if combo is not None:
+            if combo_glow:
+                glow_surface = render(self.font_medium, f"COMBO: {combo}x", (255, 255, 255), alpha=100)
+                blits += [(glow_surface, position) for position in [(12, 62), (8, 62), (10, 60), (10, 64)]]
+            blits.append((render(self.font_medium, f"COMBO: {combo}x", combo_color), (10, 62)))
+        
+        # Speed boost indicator with motion blur effect
+        if speed_color is not None:
+            for offset in range(3):
+                blur_alpha = 100 - offset * 30
+                blits.append((render(self.font_medium, "SPEED BOOST!", speed_color, alpha=blur_alpha),
+                              (10 + offset * 2, 85)))
+            blits.append((render(self.font_medium, "SPEED BOOST!", speed_color), (10, 85)))
+        
+        # Lives indicator (enhanced hearts)
+        if lives < 3:
+            for i in range(3):
+                blits.append((self.hearts[i < lives], self.icon_position(WIDTH - 120 + i * 25, 25)))
+        return blits
+    
+    def draw(self, screen, robot):
+        self.layer.update(self.state(robot), self.build)
+        self.layer.draw(screen)
+
+# Enhanced audio processing functions (keeping the existing ones but with improvements)
+def extract_audio_with_ffmpeg(video_path, duration_hint=None, cache=None, sample_rate=44100):
+    """Extract audio from video by streaming ffmpeg's PCM output into memory"""
+    print("Extracting audio from video...")
+    
+    try:
+        try:
+            # Primary decode
+            audio_data, sample_rate = load_audio(video_path, sample_rate, cache=cache,
+                                                 expected_duration=duration_hint)
+        except AudioDecodeError as e:
+            print(f"FFmpeg primary command failed: {e}")
+            # Fallback decode at a lower rate
+            try:
+                audio_data, sample_rate = load_audio(video_path, min(sample_rate, 22050), cache=cache,
+                                                     expected_duration=duration_hint,
+                                                     tolerant=True)
+            except AudioDecodeError as e:
+                print(f"FFmpeg fallback failed: {e}")
+                raise Exception("Both FFmpeg commands failed")
         
+        duration = len(audio_data) / sample_rate
         print(f"Successfully extracted {duration:.2f}s of audio at {sample_rate}Hz")
         return audio_data, sample_rate, duration
     
@@ -1139,165 +1319,86 @@ def extract_audio_with_ffmpeg(video_path):
         print("Generating synthetic audio data...")
         # Return synthetic data
         sample_rate = 22050
-        duration = get_video_duration(video_path)
+        duration = duration_hint or get_video_duration(video_path)
         audio_data = np.random.random(int(sample_rate * duration)) * 0.1
         return audio_data, sample_rate, duration
-    
-    finally:
-        if os.path.exists(temp_wav.name):
-            os.unlink(temp_wav.name)
 
 def get_video_duration(video_path):
-    """Get video duration using ffprobe with better error handling"""
+    """Get video duration from a single memoized ffprobe call"""
     try:
-        cmd = [
-            'ffprobe', '-v', 'quiet', '-show_entries', 
-            'format=duration', '-of', 'csv=p=0', video_path
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-        if result.returncode == 0 and result.stdout.strip():
-            return float(result.stdout.strip())
-    except Exception as e:
+        info = probe_media(video_path)
+        if info.duration:
+            return info.duration
+        print("Duration detection failed: no duration or frame count reported")
+    except ProbeError as e:
         print(f"Duration detection failed: {e}")
     
-    # Fallback: try to get frame count and fps
-    try:
-        cmd = ['ffprobe', '-v', 'quiet', '-select_streams', 'v:0', 
-               '-show_entries', 'stream=nb_frames,r_frame_rate', '-of', 'csv=p=0', video_path]
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-        if result.returncode == 0:
-            lines = result.stdout.strip().split('\n')
-            for line in lines:
-                parts = line.split(',')
-                if len(parts) >= 2:
-                    try:
-                        frames = int(parts[0])
-                        fps_str = parts[1]
-                        if '/' in fps_str:
-                            num, den = fps_str.split('/')
-                            fps = float(num) / float(den)
-                        else:
-                            fps = float(fps_str)
-                        return frames / fps
-                    except:
-                        continue
-    except Exception as e:
-        print(f"Frame-based duration detection failed: {e}")
-    
     return 15.0  # Conservative fallback
 
-def extract_audio_features(video_path):
+def extract_audio_features(video_path, cache=None, streaming=False, beat_source='peaks', workers=1,
+                           sample_rate=44100):
     """Enhanced audio feature extraction with better beat detection"""
     
     duration = get_video_duration(video_path)
     print(f"Video duration: {duration:.2f}s")
     
+    if streaming:
+        # Bounded-memory analysis for long inputs
+        try:
+            energy_values, spectral_values, tempo_values, bands, audio_duration = stream_audio_features(
+                video_path, cache, sample_rate)
+            return finish_audio_features(energy_values, spectral_values, tempo_values,
+                                         min(duration, audio_duration), bands, beat_source)
+        except AudioDecodeError as e:
+            print(f"Streaming decode failed, falling back to a full decode: {e}")
+    
     try:
-        audio_data, sample_rate, audio_duration = extract_audio_with_ffmpeg(video_path)
+        audio_data, sample_rate, audio_duration = extract_audio_with_ffmpeg(video_path, duration, cache, sample_rate)
         duration = min(duration, audio_duration)
     except Exception as e:
         print(f"Audio processing failed: {e}")
         return generate_synthetic_features(duration)
     
-    # Enhanced audio processing
-    chunk_size = max(1, sample_rate // FPS)
-    energy_values = []
-    spectral_values = []
-    tempo_values = []
-    
-    # Process audio in overlapping windows for smoother features
-    window_size = chunk_size * 2
-    hop_size = chunk_size
-    
-    for i in range(0, len(audio_data) - window_size, hop_size):
-        window = audio_data[i:i+window_size]
-        
-        # Energy features
-        rms_energy = np.sqrt(np.mean(window**2))
-        energy_values.append(rms_energy)
-        
-        # Spectral features
-        if len(window) > 1:
-            # High frequency content (brightness)
-            spectral_centroid = np.mean(np.abs(np.diff(window)))
-            spectral_values.append(spectral_centroid)
-            
-            # Tempo-related features (flux)
-            if i > hop_size:
-                prev_window = audio_data[i-hop_size:i-hop_size+window_size]
-                spectral_flux = np.mean((np.abs(np.fft.fft(window)) - 
-                                       np.abs(np.fft.fft(prev_window)))**2)
-                tempo_values.append(spectral_flux)
-            else:
-                tempo_values.append(0)
-        else:
-            spectral_values.append(0)
-            tempo_values.append(0)
-    
-    # Normalize features
-    if energy_values:
-        max_energy = max(energy_values)
-        if max_energy > 0:
-            energy_values = [e / max_energy for e in energy_values]
-    
-    if spectral_values:
-        max_spectral = max(spectral_values)
-        if max_spectral > 0:
-            spectral_values = [s / max_spectral for s in spectral_values]
-    
-    if tempo_values:
-        max_tempo = max(tempo_values)
-        if max_tempo > 0:
-            tempo_values = [t / max_tempo for t in tempo_values]
+    energy_values, spectral_values, tempo_values, bands = compute_audio_features(audio_data, sample_rate, workers)
+    return finish_audio_features(energy_values, spectral_values, tempo_values, duration, bands, beat_source)
+
+def compute_audio_features(audio_data, sample_rate, workers=1):
+    """Raw energy, brightness, spectral flux and band energies over overlapping windows"""
+    if workers > 1:
+        # Same features, with time segments spread over a process pool
+        return window_features(audio_data, max(1, sample_rate // FPS), sample_rate, workers)
+    stream = WindowFeatureStream(max(1, sample_rate // FPS), sample_rate)
+    stream.push(audio_data)
+    return stream.finish() + (stream.band_energies(),)
+
+def stream_audio_features(video_path, cache=None, sample_rate=44100):
+    """Compute the raw features block by block without holding the whole track"""
+    stream = WindowFeatureStream(max(1, sample_rate // FPS), sample_rate)
+    for block in stream_audio(video_path, sample_rate, cache=cache):
+        stream.push(block)
+    energy_values, spectral_values, tempo_values = stream.finish()
+    return energy_values, spectral_values, tempo_values, stream.band_energies(), stream.samples / sample_rate
+
+def finish_audio_features(energy_values, spectral_values, tempo_values, duration, bands=None,
+                          beat_source='peaks'):
+    """Normalize the raw features and run beat detection"""
+    energy_values = normalize_peak(energy_values)
+    spectral_values = normalize_peak(spectral_values)
+    tempo_values = normalize_peak(tempo_values)
     
     # Enhanced beat detection using multiple criteria
-    beats = detect_beats_enhanced(energy_values, spectral_values, tempo_values)
+    if beat_source == 'tempo':
+        bpm, beats = detect_beats_tempo(energy_values, FPS, bands)
+        print(f"Tempo estimate: {bpm:.1f} BPM")
+    elif beat_source == 'coarse':
+        beats = detect_beats_enhanced_coarse(energy_values, spectral_values, tempo_values,
+                                             MIN_BEAT_GAP, CONFIRMATION_WINDOW)
+    else:
+        beats = detect_beats_enhanced(energy_values, spectral_values, tempo_values,
+                                      MIN_BEAT_GAP, CONFIRMATION_WINDOW)
     
     print(f"Detected {len(beats)} beats in {len(energy_values)} frames")
-    return energy_values, beats, duration
-
-def detect_beats_enhanced(energy_values, spectral_values, tempo_values):
-    """Enhanced beat detection using multiple audio features"""
-    beats = []
-    
-    if len(energy_values) < 10:
-        return beats
-    
-    # Adaptive thresholding
-    energy_threshold = np.mean(energy_values) + 0.5 * np.std(energy_values)
-    spectral_threshold = np.mean(spectral_values) + 0.3 * np.std(spectral_values) if spectral_values else 0
-    tempo_threshold = np.mean(tempo_values) + 0.4 * np.std(tempo_values) if tempo_values else 0
-    
-    min_beat_gap = 6  # Minimum frames between beats
-    beat_confirmation_window = 3
-    
-    for i in range(beat_confirmation_window, len(energy_values) - beat_confirmation_window):
-        # Multi-criteria beat detection
-        energy_peak = (energy_values[i] > energy_threshold and 
-                      energy_values[i] > energy_values[i-1] and 
-                      energy_values[i] > energy_values[i+1])
-        
-        spectral_peak = (spectral_values and i < len(spectral_values) and
-                        spectral_values[i] > spectral_threshold)
-        
-        tempo_peak = (tempo_values and i < len(tempo_values) and
-                     tempo_values[i] > tempo_threshold)
-        
-        # Require at least energy peak + one other criterion
-        is_beat = energy_peak and (spectral_peak or tempo_peak)
-        
-        # Additional confirmation: check if it's a local maximum
-        if is_beat:
-            local_max = all(energy_values[i] >= energy_values[j] 
-                           for j in range(max(0, i-beat_confirmation_window), 
-                                        min(len(energy_values), i+beat_confirmation_window+1)))
-            
-            if local_max and (not beats or i - beats[-1] >= min_beat_gap):
-                # Final check: significant energy increase
-                if i > 0 and energy_values[i] > energy_values[i-1] * 1.2:
-                    beats.append(i)
-    
-    return beats
+    return energy_values, beats, duration, bands.normalized() if bands is not None else None
 
 def generate_synthetic_features(duration):
     """Generate synthetic audio features when extraction fails"""
@@ -1330,17 +1431,101 @@ def generate_synthetic_features(duration):
         if i % int(FPS / base_tempo) == 0 and random.random() > 0.4:
             beats.append(i)
     
-    return energy_values, beats, duration
+    return energy_values, beats, duration, None
 
-def main(input_video_path, output_path):
-    # Extract enhanced audio features
-    energy_values, beats, duration = extract_audio_features(input_video_path)
-    total_frames = int(duration * FPS)
+def analyze_audio(video_path, cache=None, streaming=False, beat_source='peaks', workers=1, store=None,
+                  features_file=None, analyze_only=False, profile='full'):
+    """extract_audio_features through the feature store, or from a saved feature file"""
+    sample_rate = ANALYSIS_PROFILES[profile]
+    
+    def analyze():
+        energy_values, beats, duration, bands = extract_audio_features(video_path, cache, streaming,
+                                                                       beat_source, workers, sample_rate)
+        features = {'energy': np.asarray(energy_values), 'beats': np.asarray(beats, dtype=np.int64),
+                    'duration': duration}
+        if bands is not None:
+            features['band_energy'] = bands.energy
+            features['band_onset'] = bands.onset
+        # Synthetic fallback features (no usable audio) are not worth keeping
+        return features, bands is not None
+    
+    params = {'fps': FPS, 'sample_rate': sample_rate, 'beat_source': beat_source, 'min_beat_gap': MIN_BEAT_GAP,
+              'confirmation_window': CONFIRMATION_WINDOW}
+    features = resolve_features(video_path, 'mk2b', FEATURE_VERSION, params, analyze, store,
+                                features_file, analyze_only)
+    bands = None
+    if 'band_energy' in features:
+        bands = BandEnergies(features['band_energy'], features['band_onset'])
+    return features['energy'], features['beats'].tolist(), features['duration'], bands
+
+def report_profile_agreement(video_path, cache=None, beat_source='peaks', workers=1):
+    """Analyze with the full and fast profiles and print how closely the fast one agrees"""
+    results = {}
+    for profile in ('full', 'fast'):
+        start = time.perf_counter()
+        energy_values, beats, _, _ = extract_audio_features(video_path, cache, False, beat_source, workers,
+                                                            ANALYSIS_PROFILES[profile])
+        results[profile] = (np.asarray(energy_values), beats, time.perf_counter() - start)
     
-    print(f"Processing {total_frames} frames with {len(beats)} beat markers...")
+    (full_energy, full_beats, full_time), (fast_energy, fast_beats, fast_time) = results['full'], results['fast']
+    tolerance = max(1, int(round(BEAT_TOLERANCE * FPS)))
+    agreement = beat_agreement(full_beats, fast_beats, tolerance)
+    count = min(len(full_energy), len(fast_energy))
+    correlation = np.corrcoef(full_energy[:count], fast_energy[:count])[0, 1] if count > 1 else float('nan')
+    
+    print(f"\nFast profile ({ANALYSIS_PROFILES['fast']} Hz) vs full ({ANALYSIS_PROFILES['full']} Hz):")
+    print(f"   • Beats: {len(fast_beats)} fast / {len(full_beats)} full, "
+          f"F-measure {agreement['f_measure']:.3f} within ±{tolerance} frames "
+          f"(precision {agreement['precision']:.3f}, recall {agreement['recall']:.3f})")
+    print(f"   • Mean beat offset: {agreement['mean_offset']:.2f} frames "
+          f"({agreement['mean_offset'] * 1000 / FPS:.1f} ms)")
+    print(f"   • Energy curve correlation: {correlation:.3f}")
+    print(f"   • Analysis time: {fast_time:.2f}s fast vs {full_time:.2f}s full "
+          f"({full_time / max(fast_time, 1e-9):.1f}x faster)")
+    return agreement
+
+def pipelined_features(video_path, cache=None, profile='full'):
+    """Video duration and a PipelinedFeatures timeline that fills in while rendering"""
+    duration = get_video_duration(video_path)
+    sample_rate = frame_aligned_rate(ANALYSIS_PROFILES[profile], FPS)
+    blocks = stream_audio(video_path, sample_rate, cache=cache, block_seconds=PIPELINE_BLOCK_SECONDS)
+    
+    def fallback():
+        # The same synthetic features the non-pipelined path falls back to
+        energy_values, beats, _, _ = generate_synthetic_features(duration)
+        return FeatureTimeline(int(duration * FPS), energy_values, beats,
+                               beat_strength=rise_strength(energy_values, beats))
+    
+    return duration, PipelinedFeatures(blocks, sample_rate, FPS, int(duration * FPS), rise=True,
+                                       fallback=fallback)
+
+def main(input_video_path, output_path, cache=None, streaming=False, beat_source='peaks', workers=1,
+         store=None, features_file=None, analyze_only=False, profile='full', pipelined=False):
+    if analyze_only:
+        # Analyzing only stores the whole-track analysis, which the pipelined path never makes
+        pipelined = False
+    if pipelined:
+        # Analysis runs ahead of the render loop on a background thread
+        duration, timeline = pipelined_features(input_video_path, cache, profile)
+        total_frames = len(timeline)
+        print(f"Processing {total_frames} frames while the audio is analyzed...")
+    else:
+        # Extract enhanced audio features
+        energy_values, beats, duration, bands = analyze_audio(
+            input_video_path, cache, streaming, beat_source, workers, store, features_file, analyze_only,
+            profile)
+        if analyze_only:
+            return
+        total_frames = int(duration * FPS)
+        timeline = FeatureTimeline(total_frames, energy_values, beats,
+                                   beat_strength=rise_strength(energy_values, beats),
+                                   bands=bands.energy if bands is not None else None)
+        print(f"Processing {total_frames} frames with {len(beats)} beat markers...")
     
     # Initialize enhanced game objects
     robot = Robot(50, HEIGHT - 350)
+    robot.sprites.bake(common_robot_poses())
+    print(f"Robot sprite atlas: {robot.sprites.report()}")
     platform_generator = PlatformGenerator()
     particles = []
     
@@ -1355,25 +1540,15 @@ def main(input_video_path, output_path):
     
     # Create pygame surface
     screen = pygame.Surface((WIDTH, HEIGHT))
+    background = GradientBackground((WIDTH, HEIGHT), 6, BACKGROUND_COLOR, (25, 25, 45))
+    hud = Hud()
     
     # Performance tracking
     frames_processed = 0
     life_reset = 0
     for frame in range(total_frames):
-        # Get enhanced audio features
-        audio_energy = 0
-        beat_detected = False
-        beat_strength = 0
-        
-        if frame < len(energy_values):
-            audio_energy = energy_values[frame]
-            if frame in beats:
-                beat_detected = True
-                # Calculate beat strength based on surrounding energy
-                beat_strength = audio_energy
-                if frame > 0:
-                    beat_strength += (audio_energy - energy_values[frame-1])
-                beat_strength = max(0, min(1, beat_strength))
+        # Get enhanced audio features (beat strength is based on surrounding energy)
+        audio_energy, beat_detected, beat_strength, _, band_levels = timeline[frame]
         
         # Enhanced camera shake
         if beat_detected and beat_strength > 0.6:
@@ -1403,9 +1578,10 @@ def main(input_video_path, output_path):
                     platform_generator.get_enemies(),
                     audio_energy, 
                     beat_detected, 
-                    frame)
+                    frame,
+                    band_levels)
         
-        platform_generator.update(camera_x)
+        platform_generator.update(camera_x, band_levels)
         
         # Update particles with better cleanup
         particles = [p for p in particles if p.update()]
@@ -1423,36 +1599,13 @@ def main(input_video_path, output_path):
                     "spark"
                 ))
         
-        # Enhanced background rendering
-        screen.fill(BACKGROUND_COLOR)
-        
-        # Dynamic background with music response
-        pulse_strength = int(audio_energy * 30)
-        beat_flash = int(beat_strength * 40) if beat_detected else 0
-        
-        background_base = tuple(min(255, c + pulse_strength + beat_flash) for c in BACKGROUND_COLOR)
-        screen.fill(background_base)
-        
-        # Gradient background layers
-        gradient_layers = HEIGHT // 6
-        for i in range(gradient_layers):
-            layer_alpha = i / gradient_layers
-            layer_pulse = int(audio_energy * 15 * layer_alpha)
-            
-            color = (
-                min(255, int(BACKGROUND_COLOR[0] + layer_alpha * 25 + layer_pulse)),
-                min(255, int(BACKGROUND_COLOR[1] + layer_alpha * 25 + layer_pulse)),
-                min(255, int(BACKGROUND_COLOR[2] + layer_alpha * 45 + layer_pulse))
-            )
-            
-            pygame.draw.rect(screen, color, (0, i * 6, WIDTH, 6))
+        # Gradient background layers (cover the whole screen), pulsing more towards the bottom
+        layer_pulse = (audio_energy * 15 * background.progress).astype(np.int32)
+        background.draw(screen, layer_pulse)
         
         # Beat flash effect
         if beat_detected and beat_strength > 0.8:
-            flash_overlay = pygame.Surface((WIDTH, HEIGHT))
-            flash_overlay.set_alpha(int(beat_strength * 30))
-            flash_overlay.fill((255, 255, 255))
-            screen.blit(flash_overlay, (0, 0))
+            blend_toward(screen, (255, 255, 255), int(beat_strength * 30), effect_surfaces)
         
         # Draw game objects in proper order
         
@@ -1482,106 +1635,19 @@ def main(input_video_path, output_path):
         for particle in foreground_particles:
             particle.draw(screen, camera_x)
         
-        # Enhanced UI with better styling
-        try:
-            font_large = pygame.font.Font(None, 32)
-            font_medium = pygame.font.Font(None, 24)
-            font_small = pygame.font.Font(None, 20)
-        except:
-            font_large = pygame.font.SysFont('Arial', 28, bold=True)
-            font_medium = pygame.font.SysFont('Arial', 20, bold=True)
-            font_small = pygame.font.SysFont('Arial', 16)
-        
         # UI Background panel
-        ui_panel = pygame.Surface((280, 120))
-        ui_panel.set_alpha(180)
-        ui_panel.fill((0, 0, 0))
+        ui_panel = effect_surfaces.get((280, 120), color=(0, 0, 0), alpha=180)
         screen.blit(ui_panel, (10, 10))
         
-        # Coins collected with icon
-        pygame.draw.circle(screen, COIN_GOLD, (25, 25), 8)
-        pygame.draw.circle(screen, COIN_YELLOW, (25, 25), 6)
-        coin_text = font_medium.render(f": {robot.coins_collected}", True, COIN_GOLD)
-        screen.blit(coin_text, (40, 18))
-        
-        # Super coins
-        if robot.super_coins_collected > 0:
-            pygame.draw.circle(screen, COIN_GOLD, (25, 45), 10)
-            pygame.draw.circle(screen, (255, 255, 255), (25, 45), 8)
-            pygame.draw.circle(screen, COIN_GOLD, (25, 45), 6)
-            super_coin_text = font_small.render(f": {robot.super_coins_collected}", True, (255, 255, 255))
-            screen.blit(super_coin_text, (40, 40))
-        
-        # Combo multiplier with glow effect
-        if robot.combo_multiplier > 1.2:
-            combo_glow = int((robot.combo_multiplier - 1) * 100)
-            combo_color = (255, min(255, 200 + combo_glow), min(255, 100 + combo_glow))
-            combo_text = font_medium.render(f"COMBO: {robot.combo_multiplier:.1f}x", True, combo_color)
-            
-            # Glow effect for high combos
-            if robot.combo_multiplier > 2.0:
-                glow_surface = font_medium.render(f"COMBO: {robot.combo_multiplier:.1f}x", True, (255, 255, 255))
-                glow_surface.set_alpha(100)
-                screen.blit(glow_surface, (12, 62))
-                screen.blit(glow_surface, (8, 62))
-                screen.blit(glow_surface, (10, 60))
-                screen.blit(glow_surface, (10, 64))
-            
-            screen.blit(combo_text, (10, 62))
-        
-        # Speed boost indicator with motion blur effect
-        if robot.speed_boost > 2:
-            speed_intensity = min(255, int(robot.speed_boost * 25))
-            speed_color = (255, speed_intensity, 0)
-            speed_text = font_medium.render("SPEED BOOST!", True, speed_color)
-            
-            # Motion blur effect
-            for offset in range(3):
-                blur_alpha = 100 - offset * 30
-                blur_surface = font_medium.render("SPEED BOOST!", True, speed_color)
-                blur_surface.set_alpha(blur_alpha)
-                screen.blit(blur_surface, (10 + offset * 2, 85))
-            
-            screen.blit(speed_text, (10, 85))
-        
-        # Lives indicator (enhanced hearts)
-        if robot.lives < 3:
-            for i in range(3):
-                heart_x = WIDTH - 120 + i * 25
-                heart_y = 25
-                
-                if i < robot.lives:
-                    # Alive heart
-                    pygame.draw.circle(screen, (255, 50, 50), (heart_x - 3, heart_y - 2), 8)
-                    pygame.draw.circle(screen, (255, 50, 50), (heart_x + 3, heart_y - 2), 8)
-                    pygame.draw.polygon(screen, (255, 50, 50), [
-                        (heart_x - 8, heart_y + 2),
-                        (heart_x, heart_y + 12),
-                        (heart_x + 8, heart_y + 2)
-                    ])
-                    # Shine
-                    pygame.draw.circle(screen, (255, 150, 150), (heart_x - 2, heart_y - 1), 3)
-                else:
-                    # Empty heart
-                    pygame.draw.circle(screen, (100, 100, 100), (heart_x - 3, heart_y - 2), 8, 2)
-                    pygame.draw.circle(screen, (100, 100, 100), (heart_x + 3, heart_y - 2), 8, 2)
-                    pygame.draw.polygon(screen, (100, 100, 100), [
-                        (heart_x - 8, heart_y + 2),
-                        (heart_x, heart_y + 12),
-                        (heart_x + 8, heart_y + 2)
-                    ], 2)
+        # Coins, combo, speed boost and lives (rebuilt only when a shown value changes)
+        hud.draw(screen, robot)
         
         # Audio visualization (enhanced)
         if audio_energy > 0:
             # Energy bar
-            bar_width = int(audio_energy * 120)
-            bar_height = 8
             bar_x = WIDTH - 140
             bar_y = 50
             
-            # Background
-            pygame.draw.rect(screen, (50, 50, 50), (bar_x, bar_y, 120, bar_height), border_radius=4)
-            
             # Energy level with color coding
             if audio_energy > 0.8:
                 bar_color = (255, 100, 100)  # Red for high energy
@@ -1590,10 +1656,10 @@ def main(input_video_path, output_path):
             else:
                 bar_color = (100, 255, 100)  # Green for low energy
             
-            pygame.draw.rect(screen, bar_color, (bar_x, bar_y, bar_width, bar_height), border_radius=4)
+            hud.energy_gauges[bar_color].draw(screen, (bar_x, bar_y), audio_energy)
             
             # Energy text
-            energy_text = font_small.render("ENERGY", True, (200, 200, 200))
+            energy_text = hud.text.render(hud.font_small, "ENERGY", (200, 200, 200))
             screen.blit(energy_text, (bar_x, bar_y - 15))
         
         # Beat indicator (enhanced)
@@ -1611,15 +1677,15 @@ def main(input_video_path, output_path):
                 ripple_size = beat_size + ripple * 8
                 ripple_alpha = max(0, beat_alpha - ripple * 80)
                 if ripple_alpha > 0:
-                    ripple_surface = pygame.Surface((ripple_size * 2, ripple_size * 2))
-                    ripple_surface.set_alpha(ripple_alpha)
+                    ripple_surface = effect_surfaces.get((ripple_size * 2, ripple_size * 2), color=(0, 0, 0),
+                                                         alpha=ripple_alpha, drawn=True)
                     pygame.draw.circle(ripple_surface, (255, 255, 255), 
                                      (ripple_size, ripple_size), ripple_size, 3)
                     screen.blit(ripple_surface, (WIDTH - 30 - ripple_size, 80 - ripple_size))
         
         # Performance indicator (frame counter for debugging)
         if frame % 60 == 0:  # Update every second
-            fps_text = font_small.render(f"Frame: {frame}", True, (150, 150, 150))
+            fps_text = hud.text.render(hud.font_small, f"Frame: {frame}", (150, 150, 150))
             screen.blit(fps_text, (10, HEIGHT - 25))
         
         # Game over screen
@@ -1628,22 +1694,20 @@ def main(input_video_path, output_path):
             if life_reset >= 200:
                 life_reset = 0
                 robot.lives = 3
-            game_over_overlay = pygame.Surface((WIDTH, HEIGHT))
-            game_over_overlay.set_alpha(200)
-            game_over_overlay.fill((0, 0, 0))
-            screen.blit(game_over_overlay, (0, 0))
+            blend_toward(screen, (0, 0, 0), 200, effect_surfaces)
             
-            game_over_text = font_large.render("GAME OVER", True, (255, 100, 100))
+            game_over_text = hud.text.render(hud.font_large, "GAME OVER", (255, 100, 100))
             game_over_rect = game_over_text.get_rect(center=(WIDTH//2, HEIGHT//2 - 50))
             screen.blit(game_over_text, game_over_rect)
             
-            final_score_text = font_medium.render(f"Final Score: {robot.coins_collected + robot.super_coins_collected * 5}", 
-                                                True, (255, 255, 255))
+            final_score_text = hud.text.render(hud.font_medium,
+                                               f"Final Score: {robot.coins_collected + robot.super_coins_collected * 5}",
+                                               (255, 255, 255))
             score_rect = final_score_text.get_rect(center=(WIDTH//2, HEIGHT//2))
             screen.blit(final_score_text, score_rect)
             
-            max_combo_text = font_medium.render(f"Max Combo: {robot.combo_multiplier:.1f}x", 
-                                              True, (255, 255, 255))
+            max_combo_text = hud.text.render(hud.font_medium, f"Max Combo: {robot.combo_multiplier:.1f}x",
+                                             (255, 255, 255))
             combo_rect = max_combo_text.get_rect(center=(WIDTH//2, HEIGHT//2 + 30))
             screen.blit(max_combo_text, combo_rect)
         
@@ -1673,6 +1737,9 @@ def main(input_video_path, output_path):
     # Cleanup and final statistics
     out.release()
     pygame.quit()
+    if pipelined:
+        timeline.close()
+        beats = timeline.beat_frames
     
     print(f"\n🎬 Animation saved to {output_path}")
     print(f"📊 Final Statistics:")
@@ -1683,11 +1750,10 @@ def main(input_video_path, output_path):
     print(f"   • Total beats detected: {len(beats)}")
     print(f"   • Video duration: {duration:.2f}s")
     print(f"   • Total frames: {total_frames}")
+    print(f"   • Robot sprites: {robot.sprites.report()}")
 
 if __name__ == "__main__":
-    import sys
-    
-    if len(sys.argv) != 3:
+    if len(sys.argv) < 3:
         print("🎵 Enhanced Music Platformer Visualizer")
         print("Usage: python enhanced_platformer.py <input_video.mp4> <output_animation.mp4>")
         print("\nFeatures:")
@@ -1700,15 +1766,45 @@ if __name__ == "__main__":
         print("  • Moving and special platforms")
         sys.exit(1)
     
-    input_video = sys.argv[1]
-    output_video = sys.argv[2]
+    parser = argparse.ArgumentParser(description='Enhanced Music Platformer Visualizer')
+    parser.add_argument('input_video', help='Input music video file (mp4)')
+    parser.add_argument('output_video', nargs='?', help='Output animation file (mp4)')
+    parser.add_argument('--streaming', action='store_true',
+                        help='Analyze audio in fixed-size blocks (flat memory use for long inputs)')
+    parser.add_argument('--beats', choices=['peaks', 'coarse', 'tempo'], default='peaks',
+                        help='Beat source: local energy peaks, the same peaks found coarse-to-fine, '
+                             'or a tracked tempo grid')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Processes for feature extraction (0 = one per CPU core; ignored with --streaming)')
+    parser.add_argument('--profile', choices=sorted(ANALYSIS_PROFILES), default='full',
+                        help='Analysis profile: full-rate audio, or fast (decoded at '
+                             f"{ANALYSIS_PROFILES['fast']} Hz, for batch previews)")
+    parser.add_argument('--profile-report', action='store_true',
+                        help='Compare the fast profile\'s beats with a full-rate analysis and exit')
+    parser.add_argument('--pipelined', action='store_true',
+                        help='Start rendering right away while a background thread analyzes the audio '
+                             '(causal analysis; ignores --beats/--workers/--features)')
+    add_cache_arguments(parser)
+    add_feature_arguments(parser)
+    args = parser.parse_args()
+    if not args.output_video and not (args.analyze_only or args.profile_report):
+        parser.error('output_video is required unless --analyze-only or --profile-report is given')
+    
+    input_video = args.input_video
+    output_video = args.output_video
     
     if not os.path.exists(input_video):
         print(f"❌ Error: Input video '{input_video}' not found")
         sys.exit(1)
     
+    if args.profile_report:
+        report_profile_agreement(input_video, cache_from_args(args), args.beats, resolve_workers(args.workers))
+        sys.exit(0)
+    
     print(f"🎵 Starting enhanced music platformer visualization...")
     print(f"📁 Input: {input_video}")
     print(f"💾 Output: {output_video}")
     
-    main(input_video, output_video)
\ No newline at end of file
+    main(input_video, output_video, cache_from_args(args), args.streaming, args.beats,
+         resolve_workers(args.workers), feature_store_from_args(args), args.features, args.analyze_only,
+         args.profile, args.pipelined)
\ No newline at end of file
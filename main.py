@@ -6,6 +6,17 @@ import math
 import argparse
 from pathlib import Path
 
+from musicvis.audio import decode_audio, load_audio, stream_audio
+from musicvis.feature_store import add_feature_arguments, feature_store_from_args, resolve_features
+from musicvis.features import FRAME_BATCH, BandEnergies, BandFeatureStream, SpectralFeatureStream
+from musicvis.online import OnlineAnalyzer
+from musicvis.parallel import resolve_workers, stft_magnitude
+from musicvis.pipeline import PIPELINE_BLOCK_SECONDS, PipelinedFeatures, frame_aligned_rate
+from musicvis.pcm_cache import add_cache_arguments, cache_from_args
+from musicvis.probe import probe_media, ProbeError
+from musicvis.tempo import beat_track
+from musicvis.timeline import FeatureTimeline
+
 class MusicRobot:
     def __init__(self, size=(200, 200)):
         self.size = size
@@ -27,7 +38,7 @@ class MusicRobot:
         self.arm_length_multiplier = 1.0
         self.beat_blink_timer = 0
         
-    def update(self, beat_strength, spectral_centroid, tempo_factor, rms_energy):
+    def update(self, beat_strength, spectral_centroid, tempo_factor, rms_energy, bands=None):
         """Update robot animation based on music features"""
         # Bounce based on beat strength
         self.bounce_offset = beat_strength * 20
@@ -48,6 +59,14 @@ class MusicRobot:
         # Arm length varies with energy
         self.arm_length_multiplier = 1.0 + (rms_energy * 0.4) + (beat_strength * 0.3)
         
+        # Optional (bass, mid, treble) levels: bass adds bounce, treble
+        # shakes the antenna, mids stretch the arms
+        if bands is not None:
+            bass, mid, treble = bands
+            self.bounce_offset += bass * 10
+            self.antenna_sway += treble * 15
+            self.arm_length_multiplier += mid * 0.2
+        
         # Eye blinking - occasional random blinks
         self.eye_blink = max(0, self.eye_blink - 0.15)
         
@@ -147,99 +166,291 @@ class MusicRobot:
         pygame.draw.circle(surface, (255, 255, 255), right_arm_end, hand_size)
 
 class MusicAnalyzer:
-    def __init__(self, audio_file, fps=30):
+    N_FFT = 2048  # STFT frame length shared by all features
+    FEATURE_VERSION = 1  # Bump whenever the analysis output changes (feature store key)
+    
+    def __init__(self, audio, fps=30, sr=None, beat_source='librosa', workers=1):
+        """audio is a decoded float32 signal (sr required) or a media file path.
+        
+        Paths are decoded by ffmpeg directly at sr (22050 Hz by default), so
+        there is no second decode or resampling pass through librosa.load.
+        beat_source is 'librosa' (librosa.beat.beat_track) or 'tempo' (the
+        in-house autocorrelation tracker in musicvis.tempo). With workers > 1
+        the STFT is computed by a process pool (identical result).
+        """
         self.fps = fps
-        self.y, self.sr = librosa.load(audio_file)
+        self.beat_source = beat_source
+        self.workers = workers
+        if isinstance(audio, np.ndarray):
+            if sr is None:
+                raise ValueError("sr is required when passing decoded samples")
+        else:
+            audio, sr = decode_audio(audio, sr or 22050)
+        if audio.ndim > 1:
+            # Downmix to mono for analysis
+            audio = audio.mean(axis=1)
+        self.y = np.ascontiguousarray(audio, dtype=np.float32)
+        self.sr = sr
         self.duration = len(self.y) / self.sr
         
         # Pre-compute audio features
         self.compute_features()
     
+    @classmethod
+    def from_blocks(cls, blocks, sr, fps=30, beat_source='librosa'):
+        """Analyze audio arriving as a sequence of sample blocks.
+        
+        Memory stays flat for arbitrarily long inputs: frames are analyzed as
+        the blocks arrive and only the per-frame features are kept. Beats are
+        tracked on a log-magnitude spectral flux envelope instead of
+        librosa's mel onset strength.
+        """
+        analyzer = cls.__new__(cls)
+        analyzer.fps = fps
+        analyzer.sr = sr
+        analyzer.beat_source = beat_source
+        analyzer.y = None
+        hop_length = int(sr / fps)
+        
+        stream = SpectralFeatureStream(sr, hop_length)
+        for block in blocks:
+            stream.push(block)
+        features = stream.finish()
+        analyzer.duration = stream.samples / sr
+        
+        tempo, beats = analyzer.track_beats(features['onset'], hop_length)
+        analyzer.tempo = tempo
+        analyzer.rms = features['rms']
+        analyzer.spectral_centroid = features['centroid']
+        analyzer._zcr = analyzer._normalize(features['zcr'])
+        analyzer.bands = features['bands'].normalized()
+        analyzer.finalize_features(beats, hop_length)
+        return analyzer
+    
     def compute_features(self):
         """Pre-compute all audio features for the entire track"""
         hop_length = int(self.sr / self.fps)
-        
-        # Beat tracking
-        tempo, beats = librosa.beat.beat_track(y=self.y, sr=self.sr, hop_length=hop_length)
+        self._zcr = None
+        
+        # One centered framing of the signal and one magnitude spectrogram,
+        # shared by every feature below (same framing as librosa's defaults).
+        # Both are built FRAME_BATCH frames at a time so the temporaries stay
+        # small however long the track is; only the per-frame results are kept.
+        n_frames = 1 + len(self.y) // hop_length
+        window = librosa.filters.get_window('hann', self.N_FFT, fftbins=True).astype(np.float32)
+        mel_basis = librosa.filters.mel(sr=self.sr, n_fft=self.N_FFT)
+        S = None
+        if self.workers > 1:
+            S = stft_magnitude(np.pad(self.y, self.N_FFT // 2), self.N_FFT, hop_length, window, self.workers)
+        
+        mel = np.empty((len(mel_basis), n_frames), dtype=np.float32)
+        self.rms = np.empty(n_frames, dtype=np.float32)
+        self.spectral_centroid = np.empty(n_frames)
+        bands = BandFeatureStream(self.N_FFT, self.sr)
+        for start in range(0, n_frames, FRAME_BATCH):
+            stop = min(n_frames, start + FRAME_BATCH)
+            frames = self.frame_batch(start, stop, hop_length)
+            if S is None:
+                magnitude = np.abs(np.fft.rfft(frames * window[:, np.newaxis], axis=0))
+            else:
+                magnitude = S[:, start:stop]
+            
+            # RMS energy (for beat strength and arm reactivity)
+            self.rms[start:stop] = np.sqrt(np.mean(frames ** 2, axis=0))
+            # Spectral centroid (brightness)
+            self.spectral_centroid[start:stop] = librosa.feature.spectral_centroid(
+                S=magnitude, sr=self.sr, n_fft=self.N_FFT)[0]
+            # Mel power for the onset envelope, as melspectrogram(S=S ** 2) computes it
+            mel[:, start:stop] = mel_basis @ (magnitude ** 2)
+            # Bass/mid/treble energies and onsets from the same spectrogram
+            bands.push(magnitude.T)
+        self.bands = bands.finish().normalized()
+        
+        # Beat tracking on the mel onset envelope, median-aggregated as beat_track(y=...) builds it
+        onset_envelope = librosa.onset.onset_strength(S=librosa.power_to_db(mel), sr=self.sr,
+                                                      hop_length=hop_length, aggregate=np.median)
+        tempo, beats = self.track_beats(onset_envelope, hop_length)
         self.tempo = tempo
         
-        # RMS energy (for beat strength and arm reactivity)
-        self.rms = librosa.feature.rms(y=self.y, hop_length=hop_length)[0]
-        
-        # Spectral centroid (brightness)
-        self.spectral_centroid = librosa.feature.spectral_centroid(y=self.y, sr=self.sr, hop_length=hop_length)[0]
-        
-        # Zero crossing rate (for additional arm movement variation)
-        self.zcr = librosa.feature.zero_crossing_rate(y=self.y, hop_length=hop_length)[0]
-        
+        self.finalize_features(beats, hop_length)
+    
+    def frame_batch(self, start, stop, hop_length):
+        """Frames start..stop of the zero-padded, centered signal as an (N_FFT, frames) array"""
+        offset = start * hop_length - self.N_FFT // 2
+        segment = np.zeros((stop - start - 1) * hop_length + self.N_FFT, dtype=np.float32)
+        first, last = max(0, offset), min(len(self.y), offset + len(segment))
+        if last > first:
+            segment[first - offset:last - offset] = self.y[first:last]
+        return librosa.util.frame(segment, frame_length=self.N_FFT, hop_length=hop_length)
+    
+    def track_beats(self, onset_envelope, hop_length):
+        """Tempo (BPM) and beat frames from the selected beat source"""
+        if self.beat_source == 'tempo':
+            return beat_track(onset_envelope, self.sr / hop_length)
+        return librosa.beat.beat_track(onset_envelope=onset_envelope, sr=self.sr, hop_length=hop_length)
+    
+    @property
+    def zcr(self):
+        """Zero crossing rate (for additional arm movement variation), computed on first use"""
+        if self._zcr is None:
+            hop_length = int(self.sr / self.fps)
+            self._zcr = self._normalize(librosa.feature.zero_crossing_rate(y=self.y, hop_length=hop_length)[0])
+        return self._zcr
+    
+    @staticmethod
+    def _normalize(values):
+        return (values - np.min(values)) / (np.max(values) - np.min(values))
+    
+    def finalize_features(self, beats, hop_length):
+        """Normalize the raw features, smooth the beat strength and build the timeline"""
         # Normalize features
-        self.rms = (self.rms - np.min(self.rms)) / (np.max(self.rms) - np.min(self.rms))
-        self.spectral_centroid = (self.spectral_centroid - np.min(self.spectral_centroid)) / (np.max(self.spectral_centroid) - np.min(self.spectral_centroid))
-        self.zcr = (self.zcr - np.min(self.zcr)) / (np.max(self.zcr) - np.min(self.zcr))
+        self.rms = self._normalize(self.rms)
+        self.spectral_centroid = self._normalize(self.spectral_centroid)
         
         # Beat strength detection
         self.beat_frames = librosa.frames_to_samples(beats, hop_length=hop_length)
         self.beat_strength = np.zeros(len(self.rms))
         
-        for beat_frame in self.beat_frames:
-            frame_idx = int(beat_frame * self.fps / self.sr)
-            if frame_idx < len(self.beat_strength):
-                self.beat_strength[frame_idx] = 1.0
+        beat_indices = self.beat_indices()
+        self.beat_strength[beat_indices[beat_indices < len(self.beat_strength)]] = 1.0
         
         # Smooth beat strength
         kernel = np.exp(-np.linspace(-2, 2, 10)**2)
         kernel = kernel / np.sum(kernel)
         self.beat_strength = np.convolve(self.beat_strength, kernel, mode='same')
+        self.build_timeline()
+    
+    def beat_indices(self):
+        """Video frame of every beat"""
+        return (np.asarray(self.beat_frames) * self.fps / self.sr).astype(int)
+    
+    def build_timeline(self):
+        self.timeline = FeatureTimeline(len(self.rms), self.rms, self.beat_indices(),
+                                        spectral=self.spectral_centroid,
+                                        beat_strength=self.beat_strength,
+                                        bands=self.bands.energy)
+    
+    def to_features(self):
+        """The finished analysis as a dict of arrays/scalars for the feature store"""
+        features = {
+            'fps': self.fps,
+            'sr': self.sr,
+            'duration': self.duration,
+            'tempo': float(np.atleast_1d(self.tempo)[0]),
+            'rms': self.rms,
+            'spectral_centroid': self.spectral_centroid,
+            'beat_frames': np.asarray(self.beat_frames, dtype=np.int64),
+            'beat_strength': self.beat_strength,
+            'band_energy': self.bands.energy,
+            'band_onset': self.bands.onset,
+        }
+        # zcr is only stored once something has computed it; storing never triggers the pass
+        if self._zcr is not None:
+            features['zcr'] = self._zcr
+        return features
+    
+    @classmethod
+    def from_features(cls, features):
+        """Rebuild an analyzer from to_features() output without touching the audio"""
+        analyzer = cls.__new__(cls)
+        analyzer.y = None
+        analyzer.fps = features['fps']
+        analyzer.sr = features['sr']
+        analyzer.duration = features['duration']
+        analyzer.tempo = features['tempo']
+        analyzer.rms = features['rms']
+        analyzer.spectral_centroid = features['spectral_centroid']
+        analyzer._zcr = features.get('zcr')
+        analyzer.beat_frames = features['beat_frames']
+        analyzer.beat_strength = features['beat_strength']
+        analyzer.bands = BandEnergies(features['band_energy'], features['band_onset'])
+        analyzer.build_timeline()
+        return analyzer
+    
+    @property
+    def tempo_factor(self):
+        return float(np.atleast_1d(self.tempo)[0]) / 120.0  # Normalize around 120 BPM
+    
+    def frame_index(self, time_seconds):
+        """Timeline frame for a point in time, clamped to the analyzed audio"""
+        frame_idx = int(time_seconds * self.fps)
+        return max(0, min(frame_idx, len(self.timeline) - 1))
     
     def get_features_at_time(self, time_seconds):
         """Get audio features at a specific time"""
-        frame_idx = int(time_seconds * self.fps)
-        frame_idx = max(0, min(frame_idx, len(self.rms) - 1))
+        rms_energy, _, beat_strength, spectral_centroid, bands = self.timeline[self.frame_index(time_seconds)]
         
         return {
-            'beat_strength': self.beat_strength[frame_idx],
-            'spectral_centroid': self.spectral_centroid[frame_idx],
-            'tempo_factor': self.tempo / 120.0,  # Normalize around 120 BPM
-            'rms_energy': self.rms[frame_idx]
+            'beat_strength': beat_strength,
+            'spectral_centroid': spectral_centroid,
+            'tempo_factor': self.tempo_factor,
+            'rms_energy': rms_energy,
+            'bands': bands
         }
 
-def create_robot_animation(input_video, output_video, robot_size=(200, 200)):
+def create_robot_animation(input_video, output_video, robot_size=(200, 200), cache=None, streaming=False,
+                           analysis_sr=22050, beat_source='librosa', online=False, workers=1, store=None,
+                           features_file=None, analyze_only=False, pipelined=False):
     """Create standalone robot animation video from input music video"""
     
     # Initialize pygame
     pygame.init()
     
-    # Load video to get timing info
-    cap = cv2.VideoCapture(input_video)
-    if not cap.isOpened():
+    # Probe the video once for timing info
+    try:
+        info = probe_media(input_video)
+    except ProbeError as e:
+        raise ValueError(f"Could not open video file: {input_video}") from e
+    if not info.has_video or not info.frame_count:
         raise ValueError(f"Could not open video file: {input_video}")
     
     # Get video properties
-    fps = int(cap.get(cv2.CAP_PROP_FPS))
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = int(info.fps)
+    total_frames = info.frame_count
     duration = total_frames / fps
     
-    cap.release()  # We only needed the timing info
-    
     print(f"Video: {fps} FPS, {total_frames} frames, {duration:.2f} seconds")
     print(f"Robot animation: {robot_size[0]}x{robot_size[1]}")
     
-    # Extract audio for analysis
-    import tempfile
-    import subprocess
-    
-    with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_audio:
-        temp_audio_path = temp_audio.name
-    
-    # Extract audio using ffmpeg
-    cmd = [
-        'ffmpeg', '-i', input_video, '-vn', '-acodec', 'pcm_s16le', 
-        '-ar', '22050', '-ac', '1', '-y', temp_audio_path
-    ]
-    subprocess.run(cmd, check=True, capture_output=True)
-    
     # Initialize components
-    analyzer = MusicAnalyzer(temp_audio_path, fps=fps)
+    if analyze_only:
+        # Analyzing only stores the whole-track analysis, which the causal modes never make
+        online = pipelined = False
+    if online:
+        # Causal analysis of small blocks, as a live feed would deliver them, at
+        # a rate whose hop is a whole frame so features keep pace with the video
+        rate = frame_aligned_rate(analysis_sr, fps)
+        analyzer = OnlineAnalyzer(rate, fps=fps)
+        print(f"Online analysis: {analyzer.latency * 1000:.0f} ms lookahead latency")
+        frames = analyzer.frames(stream_audio(input_video, rate, cache=cache, block_seconds=0.1))
+    elif pipelined:
+        # Render from the first frame while a background thread analyzes ahead
+        rate = frame_aligned_rate(analysis_sr, fps)
+        analyzer = PipelinedFeatures(stream_audio(input_video, rate, cache=cache,
+                                                  block_seconds=PIPELINE_BLOCK_SECONDS),
+                                     rate, fps, total_frames)
+        frames = (analyzer[i] for i in range(total_frames))
+    else:
+        def analyze():
+            if streaming:
+                # Analyze block by block so long inputs never sit in memory whole
+                analyzer = MusicAnalyzer.from_blocks(stream_audio(input_video, analysis_sr, cache=cache),
+                                                     analysis_sr, fps=fps, beat_source=beat_source)
+            else:
+                # ffmpeg decodes (and resamples) straight to the analysis rate
+                audio, sample_rate = load_audio(input_video, analysis_sr, cache=cache, expected_duration=duration)
+                analyzer = MusicAnalyzer(audio, fps=fps, sr=sample_rate, beat_source=beat_source, workers=workers)
+            return analyzer.to_features(), True
+        
+        # The streaming analyzer has its own onset envelope, so it is keyed separately
+        params = {'fps': fps, 'sample_rate': analysis_sr, 'beat_source': beat_source,
+                  'n_fft': MusicAnalyzer.N_FFT, 'streaming': streaming}
+        features = resolve_features(input_video, 'robot', MusicAnalyzer.FEATURE_VERSION, params, analyze,
+                                    store, features_file, analyze_only)
+        if analyze_only:
+            pygame.quit()
+            return
+        analyzer = MusicAnalyzer.from_features(features)
     robot = MusicRobot(robot_size)
     
     # Create pygame surface for robot
@@ -249,22 +460,23 @@ def create_robot_animation(input_video, output_video, robot_size=(200, 200)):
     fourcc = cv2.VideoWriter_fourcc(*'mp4v')
     out = cv2.VideoWriter(output_video, fourcc, fps, robot_size)
     
+    if not online and not pipelined:
+        frames = (analyzer.timeline[analyzer.frame_index(i / fps)] for i in range(total_frames))
+    silence = (0.0, False, 0.0, 0.0, (0.0, 0.0, 0.0))
     frame_count = 0
     
     try:
         for frame_count in range(total_frames):
-            # Get current time
-            current_time = frame_count / fps
-            
-            # Get audio features
-            features = analyzer.get_features_at_time(current_time)
+            # Get audio features for the current frame (silence once the audio ends)
+            rms_energy, _, beat_strength, spectral_centroid, bands = next(frames, silence)
             
             # Update robot with enhanced arm reactivity
             robot.update(
-                features['beat_strength'],
-                features['spectral_centroid'],
-                features['tempo_factor'],
-                features['rms_energy']
+                beat_strength,
+                spectral_centroid,
+                analyzer.tempo_factor,
+                rms_energy,
+                bands
             )
             
             # Draw robot
@@ -284,9 +496,8 @@ def create_robot_animation(input_video, output_video, robot_size=(200, 200)):
     finally:
         out.release()
         pygame.quit()
-        
-        # Clean up temp file
-        Path(temp_audio_path).unlink(missing_ok=True)
+        if pipelined:
+            analyzer.close()
     
     print(f"Robot animation saved to: {output_video}")
     print("This video has a black background and can be composited over your original video.")
@@ -298,6 +509,21 @@ def main():
                        default='robot_animation.mp4')
     parser.add_argument('--robot-size', nargs=2, type=int, default=[200, 200], 
                        help='Robot animation size (width height)')
+    parser.add_argument('--streaming', action='store_true',
+                       help='Analyze audio in fixed-size blocks (flat memory use for long inputs)')
+    parser.add_argument('--analysis-sr', type=int, default=22050,
+                       help='Sample rate ffmpeg decodes to for audio analysis (Hz)')
+    parser.add_argument('--beats', choices=['librosa', 'tempo'], default='librosa',
+                       help='Beat source: librosa beat tracker, or the fast in-house tempo tracker')
+    parser.add_argument('--online', action='store_true',
+                       help='Causal analysis with a fixed lookahead, as for a live feed (no whole-track pass)')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='Processes for the STFT (0 = one per CPU core; ignored with --streaming/--online)')
+    parser.add_argument('--pipelined', action='store_true',
+                       help='Start rendering right away while a background thread analyzes the audio '
+                            '(causal analysis, as with --online)')
+    add_cache_arguments(parser)
+    add_feature_arguments(parser)
     
     args = parser.parse_args()
     
@@ -311,7 +537,17 @@ def main():
     create_robot_animation(
         args.input_video,
         args.output,
-        tuple(args.robot_size)
+        tuple(args.robot_size),
+        cache_from_args(args),
+        args.streaming,
+        args.analysis_sr,
+        args.beats,
+        args.online,
+        resolve_workers(args.workers),
+        feature_store_from_args(args),
+        args.features,
+        args.analyze_only,
+        args.pipelined
     )
 
 if __name__ == "__main__":
@@ -0,0 +1 @@
+"""Shared audio and rendering helpers used by the music visualizers (main.py, Mk1, Mk2B)."""
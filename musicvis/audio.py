@@ -0,0 +1,191 @@
+import subprocess
+import threading
+
+import numpy as np
+
+# === Pipe-based audio decoding ===
+# ffmpeg writes raw float32 PCM to stdout and we read it straight into a
+# NumPy buffer, so no temporary WAV file ever touches the disk.
+
+FFMPEG_BINARY = 'ffmpeg'
+BYTES_PER_SAMPLE = 4  # float32
+READ_CHUNK_SAMPLES = 1 << 18  # Initial capacity when the duration is unknown
+BLOCK_SECONDS = 10.0  # Block length for streaming decodes
+
+
+class AudioDecodeError(RuntimeError):
+    """Raised when ffmpeg cannot decode an audio stream"""
+
+
+def build_ffmpeg_command(path, sample_rate, channels=1, tolerant=False):
+    """Build the ffmpeg command that streams raw float32 PCM to stdout"""
+    cmd = [FFMPEG_BINARY, '-nostdin', '-v', 'error']
+    if tolerant:
+        # Keep going past corrupt packets instead of aborting the decode
+        cmd += ['-err_detect', 'ignore_err', '-fflags', '+discardcorrupt']
+    cmd += [
+        '-i', path,
+        '-vn', '-acodec', 'pcm_f32le', '-f', 'f32le',
+        '-ar', str(sample_rate), '-ac', str(channels),
+        'pipe:1'
+    ]
+    return cmd
+
+
+def _drain(stream, sink):
+    """Collect a stream on a helper thread so ffmpeg never blocks on stderr"""
+    sink.append(stream.read())
+    stream.close()
+
+
+class _FFmpegProcess:
+    """ffmpeg child process with its stderr drained in the background"""
+
+    def __init__(self, cmd):
+        try:
+            self.proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except OSError as e:
+            raise AudioDecodeError(f"Could not run {FFMPEG_BINARY}: {e}") from e
+        self.stdout = self.proc.stdout
+        self.stderr = []
+        self.drain = threading.Thread(target=_drain, args=(self.proc.stderr, self.stderr), daemon=True)
+        self.drain.start()
+
+    def close(self):
+        """Wait for ffmpeg to exit; raise AudioDecodeError if it failed"""
+        self.stdout.close()
+        returncode = self.proc.wait()
+        self.drain.join()
+        message = b''.join(self.stderr).decode('utf-8', 'replace').strip()
+        if returncode != 0:
+            raise AudioDecodeError(message or f"ffmpeg exited with status {returncode}")
+        return message
+
+    def kill(self):
+        """Stop ffmpeg early without reporting an error"""
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.stdout.close()
+        self.proc.wait()
+        self.drain.join()
+
+
+def _fill(stream, raw, filled=0):
+    """Read from a pipe until the byte view is full or the stream ends"""
+    while filled < len(raw):
+        count = stream.readinto(raw[filled:])
+        if not count:
+            break
+        filled += count
+    return filled
+
+
+def _read_pcm(stream, capacity):
+    """Read float32 PCM from a pipe into a preallocated, growable buffer"""
+    buffer = np.empty(max(1, capacity), dtype=np.float32)
+    raw = memoryview(buffer).cast('B')
+    filled = 0
+
+    while True:
+        filled = _fill(stream, raw, filled)
+        if filled < len(raw):
+            break
+        # Duration hint was short - grow geometrically
+        grown = np.empty(len(buffer) * 2, dtype=np.float32)
+        grown[:len(buffer)] = buffer
+        buffer = grown
+        raw = memoryview(buffer).cast('B')
+
+    samples = filled // BYTES_PER_SAMPLE
+    if samples < len(buffer) * 0.9:
+        # Release the unused tail instead of pinning the whole allocation
+        return buffer[:samples].copy()
+    return buffer[:samples]
+
+
+def _shape_channels(audio, channels):
+    if channels > 1:
+        return audio[:len(audio) - len(audio) % channels].reshape(-1, channels)
+    return audio
+
+
+def decode_audio(path, sample_rate=22050, channels=1, expected_duration=None, tolerant=False):
+    """Decode the audio track of a media file into a float32 array in [-1, 1].
+
+    Returns (samples, sample_rate). Mono audio is 1-D; multichannel audio has
+    shape (frames, channels). expected_duration (seconds) is used to size the
+    buffer up front so the decode does not need to reallocate.
+    """
+    if expected_duration:
+        # One extra second of headroom for container/stream length mismatch
+        capacity = int((expected_duration + 1.0) * sample_rate) * channels
+    else:
+        capacity = READ_CHUNK_SAMPLES * channels
+
+    process = _FFmpegProcess(build_ffmpeg_command(path, sample_rate, channels, tolerant))
+    try:
+        audio = _read_pcm(process.stdout, capacity)
+    except BaseException:
+        process.kill()
+        raise
+    message = process.close()
+
+    if len(audio) == 0:
+        raise AudioDecodeError(message or "No audio samples decoded")
+    return _shape_channels(audio, channels), sample_rate
+
+
+def iter_audio_blocks(path, sample_rate=22050, channels=1, block_seconds=BLOCK_SECONDS, tolerant=False):
+    """Yield the decoded audio track in fixed-size blocks straight from ffmpeg.
+
+    Only one block is resident at a time: every yielded array is a view of
+    the same reused buffer, so consumers must copy anything they keep.
+    """
+    block_samples = max(1, int(block_seconds * sample_rate))
+    buffer = np.empty(block_samples * channels, dtype=np.float32)
+    raw = memoryview(buffer).cast('B')
+    yielded = False
+
+    process = _FFmpegProcess(build_ffmpeg_command(path, sample_rate, channels, tolerant))
+    try:
+        while True:
+            filled = _fill(process.stdout, raw)
+            samples = filled // BYTES_PER_SAMPLE
+            if samples:
+                yielded = True
+                yield _shape_channels(buffer[:samples], channels)
+            if filled < len(raw):
+                break
+    except BaseException:
+        # Consumer stopped early (or failed) - don't leave ffmpeg running
+        process.kill()
+        raise
+    message = process.close()
+
+    if not yielded:
+        raise AudioDecodeError(message or "No audio samples decoded")
+
+
+def iter_array_blocks(audio, sample_rate, block_seconds=BLOCK_SECONDS):
+    """Yield an in-memory or memory-mapped signal in fixed-size blocks"""
+    block_samples = max(1, int(block_seconds * sample_rate))
+    for start in range(0, len(audio), block_samples):
+        yield audio[start:start + block_samples]
+
+
+def stream_audio(path, sample_rate=22050, channels=1, cache=None, block_seconds=BLOCK_SECONDS,
+                 tolerant=False):
+    """Yield audio blocks from the PCM cache when it has the file, else from ffmpeg"""
+    if cache is not None:
+        cached = cache.get(path, sample_rate, channels)
+        if cached is not None:
+            yield from iter_array_blocks(cached, sample_rate, block_seconds)
+            return
+    yield from iter_audio_blocks(path, sample_rate, channels, block_seconds, tolerant)
+
+
+def load_audio(path, sample_rate=22050, channels=1, cache=None, **decode_kwargs):
+    """Decode audio, going through a PCMCache when one is given"""
+    if cache is not None:
+        return cache.load(path, sample_rate, channels, **decode_kwargs)
+    return decode_audio(path, sample_rate, channels, **decode_kwargs)
@@ -0,0 +1,260 @@
+"""Beat detector evaluation on synthetic signals with known beat times.
+
+Run with:  python -m musicvis.beat_eval [--cases ...] [--detectors ...]
+
+Every case is rendered in NumPy at the detector's own sample rate, every
+detector runs its full pipeline (feature extraction, normalization and beat
+picking, as the visualizers do), and detected frames are turned into times
+at the video frame rate the visualizer would show them at.
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from musicvis.beats import (detect_beats_adaptive, detect_beats_adaptive_coarse, detect_beats_enhanced,
+                            detect_beats_enhanced_coarse, detect_beats_tempo, match_beats)
+from musicvis.features import (ChunkFeatureStream, SpectralFeatureStream, WindowFeatureStream,
+                               normalize_peak, normalize_percentile)
+from musicvis.online import OnlineAnalyzer
+from musicvis.tempo import beat_track
+
+TOLERANCE = 0.07  # Seconds within which a detected beat counts as a hit
+CASE_SECONDS = 60.0
+NOISE_LEVEL = 0.005  # Background noise, so silence is not digital zero
+
+
+# === Synthetic test signals ===
+
+def _hit(sample_rate, pitch=150.0, length=0.12, seed=0):
+    """A short drum-like hit: a decaying pitched thump plus a noise transient"""
+    t = np.arange(int(length * sample_rate)) / sample_rate
+    rng = np.random.default_rng(seed)
+    thump = np.sin(2 * np.pi * pitch * t) * np.exp(-t * 30)
+    transient = rng.standard_normal(len(t)) * np.exp(-t * 120) * 0.5
+    return (thump + transient).astype(np.float32)
+
+
+def render_hits(times, duration, sample_rate, gains=None, pitches=None, seed=0):
+    """Mix hits at the given times (seconds) over a quiet noise floor"""
+    rng = np.random.default_rng(seed)
+    signal = (rng.standard_normal(int(duration * sample_rate)) * NOISE_LEVEL).astype(np.float32)
+    for i, start in enumerate(times):
+        gain = 1.0 if gains is None else gains[i]
+        hit = _hit(sample_rate, 150.0 if pitches is None else pitches[i], seed=i) * gain
+        first = int(start * sample_rate)
+        last = min(len(signal), first + len(hit))
+        if first < last:
+            signal[first:last] += hit[:last - first]
+    return signal / max(1.0, float(np.abs(signal).max()))
+
+
+def click_track(sample_rate, bpm=120.0, duration=CASE_SECONDS):
+    """Evenly spaced hits; every hit is a beat"""
+    beats = np.arange(0.5, duration - 0.5, 60.0 / bpm)
+    return render_hits(beats, duration, sample_rate), beats
+
+
+def tempo_ramp(sample_rate, start_bpm=90.0, end_bpm=150.0, duration=CASE_SECONDS):
+    """Hits whose tempo rises linearly from start_bpm to end_bpm"""
+    # Beat k falls where the accumulated beat phase reaches k
+    rate = (end_bpm - start_bpm) / duration
+    phase_end = (start_bpm * duration + rate * duration ** 2 / 2) / 60.0
+    k = np.arange(1, int(phase_end))
+    beats = (-start_bpm + np.sqrt(start_bpm ** 2 + 120.0 * rate * k)) / rate
+    return render_hits(beats, duration, sample_rate), beats
+
+
+def syncopated(sample_rate, bpm=110.0, duration=CASE_SECONDS):
+    """Accented beats with quieter off-beat hits (the 'and' of 2, the 'a' of 4)"""
+    period = 60.0 / bpm
+    beats = np.arange(0.5, duration - 1.0, period)
+    times, gains, pitches = [], [], []
+    for i, beat in enumerate(beats):
+        times.append(beat)
+        gains.append(1.0)
+        pitches.append(150.0 if i % 2 == 0 else 220.0)
+        if i % 4 == 1:
+            times.append(beat + period / 2)
+        elif i % 4 == 3:
+            times.append(beat + period * 3 / 4)
+        else:
+            continue
+        gains.append(0.45)
+        pitches.append(400.0)
+    order = np.argsort(times)
+    signal = render_hits(np.array(times)[order], duration, sample_rate,
+                         np.array(gains)[order], np.array(pitches)[order])
+    return signal, beats
+
+
+def silence_gaps(sample_rate, bpm=100.0, duration=CASE_SECONDS, gap=4.0, every=12.0):
+    """A click track with a few seconds of silence every `every` seconds"""
+    beats = np.arange(0.5, duration - 0.5, 60.0 / bpm)
+    beats = beats[(beats % every) < every - gap]
+    return render_hits(beats, duration, sample_rate), beats
+
+
+CASES = {
+    'click': click_track,
+    'ramp': tempo_ramp,
+    'syncopation': syncopated,
+    'gaps': silence_gaps,
+}
+
+
+# === Detector pipelines ===
+# Each takes (signal, sample_rate) and returns beat times in seconds.
+
+PLATFORMER_FPS = 60
+OVERLAY_FPS = 30
+
+
+def _mk1_features(signal, sample_rate):
+    stream = ChunkFeatureStream(max(1, sample_rate // PLATFORMER_FPS), sample_rate=sample_rate)
+    stream.push(signal)
+    energy, spectral = stream.finish()
+    return normalize_percentile(energy, 95), normalize_peak(spectral), stream.band_energies()
+
+
+def _mk2b_features(signal, sample_rate):
+    stream = WindowFeatureStream(max(1, sample_rate // PLATFORMER_FPS), sample_rate)
+    stream.push(signal)
+    energy, spectral, flux = stream.finish()
+    return normalize_peak(energy), normalize_peak(spectral), normalize_peak(flux), stream.band_energies()
+
+
+def mk1_peaks(signal, sample_rate, detect=detect_beats_adaptive):
+    energy, spectral, _ = _mk1_features(signal, sample_rate)
+    return np.asarray(detect(energy, spectral, len(signal) / sample_rate)) / PLATFORMER_FPS
+
+
+def mk1_coarse(signal, sample_rate):
+    return mk1_peaks(signal, sample_rate, detect_beats_adaptive_coarse)
+
+
+def mk1_tempo(signal, sample_rate):
+    energy, _, bands = _mk1_features(signal, sample_rate)
+    _, beats = detect_beats_tempo(energy, PLATFORMER_FPS, bands)
+    return np.asarray(beats) / PLATFORMER_FPS
+
+
+def mk2b_peaks(signal, sample_rate, detect=detect_beats_enhanced):
+    energy, spectral, flux, _ = _mk2b_features(signal, sample_rate)
+    return np.asarray(detect(energy, spectral, flux)) / PLATFORMER_FPS
+
+
+def mk2b_coarse(signal, sample_rate):
+    return mk2b_peaks(signal, sample_rate, detect_beats_enhanced_coarse)
+
+
+def overlay_tempo(signal, sample_rate):
+    """main.py --beats tempo --streaming: spectral-flux onsets, tempo-grid beats"""
+    hop = int(sample_rate / OVERLAY_FPS)
+    stream = SpectralFeatureStream(sample_rate, hop)
+    stream.push(signal)
+    _, beats = beat_track(stream.finish()['onset'], sample_rate / hop)
+    return beats * hop / sample_rate
+
+
+def overlay_librosa(signal, sample_rate):
+    """main.py default: librosa's beat tracker on its onset strength envelope"""
+    import librosa
+    hop = int(sample_rate / OVERLAY_FPS)
+    onset = librosa.onset.onset_strength(y=signal, sr=sample_rate, hop_length=hop, aggregate=np.median)
+    _, beats = librosa.beat.beat_track(onset_envelope=onset, sr=sample_rate, hop_length=hop)
+    return librosa.frames_to_samples(beats, hop_length=hop) / sample_rate
+
+
+def overlay_online(signal, sample_rate):
+    """main.py --online: causal analyzer, beats stamped at their frame's end"""
+    analyzer = OnlineAnalyzer(sample_rate, fps=OVERLAY_FPS)
+    beats = [i for i, frame in enumerate(analyzer.frames([signal])) if frame[1]]
+    return (np.asarray(beats) + 1) * analyzer.hop_length / sample_rate
+
+
+# name -> (function, sample rate it runs at in the visualizers)
+DETECTORS = {
+    'mk1-peaks': (mk1_peaks, 22050),
+    'mk1-coarse': (mk1_coarse, 22050),
+    'mk1-tempo': (mk1_tempo, 22050),
+    'mk2b-peaks': (mk2b_peaks, 44100),
+    'mk2b-coarse': (mk2b_coarse, 44100),
+    'mk2b-fast': (mk2b_peaks, 9600),
+    'overlay-librosa': (overlay_librosa, 22050),
+    'overlay-tempo': (overlay_tempo, 22050),
+    'overlay-online': (overlay_online, 22050),
+}
+
+
+# === Scoring ===
+
+def score(reference, detected, tolerance=TOLERANCE):
+    """F-measure, precision, recall and timing error (ms) of detected beat times"""
+    to_ms = lambda times: np.round(np.asarray(times, dtype=np.float64) * 1000).astype(np.int64)
+    offsets = match_beats(to_ms(reference), to_ms(detected), int(round(tolerance * 1000)))
+    hits = len(offsets)
+    precision = hits / len(detected) if len(detected) else 0.0
+    recall = hits / len(reference) if len(reference) else 0.0
+    return {
+        'f_measure': 2 * precision * recall / (precision + recall) if hits else 0.0,
+        'precision': precision,
+        'recall': recall,
+        'error_ms': float(np.mean(np.abs(offsets))) if hits else float('nan'),
+        'bias_ms': float(np.mean(offsets)) if hits else float('nan'),
+    }
+
+
+def evaluate(detector, case, repeat=3):
+    """Score one detector on one case; runtime is the best of `repeat` runs"""
+    function, sample_rate = DETECTORS[detector]
+    signal, reference = CASES[case](sample_rate)
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        detected = function(signal, sample_rate)
+        best = min(best, time.perf_counter() - start)
+    result = score(reference, detected)
+    result['seconds_per_minute'] = best / (len(signal) / sample_rate / 60.0)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare beat detectors on synthetic signals with known beats')
+    parser.add_argument('--detectors', nargs='+', choices=sorted(DETECTORS), default=list(DETECTORS))
+    parser.add_argument('--cases', nargs='+', choices=sorted(CASES), default=list(CASES))
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per detector and case (best time is kept)')
+    parser.add_argument('--min-f', type=float, default=None,
+                        help='Exit non-zero if any detector scores a lower F-measure on any case')
+    parser.add_argument('--max-seconds-per-minute', type=float, default=None,
+                        help='Exit non-zero if any detector is slower than this per minute of audio')
+    args = parser.parse_args(argv)
+
+    print(f"{'detector':<16} {'case':<12} {'F':>6} {'prec':>6} {'recall':>6} "
+          f"{'err ms':>7} {'bias ms':>8} {'s/min':>8}")
+    failures = []
+    for detector in args.detectors:
+        for case in args.cases:
+            try:
+                result = evaluate(detector, case, args.repeat)
+            except ImportError as e:
+                print(f"{detector:<16} {case:<12} skipped ({e})")
+                break
+            print(f"{detector:<16} {case:<12} {result['f_measure']:6.3f} {result['precision']:6.3f} "
+                  f"{result['recall']:6.3f} {result['error_ms']:7.1f} {result['bias_ms']:8.1f} "
+                  f"{result['seconds_per_minute']:8.4f}")
+            if args.min_f is not None and result['f_measure'] < args.min_f:
+                failures.append(f"{detector} on {case}: F-measure {result['f_measure']:.3f} < {args.min_f}")
+            if (args.max_seconds_per_minute is not None and
+                    result['seconds_per_minute'] > args.max_seconds_per_minute):
+                failures.append(f"{detector} on {case}: {result['seconds_per_minute']:.4f} s/min "
+                                f"> {args.max_seconds_per_minute}")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,329 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from musicvis.tempo import beat_track, onset_envelope
+
+# === Vectorized beat pickers ===
+# The per-frame criteria of the visualizers' beat detectors are evaluated as
+# boolean masks over whole feature arrays; only the minimum-gap rule, which
+# depends on earlier decisions, runs as a short Python pass over the
+# surviving candidates.
+
+
+ROUNDING = np.finfo(np.float64).eps
+
+
+def _threshold_mask(values, threshold, n):
+    """values > threshold, padded with False out to n frames"""
+    mask = np.zeros(n, dtype=bool)
+    count = min(n, len(values))
+    mask[:count] = values[:count] > threshold
+    return mask
+
+
+def _enforce_gap(candidates, min_gap):
+    """Greedily keep candidates at least min_gap frames after the last kept one"""
+    beats = []
+    last = None
+    for i in candidates.tolist():
+        if last is None or i - last >= min_gap:
+            beats.append(i)
+            last = i
+    return beats
+
+
+def detect_beats_enhanced(energy_values, spectral_values, tempo_values,
+                          min_beat_gap=6, confirmation_window=3):
+    """Mk2B multi-criteria beat detection.
+
+    A frame is a beat when its energy is a rising peak above the global
+    adaptive threshold, spectral brightness or flux is also above its
+    threshold, it is the maximum of the surrounding confirmation window,
+    and it is at least 20% louder than the previous frame.
+    """
+    energy = np.asarray(energy_values)
+    spectral = np.asarray(spectral_values)
+    tempo = np.asarray(tempo_values)
+    n = len(energy)
+
+    if n < 10:
+        return []
+
+    # Adaptive thresholding
+    energy_threshold = np.mean(energy) + 0.5 * np.std(energy)
+    spectral_threshold = np.mean(spectral) + 0.3 * np.std(spectral) if len(spectral) else 0
+    tempo_threshold = np.mean(tempo) + 0.4 * np.std(tempo) if len(tempo) else 0
+
+    w = confirmation_window
+    current = energy[w:n - w]
+    previous = energy[w - 1:n - w - 1]
+    following = energy[w + 1:n - w + 1]
+
+    energy_peak = (current > energy_threshold) & (current > previous) & (current > following)
+    spectral_peak = _threshold_mask(spectral, spectral_threshold, n)[w:n - w]
+    tempo_peak = _threshold_mask(tempo, tempo_threshold, n)[w:n - w]
+
+    # Confirmation: the frame dominates its +-w neighbourhood
+    local_max = current >= sliding_window_view(energy, 2 * w + 1).max(axis=1)
+    # Significant energy increase over the previous frame
+    rising = current > previous * 1.2
+
+    candidates = np.flatnonzero(energy_peak & (spectral_peak | tempo_peak) & local_max & rising) + w
+    return _enforce_gap(candidates, min_beat_gap)
+
+
+def _rolling_sums(values, length):
+    """Sum of every window values[k:k + length], in O(n).
+
+    Windows are stitched from suffix sums of one length-sized block and
+    prefix sums of the next, so rounding error is bounded by the window
+    length instead of growing with the whole cumulative sum.
+    """
+    n = len(values)
+    blocks = -(-n // length)
+    padded = np.zeros(blocks * length)
+    padded[:n] = values
+    padded = padded.reshape(blocks, length)
+    prefix = np.cumsum(padded, axis=1).ravel()
+    suffix = np.cumsum(padded[:, ::-1], axis=1)[:, ::-1].ravel()
+
+    starts = np.arange(n - length + 1)
+    tails = np.where(starts % length == 0, 0.0, prefix[starts + length - 1])
+    return suffix[starts] + tails
+
+
+def _local_window_stats(energy, window_size, index):
+    """Exact mean/std of the detection window around one frame"""
+    local_window = energy[max(0, index - window_size):min(len(energy), index + window_size)]
+    return np.mean(local_window), np.std(local_window)
+
+
+def detect_beats_adaptive(energy_values, spectral_values, duration,
+                          window_size=20, beat_threshold=0.3, min_beat_gap=6):
+    """Mk1 beat detection with a local adaptive threshold.
+
+    A frame is a beat when it is a rising peak above max(beat_threshold,
+    local mean + std/2) over the surrounding 2*window_size frames, or when
+    the spectral novelty is high and it is 20% above the local mean. If
+    fewer than 0.5 beats per second are found, a beat is added every 30
+    frames wherever no detected beat lies within 5 frames.
+    """
+    energy = np.asarray(energy_values)
+    spectral = np.asarray(spectral_values)
+    n = len(energy)
+    if n <= 4:
+        return []
+
+    beats = []
+    count = n - 2 * window_size
+    if count > 0:
+        length = 2 * window_size
+        # Window statistics in double precision from O(n) rolling sums
+        wide = energy.astype(np.float64)
+        sums = _rolling_sums(wide, length)[:count]
+        squares = _rolling_sums(wide * wide, length)[:count] / length
+        local_mean = sums / length
+        local_var = np.maximum(squares - local_mean * local_mean, 0.0)
+        local_std = np.sqrt(local_var)
+        adaptive = local_mean + local_std * 0.5
+
+        current = energy[window_size:n - window_size]
+        previous = energy[window_size - 1:n - window_size - 1]
+        following = energy[window_size + 1:n - window_size + 1]
+        novelty = _threshold_mask(spectral, 0.6, n)[window_size:n - window_size]
+
+        use_adaptive = adaptive > beat_threshold
+        is_peak = (np.where(use_adaptive, current > adaptive, current > beat_threshold) &
+                   (current > previous) & (current > following))
+        is_peak |= novelty & (current > local_mean * 1.2)
+
+        # Frames whose decision sits within rounding distance of a threshold
+        # are re-evaluated with the exact windowed mean/std
+        scale = 16 * length * ROUNDING
+        mean_error = scale * np.sqrt(squares)
+        var_error = 2 * scale * (squares + local_mean * local_mean)
+        std_error = np.sqrt(local_var + var_error) - np.sqrt(np.maximum(local_var - var_error, 0.0))
+        margin = 2 * (mean_error + std_error)
+        ambiguous = ((np.abs(adaptive - beat_threshold) <= margin) |
+                     (np.abs(current - adaptive) <= margin) |
+                     (novelty & (np.abs(current - local_mean * 1.2) <= 2 * margin)))
+
+        for offset in np.flatnonzero(ambiguous).tolist():
+            i = offset + window_size
+            mean, std = _local_window_stats(wide, window_size, i)
+            threshold = max(beat_threshold, mean + std * 0.5)
+            peak = energy[i] > threshold and energy[i] > energy[i-1] and energy[i] > energy[i+1]
+            if i < len(spectral) and spectral[i] > 0.6:
+                peak = peak or energy[i] > mean * 1.2
+            is_peak[offset] = peak
+
+        beats = _enforce_gap(np.flatnonzero(is_peak) + window_size, min_beat_gap)
+
+    return _add_guaranteed_beats(beats, n, duration)
+
+
+def _add_guaranteed_beats(beats, n, duration):
+    """Below 0.5 beats per second, add a beat every 30 frames clear of detected ones"""
+    if len(beats) < duration * 0.5:
+        grid = np.arange(0, n, 30)
+        blocked = np.zeros(len(grid), dtype=bool)
+        if beats:
+            # Nearest detected beat on either side of each grid frame
+            detected = np.asarray(beats)
+            position = np.searchsorted(detected, grid)
+            before = detected[np.maximum(position - 1, 0)]
+            after = detected[np.minimum(position, len(detected) - 1)]
+            blocked = (np.abs(grid - before) < 5) | (np.abs(grid - after) < 5)
+        beats.extend(grid[~blocked].tolist())
+    return beats
+
+
+# === Coarse-to-fine beat pickers ===
+# Same decisions as the detectors above, in two stages. A max-pooled copy of
+# the envelope (COARSE_FACTOR frames per sample) rules out every block whose
+# loudest frame cannot pass a necessary condition - a beat always exceeds a
+# fixed energy floor or has high spectral novelty. The full criteria then
+# run only on the frames of the surviving blocks, so the fine stage scales
+# with the number of onset regions rather than the length of the track.
+
+COARSE_FACTOR = 8
+
+
+def _coarse_candidates(n, first, last, *conditions):
+    """Frames in [first, last) whose COARSE_FACTOR block passes any (values, threshold) condition"""
+    blocks = -(-n // COARSE_FACTOR)
+    keep = np.zeros(blocks, dtype=bool)
+    for values, threshold in conditions:
+        pooled = np.full(blocks * COARSE_FACTOR, -np.inf)
+        count = min(n, len(values))
+        pooled[:count] = values[:count]
+        keep |= pooled.reshape(blocks, COARSE_FACTOR).max(axis=1) > threshold
+    frames = (np.flatnonzero(keep)[:, np.newaxis] * COARSE_FACTOR + np.arange(COARSE_FACTOR)).ravel()
+    return frames[(frames >= first) & (frames < last)]
+
+
+def _padded(values, n, fill):
+    """values as float64, padded with fill out to n frames"""
+    padded = np.full(n, fill, dtype=np.float64)
+    count = min(n, len(values))
+    padded[:count] = values[:count]
+    return padded
+
+
+def detect_beats_enhanced_coarse(energy_values, spectral_values, tempo_values,
+                                 min_beat_gap=6, confirmation_window=3):
+    """detect_beats_enhanced in two stages; returns the same beats.
+
+    Beats must exceed the global energy threshold, so only blocks whose
+    peak energy does are examined frame by frame.
+    """
+    energy = np.asarray(energy_values)
+    spectral = np.asarray(spectral_values)
+    tempo = np.asarray(tempo_values)
+    n = len(energy)
+
+    if n < 10:
+        return []
+
+    energy_threshold = np.mean(energy) + 0.5 * np.std(energy)
+    spectral_threshold = np.mean(spectral) + 0.3 * np.std(spectral) if len(spectral) else 0
+    tempo_threshold = np.mean(tempo) + 0.4 * np.std(tempo) if len(tempo) else 0
+
+    w = confirmation_window
+    frames = _coarse_candidates(n, w, n - w, (energy, energy_threshold))
+    current = energy[frames]
+    previous = energy[frames - 1]
+    following = energy[frames + 1]
+
+    spectral_peak = _padded(spectral, n, -np.inf)[frames] > spectral_threshold
+    tempo_peak = _padded(tempo, n, -np.inf)[frames] > tempo_threshold
+    neighbourhood = energy[frames[:, np.newaxis] + np.arange(-w, w + 1)]
+
+    is_beat = ((current > energy_threshold) & (current > previous) & (current > following) &
+               (spectral_peak | tempo_peak) & (current >= neighbourhood.max(axis=1)) &
+               (current > previous * 1.2))
+    return _enforce_gap(frames[is_beat], min_beat_gap)
+
+
+def detect_beats_adaptive_coarse(energy_values, spectral_values, duration,
+                                 window_size=20, beat_threshold=0.3, min_beat_gap=6):
+    """detect_beats_adaptive in two stages; returns the same beats.
+
+    A beat is above beat_threshold or has spectral novelty above 0.6, so
+    only blocks that reach either are examined, each frame with the exact
+    mean/std of its own window.
+    """
+    energy = np.asarray(energy_values)
+    spectral = np.asarray(spectral_values)
+    n = len(energy)
+    if n <= 4:
+        return []
+
+    frames = _coarse_candidates(n, window_size, n - window_size,
+                                (energy, beat_threshold), (spectral, 0.6))
+    # Only rising peaks above the floor, or novel frames, need window statistics
+    current = energy[frames]
+    rising_peak = (current > beat_threshold) & (current > energy[frames - 1]) & (current > energy[frames + 1])
+    novelty = _padded(spectral, n, -np.inf)[frames] > 0.6
+    keep = rising_peak | novelty
+    frames, current, rising_peak, novelty = frames[keep], current[keep], rising_peak[keep], novelty[keep]
+
+    windows = energy.astype(np.float64)[frames[:, np.newaxis] + np.arange(-window_size, window_size)]
+    local_mean = np.mean(windows, axis=1)
+    local_std = np.std(windows, axis=1)
+    threshold = np.maximum(beat_threshold, local_mean + local_std * 0.5)
+
+    is_peak = rising_peak & (current > threshold)
+    is_peak |= novelty & (current > local_mean * 1.2)
+
+    beats = _enforce_gap(frames[is_peak], min_beat_gap)
+    return _add_guaranteed_beats(beats, n, duration)
+
+
+def detect_beats_tempo(energy_values, frame_rate, bands=None):
+    """(bpm, beats): beats on a tempo grid phase-locked to the onsets (see musicvis.tempo).
+
+    The onset envelope is the summed per-band onset strength when band
+    energies are available, otherwise the rectified rise of the energy.
+    """
+    if bands is not None and len(bands):
+        envelope = bands.onset.sum(axis=1)
+    else:
+        envelope = onset_envelope(energy_values)
+    bpm, beats = beat_track(envelope, frame_rate)
+    return bpm, beats.tolist()
+
+
+def match_beats(reference, estimated, tolerance):
+    """Pair estimated beats one-to-one with reference beats within tolerance frames.
+
+    Each reference beat, in order, takes the nearest still-unmatched
+    estimated beat inside its window. Returns the signed offsets
+    (estimated - reference) of the matched pairs.
+    """
+    estimated = np.sort(np.asarray(estimated, dtype=np.int64))
+    used = np.zeros(len(estimated), dtype=bool)
+    offsets = []
+    for beat in np.sort(np.asarray(reference, dtype=np.int64)).tolist():
+        low = np.searchsorted(estimated, beat - tolerance, 'left')
+        high = np.searchsorted(estimated, beat + tolerance, 'right')
+        candidates = [j for j in range(low, high) if not used[j]]
+        if candidates:
+            nearest = min(candidates, key=lambda j: abs(estimated[j] - beat))
+            used[nearest] = True
+            offsets.append(int(estimated[nearest]) - beat)
+    return np.array(offsets, dtype=np.int64)
+
+
+def beat_agreement(reference, estimated, tolerance):
+    """Precision, recall, F-measure and mean absolute offset (frames) of estimated beats"""
+    offsets = match_beats(reference, estimated, tolerance)
+    precision = len(offsets) / len(estimated) if len(estimated) else float(len(reference) == 0)
+    recall = len(offsets) / len(reference) if len(reference) else float(len(estimated) == 0)
+    f_measure = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {
+        'precision': precision,
+        'recall': recall,
+        'f_measure': f_measure,
+        'mean_offset': float(np.mean(np.abs(offsets))) if len(offsets) else 0.0,
+    }
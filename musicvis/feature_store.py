@@ -0,0 +1,181 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import zipfile
+
+import numpy as np
+
+from musicvis.pcm_cache import DEFAULT_CACHE_DIR, file_digest
+
+# === Persistent feature store ===
+# Analysis results (feature arrays, beats, tempo) are saved as one .npz per
+# entry, named after a hash of the input's content plus the analyzer name,
+# version and parameters. A small SQLite index records each entry's size and
+# last use for LRU eviction, and remembers file digests by path, size and
+# mtime (through the PCM cache's file_digest) so a cache hit does not rehash
+# a large video.
+
+DEFAULT_MAX_BYTES = 512 * 1024 ** 2  # 512 MiB
+META_KEY = '__meta__'
+
+
+class FeatureStoreError(RuntimeError):
+    """Raised when a feature file is unreadable or was made by another analyzer"""
+
+
+def save_features(file, features, meta):
+    """Write a dict of arrays/scalars plus a JSON-able meta dict to an .npz file"""
+    arrays = {name: np.asarray(value) for name, value in features.items()}
+    arrays[META_KEY] = np.array(json.dumps(meta, sort_keys=True))
+    with open(file, 'wb') as f:
+        np.savez(f, **arrays)
+
+
+def load_features(file, analyzer=None):
+    """Read a feature file; returns (features, meta).
+
+    0-d arrays come back as plain Python scalars. When analyzer is given the
+    file must have been written by that analyzer.
+    """
+    try:
+        with np.load(file, allow_pickle=False) as data:
+            meta = json.loads(str(data[META_KEY]))
+            features = {name: data[name] for name in data.files if name != META_KEY}
+    except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile) as e:
+        raise FeatureStoreError(f"Could not read features from {file}: {e}") from e
+    if analyzer is not None and meta.get('analyzer') != analyzer:
+        raise FeatureStoreError(f"{file} holds {meta.get('analyzer')} features, not {analyzer}")
+    for name, value in features.items():
+        if value.ndim == 0:
+            features[name] = value.item()
+    return features, meta
+
+
+class FeatureStore:
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory or os.path.join(DEFAULT_CACHE_DIR, 'features')
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+        self.index = os.path.join(self.directory, 'index.sqlite')
+        with self._connect() as db:
+            db.execute('CREATE TABLE IF NOT EXISTS entries ('
+                       'key TEXT PRIMARY KEY, bytes INTEGER, last_used REAL, source TEXT, analyzer TEXT)')
+
+    def _connect(self):
+        return sqlite3.connect(self.index, timeout=30)
+
+    def digest(self, path):
+        """SHA-256 of a file's contents, remembered in the store's index (see file_digest)"""
+        return file_digest(path, self.index)
+
+    def key(self, path, analyzer, version, params):
+        """Entry key for an input file and the analysis settings that shape its features"""
+        description = json.dumps({'content': self.digest(path), 'analyzer': analyzer,
+                                  'version': version, 'params': params}, sort_keys=True)
+        return hashlib.sha256(description.encode('utf-8')).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def get(self, key):
+        """Cached features for a key as a dict (see load_features), or None on a miss"""
+        entry = self.entry_path(key)
+        try:
+            features, _ = load_features(entry)
+        except FeatureStoreError:
+            # Missing or unreadable (e.g. truncated) - drop it and treat as a miss
+            try:
+                os.unlink(entry)
+            except OSError:
+                pass
+            with self._connect() as db:
+                db.execute('DELETE FROM entries WHERE key = ?', (key,))
+            return None
+        with self._connect() as db:
+            updated = db.execute('UPDATE entries SET last_used = ? WHERE key = ?', (time.time(), key))
+            if updated.rowcount == 0:
+                # Entry file outlived its index row - track it again
+                db.execute('INSERT INTO entries VALUES (?, ?, ?, NULL, NULL)',
+                           (key, os.path.getsize(entry), time.time()))
+        return features
+
+    def put(self, key, features, meta):
+        """Store features under a key and evict old entries past the size cap"""
+        entry = self.entry_path(key)
+        temp_entry = f"{entry}.{os.getpid()}.tmp"
+        save_features(temp_entry, features, meta)
+        os.replace(temp_entry, entry)
+        with self._connect() as db:
+            db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)',
+                       (key, os.path.getsize(entry), time.time(), meta.get('source'), meta.get('analyzer')))
+        self.evict(keep=key)
+
+    def evict(self, keep=None):
+        """Delete least-recently-used entries until the store fits its cap"""
+        with self._connect() as db:
+            rows = db.execute('SELECT key, bytes FROM entries ORDER BY last_used').fetchall()
+            total = sum(size for _, size in rows)
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                if key == keep:
+                    continue
+                try:
+                    os.unlink(self.entry_path(key))
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    continue
+                db.execute('DELETE FROM entries WHERE key = ?', (key,))
+                total -= size
+
+
+def resolve_features(path, analyzer, version, params, analyze, store=None, features_file=None,
+                     analyze_only=False):
+    """Features for one run, as a dict, in the mode picked on the command line.
+
+    Rendering with a features_file loads that file and skips analysis.
+    Otherwise the store is consulted and analyze() - which returns
+    (features, cacheable) - runs on a miss; with analyze_only the result is
+    also written to features_file when one is given.
+    """
+    if features_file is not None and not analyze_only:
+        features, _ = load_features(features_file, analyzer)
+        print(f"Loaded {analyzer} features from {features_file}")
+        return features
+
+    meta = {'analyzer': analyzer, 'version': version, 'params': params, 'source': os.path.abspath(path)}
+    key = store.key(path, analyzer, version, params) if store is not None else None
+    features = store.get(key) if key is not None else None
+    if features is not None:
+        print(f"Loaded cached {analyzer} features")
+    else:
+        features, cacheable = analyze()
+        if key is not None and cacheable:
+            store.put(key, features, meta)
+    if analyze_only and features_file is not None:
+        save_features(features_file, features, meta)
+        print(f"Features written to {features_file}")
+    return features
+
+
+def add_feature_arguments(parser):
+    """Register the feature store and analyze/render mode options on an argparse parser"""
+    parser.add_argument('--no-feature-cache', action='store_true',
+                        help='Always re-run audio analysis instead of using the feature store')
+    parser.add_argument('--feature-cache-size-mb', type=int, default=DEFAULT_MAX_BYTES // 1024 ** 2,
+                        help='Size cap for the feature store in MiB (least recently used entries are evicted)')
+    parser.add_argument('--analyze-only', action='store_true',
+                        help='Analyze the audio, store the features (and write --features FILE) and exit')
+    parser.add_argument('--features', metavar='FILE', default=None,
+                        help='Render from a saved feature file instead of analyzing '
+                             '(with --analyze-only: where to save the features)')
+
+
+def feature_store_from_args(args):
+    """Build the FeatureStore selected on the command line (None when disabled)"""
+    if args.no_feature_cache:
+        return None
+    return FeatureStore(max_bytes=args.feature_cache_size_mb * 1024 ** 2)
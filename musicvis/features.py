@@ -0,0 +1,382 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# === Block-streaming feature extraction ===
+# Audio arrives in fixed-size blocks (see musicvis.audio.stream_audio). Each
+# analyzer cuts the blocks into frames, carrying the samples a frame still
+# needs over to the next block, and appends per-frame features to compact
+# float32 buffers. Only one block of raw audio is ever resident; global
+# normalization runs afterwards over the small feature arrays.
+
+FRAME_BATCH = 256  # Frames per vectorized step, bounds temporary arrays
+
+# Frequency bands (Hz) for the multiband energies; None means up to Nyquist
+BANDS = (('bass', 20.0, 250.0), ('mid', 250.0, 2000.0), ('treble', 2000.0, None))
+
+
+class FeatureBuffer:
+    """Growable float32 array for per-frame features of unknown final length"""
+
+    def __init__(self, capacity=4096):
+        self.data = np.empty(capacity, dtype=np.float32)
+        self.size = 0
+
+    def extend(self, values):
+        count = len(values)
+        if self.size + count > len(self.data):
+            grown = np.empty(max(len(self.data) * 2, self.size + count), dtype=np.float32)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+        self.data[self.size:self.size + count] = values
+        self.size += count
+
+    def array(self):
+        return self.data[:self.size]
+
+
+class FrameBlocker:
+    """Cut a stream of sample blocks into (possibly overlapping) frames.
+
+    push() returns a (frames, frame_length) view of every frame that is now
+    complete. holdback frames are only emitted once that many further samples
+    have arrived, which reproduces loops that stop short of the final sample.
+    """
+
+    def __init__(self, frame_length, hop_length, holdback=0):
+        self.frame_length = frame_length
+        self.hop_length = hop_length
+        self.holdback = holdback
+        self.carry = np.zeros(0, dtype=np.float32)
+
+    def push(self, block):
+        data = np.concatenate((self.carry, block)) if len(self.carry) else block
+        usable = len(data) - self.holdback
+        if usable < self.frame_length:
+            self.carry = np.array(data, dtype=np.float32)
+            return data[:0].reshape(0, self.frame_length)
+
+        count = (usable - self.frame_length) // self.hop_length + 1
+        if self.hop_length == self.frame_length:
+            # Back-to-back frames are a plain contiguous reshape
+            frames = data[:count * self.frame_length].reshape(count, self.frame_length)
+        else:
+            frames = sliding_window_view(data, self.frame_length)[::self.hop_length][:count]
+        # Copy the tail: block buffers are reused by the decoder
+        self.carry = np.array(data[count * self.hop_length:], dtype=np.float32)
+        return frames
+
+    def flush(self):
+        """Return the leftover samples that never filled a whole frame"""
+        tail, self.carry = self.carry, np.zeros(0, dtype=np.float32)
+        return tail
+
+
+def normalize_peak(values):
+    """Scale features into [0, 1] by their maximum"""
+    values = np.asarray(values)
+    if len(values) == 0:
+        return values
+    peak = values.max()
+    return values / peak if peak > 0 else values
+
+
+def normalize_percentile(values, percentile=95):
+    """Scale by a percentile and clip at 1.0 so a few outliers don't flatten the rest"""
+    values = np.asarray(values)
+    if len(values) == 0:
+        return values
+    reference = np.percentile(values, percentile)
+    return np.minimum(1.0, values / reference) if reference > 0 else values
+
+
+def band_slices(n_fft, sample_rate):
+    """rfft bin ranges for each of BANDS (every band gets at least one bin)"""
+    bins = n_fft // 2 + 1
+    slices = []
+    for _, low, high in BANDS:
+        start = min(bins - 1, max(1, int(np.ceil(low * n_fft / sample_rate))))
+        stop = bins if high is None else int(np.ceil(high * n_fft / sample_rate))
+        slices.append(slice(start, min(bins, max(start + 1, stop))))
+    return slices
+
+
+class BandEnergies:
+    """Per-frame bass/mid/treble energy and onset strength.
+
+    energy and onset are (frames, 3) float32 arrays with one column per
+    entry of BANDS.
+    """
+
+    def __init__(self, energy, onset):
+        self.energy = energy
+        self.onset = onset
+
+    def __len__(self):
+        return len(self.energy)
+
+    @property
+    def bass(self):
+        return self.energy[:, 0]
+
+    @property
+    def mid(self):
+        return self.energy[:, 1]
+
+    @property
+    def treble(self):
+        return self.energy[:, 2]
+
+    def normalized(self):
+        """Copy with every band scaled into [0, 1] by its own peak"""
+        def scale(values):
+            peak = values.max(axis=0) if len(values) else np.ones(values.shape[1], dtype=np.float32)
+            return values / np.where(peak > 0, peak, 1).astype(np.float32)
+        return BandEnergies(scale(self.energy), scale(self.onset))
+
+    def at(self, index):
+        """(bass, mid, treble) energy of one frame as plain floats"""
+        bass, mid, treble = self.energy[index].tolist()
+        return bass, mid, treble
+
+
+class BandFeatureStream:
+    """Band energies from magnitude spectra another analyzer already computed.
+
+    Band energy is the RMS spectral magnitude inside the band (scaled by
+    1/n_fft); onset strength is its half-wave rectified frame-to-frame rise.
+    """
+
+    def __init__(self, n_fft, sample_rate):
+        self.slices = band_slices(n_fft, sample_rate)
+        self.scale = np.float32(1.0 / n_fft)
+        self.previous = None
+        self.energy = [FeatureBuffer() for _ in BANDS]
+        self.onset = [FeatureBuffer() for _ in BANDS]
+
+    def push(self, magnitude):
+        """Add a (frames, bins) block of magnitude spectra"""
+        if len(magnitude) == 0:
+            return
+        power = magnitude * magnitude
+        energy = np.stack([np.sqrt(np.mean(power[:, bins], axis=1)) for bins in self.slices], axis=1)
+        energy *= self.scale
+        previous = energy[:1] if self.previous is None else self.previous
+        onset = np.maximum(0, np.diff(energy, axis=0, prepend=previous))
+        self.previous = energy[-1:]
+        for k in range(len(BANDS)):
+            self.energy[k].extend(energy[:, k])
+            self.onset[k].extend(onset[:, k])
+
+    def finish(self):
+        return BandEnergies(np.stack([b.array() for b in self.energy], axis=1),
+                            np.stack([b.array() for b in self.onset], axis=1))
+
+
+class ChunkFeatureStream:
+    """Mk1 analysis: high-passed audio reshaped into back-to-back FPS-sized chunks.
+
+    Per chunk: RMS energy (boosted 1.3x when the chunk holds a >2 sigma peak)
+    and the mean absolute sample difference as a brightness proxy. A trailing
+    partial chunk is analyzed too.
+    """
+
+    def __init__(self, chunk_size, highpass=True, sample_rate=None):
+        self.chunk_size = chunk_size
+        self.blocker = FrameBlocker(chunk_size, chunk_size)
+        self.highpass = highpass
+        self.last_sample = None
+        self.samples = 0
+        self.energy = FeatureBuffer()
+        self.spectral = FeatureBuffer()
+        # Band energies need the unfiltered signal, chunked identically
+        self.bands = None
+        if sample_rate is not None:
+            self.bands = BandFeatureStream(chunk_size, sample_rate)
+            self.band_blocker = FrameBlocker(chunk_size, chunk_size)
+
+    def push(self, block):
+        block = np.asarray(block, dtype=np.float32)
+        if len(block) == 0:
+            return
+        raw = block
+        if self.highpass:
+            # First difference, continued across block boundaries
+            previous = block[0] if self.last_sample is None else self.last_sample
+            self.last_sample = block[-1]
+            block = np.diff(block, prepend=previous)
+        self.samples += len(block)
+        chunks = self.blocker.push(block)
+        raw_chunks = self.band_blocker.push(raw) if self.bands is not None else None
+        for start in range(0, len(chunks), FRAME_BATCH):
+            self._analyze(chunks[start:start + FRAME_BATCH])
+            if raw_chunks is not None:
+                self._analyze_bands(raw_chunks[start:start + FRAME_BATCH])
+
+    def finish(self):
+        tail = self.blocker.flush()
+        if len(tail):
+            self._analyze(tail[np.newaxis, :])
+            if self.bands is not None:
+                self._analyze_bands(self.band_blocker.flush()[np.newaxis, :])
+        return self.energy.array(), self.spectral.array()
+
+    def band_energies(self):
+        """BandEnergies for every chunk (None unless a sample_rate was given)"""
+        return self.bands.finish() if self.bands is not None else None
+
+    def _analyze_bands(self, chunks):
+        # Zero-pads the trailing partial chunk to the full FFT length
+        self.bands.push(np.abs(np.fft.rfft(chunks, n=self.chunk_size, axis=1)))
+
+    def _analyze(self, chunks):
+        if len(chunks) == 0:
+            return
+        energy = np.sqrt(np.mean(chunks ** 2, axis=1))
+        if chunks.shape[1] > 10:
+            # Boost energy for chunks holding a sample beyond two sigma
+            threshold = np.std(chunks, axis=1, keepdims=True) * 2
+            energy[(np.abs(chunks) > threshold).any(axis=1)] *= 1.3
+        if chunks.shape[1] > 1:
+            spectral = np.mean(np.abs(np.diff(chunks, axis=1)), axis=1)
+        else:
+            spectral = np.zeros(len(chunks), dtype=np.float32)
+        self.energy.extend(energy)
+        self.spectral.extend(spectral)
+
+
+def rfft_weights(n_fft):
+    """Per-bin weights that turn a sum over rfft bins into a mean over the full FFT.
+
+    The DC bin (and the Nyquist bin for even lengths) appear once in the full
+    spectrum; every other bin appears twice as a conjugate pair.
+    """
+    weights = np.full(n_fft // 2 + 1, 2.0, dtype=np.float32)
+    weights[0] = 1.0
+    if n_fft % 2 == 0:
+        weights[-1] = 1.0
+    return weights / n_fft
+
+
+class WindowFeatureStream:
+    """Mk2B analysis: two-hop windows advanced one hop at a time.
+
+    Per window: RMS energy, mean absolute sample difference, and spectral
+    flux against the previous window (zero for the first two windows).
+    Each window is transformed once with a real FFT; flux is the weighted
+    squared difference of adjacent magnitude rows.
+    """
+
+    def __init__(self, hop_size, sample_rate=None):
+        self.window_size = hop_size * 2
+        # Windows must end strictly before the last sample
+        self.blocker = FrameBlocker(self.window_size, hop_size, holdback=1)
+        self.weights = rfft_weights(self.window_size)
+        self.bands = BandFeatureStream(self.window_size, sample_rate) if sample_rate else None
+        self.previous_magnitude = None
+        self.frames = 0
+        self.samples = 0
+        self.energy = FeatureBuffer()
+        self.spectral = FeatureBuffer()
+        self.flux = FeatureBuffer()
+
+    def push(self, block):
+        block = np.asarray(block, dtype=np.float32)
+        self.samples += len(block)
+        windows = self.blocker.push(block)
+        for start in range(0, len(windows), FRAME_BATCH):
+            self._analyze(windows[start:start + FRAME_BATCH])
+
+    def finish(self):
+        return self.energy.array(), self.spectral.array(), self.flux.array()
+
+    def band_energies(self):
+        """BandEnergies for every window (None unless a sample_rate was given)"""
+        return self.bands.finish() if self.bands is not None else None
+
+    def _analyze(self, windows):
+        count = len(windows)
+        if count == 0:
+            return
+        energy = np.sqrt(np.mean(windows ** 2, axis=1))
+        spectral = np.mean(np.abs(np.diff(windows, axis=1)), axis=1)
+
+        magnitude = np.abs(np.fft.rfft(windows, axis=1))
+        if self.previous_magnitude is None:
+            previous = np.concatenate((magnitude[:1], magnitude[:-1]))
+        else:
+            previous = np.concatenate((self.previous_magnitude, magnitude[:-1]))
+        flux = np.sum((magnitude - previous) ** 2 * self.weights, axis=1)
+        flux[:max(0, 2 - self.frames)] = 0
+        self.previous_magnitude = magnitude[-1:]
+        if self.bands is not None:
+            self.bands.push(magnitude)
+
+        self.frames += count
+        self.energy.extend(energy)
+        self.spectral.extend(spectral)
+        self.flux.extend(flux)
+
+
+class SpectralFeatureStream:
+    """Centered STFT analysis for the robot overlay (librosa-style framing).
+
+    Per frame: RMS energy, spectral centroid (Hz), zero-crossing rate, band
+    energies and an onset-strength envelope (rectified log-magnitude flux)
+    suitable for librosa.beat.beat_track(onset_envelope=...).
+    """
+
+    def __init__(self, sample_rate, hop_length, n_fft=2048):
+        self.sample_rate = sample_rate
+        self.n_fft = n_fft
+        self.blocker = FrameBlocker(n_fft, hop_length)
+        # Center the first frame on sample 0, as librosa does
+        self.blocker.push(np.zeros(n_fft // 2, dtype=np.float32))
+        self.window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(n_fft) / n_fft)).astype(np.float32)
+        self.frequencies = np.fft.rfftfreq(n_fft, 1.0 / sample_rate).astype(np.float32)
+        self.bands = BandFeatureStream(n_fft, sample_rate)
+        self.previous_log = None
+        self.samples = 0
+        self.rms = FeatureBuffer()
+        self.centroid = FeatureBuffer()
+        self.zcr = FeatureBuffer()
+        self.onset = FeatureBuffer()
+
+    def push(self, block):
+        block = np.asarray(block, dtype=np.float32)
+        self.samples += len(block)
+        self._analyze_frames(self.blocker.push(block))
+
+    def finish(self):
+        self._analyze_frames(self.blocker.push(np.zeros(self.n_fft // 2, dtype=np.float32)))
+        return {
+            'rms': self.rms.array(),
+            'centroid': self.centroid.array(),
+            'zcr': self.zcr.array(),
+            'onset': self.onset.array(),
+            'bands': self.bands.finish(),
+        }
+
+    def _analyze_frames(self, frames):
+        for start in range(0, len(frames), FRAME_BATCH):
+            self._analyze(frames[start:start + FRAME_BATCH])
+
+    def _analyze(self, frames):
+        if len(frames) == 0:
+            return
+        self.rms.extend(np.sqrt(np.mean(frames ** 2, axis=1)))
+        signs = np.signbit(frames)
+        self.zcr.extend(np.mean(signs[:, 1:] != signs[:, :-1], axis=1))
+
+        magnitude = np.abs(np.fft.rfft(frames * self.window, axis=1))
+        total = magnitude.sum(axis=1)
+        # Row-wise, not a matrix product: BLAS kernels vary with the batch size
+        self.centroid.extend(np.sum(magnitude * self.frequencies, axis=1) / np.maximum(total, 1e-10))
+        self.bands.push(magnitude)
+
+        log_magnitude = np.log1p(magnitude)
+        if self.previous_log is None:
+            previous = np.concatenate((log_magnitude[:1], log_magnitude[:-1]))
+        else:
+            previous = np.concatenate((self.previous_log, log_magnitude[:-1]))
+        self.onset.extend(np.mean(np.maximum(0, log_magnitude - previous), axis=1))
+        self.previous_log = log_magnitude[-1:]
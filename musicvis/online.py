@@ -0,0 +1,177 @@
+from collections import deque
+
+import numpy as np
+
+from musicvis.features import FRAME_BATCH, FrameBlocker, band_slices
+from musicvis.timeline import FeatureTimeline
+
+# === Causal online analysis ===
+# Live input never offers the whole track, so nothing here looks further
+# ahead than a fixed number of frames: each frame ends at the newest sample
+# instead of being centered on it, normalization divides by a slowly
+# decaying running peak instead of the global maximum, and the beat picker
+# compares an onset with its recent history plus LOOKAHEAD frames ahead.
+
+LOOKAHEAD = 2  # Frames a beat decision waits for before it is final
+HISTORY_SECONDS = 4.0  # Onset history behind the adaptive beat threshold
+RELEASE_SECONDS = 10.0  # Half-life of the running normalization peaks
+BEAT_DECAY = 0.7  # Per-frame falloff of beat strength after a beat
+TEMPO_BEATS = 8  # Recent beat intervals behind the tempo estimate
+
+
+class RunningPeak:
+    """Decaying maximum for causal [0, 1] normalization of scalars or arrays"""
+
+    def __init__(self, half_life_frames, floor=1e-6):
+        self.decay = 0.5 ** (1.0 / max(1.0, half_life_frames))
+        self.floor = floor
+        self.peak = floor
+
+    def normalize(self, value):
+        self.peak = np.maximum(np.maximum(value, self.peak * self.decay), self.floor)
+        return value / self.peak
+
+
+class OnlineAnalyzer:
+    """Per-frame features and beats from audio blocks as they arrive.
+
+    push() takes the next block of mono samples and returns a FeatureTimeline
+    of the frames that became final; flush() returns the rest once the input
+    ends. Frame i covers the n_fft samples ending at sample (i + 1) * hop and
+    is emitted once frame i + lookahead is complete, so output trails input
+    by a fixed lookahead * hop samples (the latency attribute, in seconds)
+    plus the time it takes a block to arrive.
+    """
+
+    def __init__(self, sample_rate, fps=30, n_fft=2048, lookahead=LOOKAHEAD,
+                 history_seconds=HISTORY_SECONDS, min_beat_gap=6):
+        self.sample_rate = sample_rate
+        self.fps = fps
+        self.hop_length = int(sample_rate / fps)
+        self.n_fft = max(n_fft, self.hop_length)
+        self.lookahead = lookahead
+        self.latency = lookahead * self.hop_length / sample_rate
+        self.min_beat_gap = min_beat_gap
+
+        self.blocker = FrameBlocker(self.n_fft, self.hop_length)
+        # Prime with silence so frame 0 ends at sample hop_length
+        self.blocker.push(np.zeros(self.n_fft - self.hop_length, dtype=np.float32))
+        self.window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(self.n_fft) / self.n_fft)).astype(np.float32)
+        self.frequencies = np.fft.rfftfreq(self.n_fft, 1.0 / sample_rate).astype(np.float32)
+        self.slices = band_slices(self.n_fft, sample_rate)
+        self.previous_log = None
+
+        half_life = RELEASE_SECONDS * fps
+        self.energy_peak = RunningPeak(half_life)
+        self.centroid_peak = RunningPeak(half_life)
+        self.band_peak = RunningPeak(half_life)
+
+        # Ring buffer of recent onsets, and frames still inside the lookahead
+        self.history = np.zeros(max(2, int(history_seconds * fps)), dtype=np.float32)
+        self.history_count = 0
+        self.pending = deque()
+
+        self.emitted = 0
+        self.last_beat = None
+        self.strength = 0.0
+        self.recent_bpm = deque(maxlen=TEMPO_BEATS)
+        self.tempo = None
+
+    @property
+    def tempo_factor(self):
+        """Recent tempo relative to 120 BPM (1.0 until two beats are found)"""
+        return self.tempo / 120.0 if self.tempo else 1.0
+
+    def push(self, block):
+        self._analyze(self.blocker.push(np.asarray(block, dtype=np.float32)))
+        return self._emit(len(self.pending) - self.lookahead)
+
+    def flush(self):
+        """Analyze the zero-padded final partial frame and emit every pending frame"""
+        tail = self.blocker.flush()
+        if len(tail) > self.n_fft - self.hop_length:
+            frame = np.zeros(self.n_fft, dtype=np.float32)
+            frame[:len(tail)] = tail
+            self._analyze(frame[np.newaxis, :])
+        return self._emit(len(self.pending))
+
+    def frames(self, blocks):
+        """Yield (energy, is_beat, beat_strength, spectral, bands) per frame from a block iterator"""
+        for block in blocks:
+            timeline = self.push(block)
+            for i in range(len(timeline)):
+                yield timeline[i]
+        timeline = self.flush()
+        for i in range(len(timeline)):
+            yield timeline[i]
+
+    def _analyze(self, frames):
+        for start in range(0, len(frames), FRAME_BATCH):
+            batch = frames[start:start + FRAME_BATCH]
+            energy = np.sqrt(np.mean(batch ** 2, axis=1))
+            magnitude = np.abs(np.fft.rfft(batch * self.window, axis=1))
+            # A row-wise sum rather than a matrix product: BLAS picks kernels by
+            # batch size, which would make frames depend on block boundaries
+            centroid = np.sum(magnitude * self.frequencies, axis=1) / np.maximum(magnitude.sum(axis=1), 1e-10)
+            power = magnitude * magnitude
+            bands = np.stack([np.sqrt(np.mean(power[:, bins], axis=1)) for bins in self.slices], axis=1)
+
+            log_magnitude = np.log1p(magnitude)
+            if self.previous_log is None:
+                previous = np.concatenate((log_magnitude[:1], log_magnitude[:-1]))
+            else:
+                previous = np.concatenate((self.previous_log, log_magnitude[:-1]))
+            onset = np.mean(np.maximum(0, log_magnitude - previous), axis=1)
+            self.previous_log = log_magnitude[-1:]
+
+            # Running normalization has to see the frames in order
+            for i in range(len(batch)):
+                self.pending.append((self.energy_peak.normalize(float(energy[i])),
+                                     self.centroid_peak.normalize(float(centroid[i])),
+                                     self.band_peak.normalize(bands[i]),
+                                     float(onset[i])))
+
+    def _is_beat(self, index):
+        """Decide whether pending[index] is a beat, from its history and lookahead"""
+        onset = self.pending[index][3]
+        count = min(self.history_count, len(self.history))
+        if onset <= 0 or count == 0:
+            return False
+        if self.last_beat is not None and self.emitted - self.last_beat < self.min_beat_gap:
+            return False
+
+        recent = self.history[(self.history_count - np.arange(1, min(count, self.lookahead) + 1)) % len(self.history)]
+        ahead = [self.pending[i][3] for i in range(index + 1, min(len(self.pending), index + 1 + self.lookahead))]
+        if onset <= recent.max() or (ahead and onset < max(ahead)):
+            return False
+        history = self.history[:count]
+        return onset > history.mean() + history.std()
+
+    def _emit(self, count):
+        energy, spectral, bands, beat_strength, beats = [], [], [], [], []
+        for offset in range(max(0, count)):
+            beat = self._is_beat(0)
+            frame_energy, frame_spectral, frame_bands, onset = self.pending.popleft()
+            self.history[self.history_count % len(self.history)] = onset
+            self.history_count += 1
+
+            self.strength *= BEAT_DECAY
+            if beat:
+                if self.last_beat is not None:
+                    bpm = 60.0 * self.fps / (self.emitted - self.last_beat)
+                    if 60.0 <= bpm <= 200.0:
+                        self.recent_bpm.append(bpm)
+                        self.tempo = float(np.median(self.recent_bpm))
+                self.last_beat = self.emitted
+                self.strength = 1.0
+                beats.append(offset)
+
+            energy.append(frame_energy)
+            spectral.append(frame_spectral)
+            bands.append(frame_bands)
+            beat_strength.append(self.strength)
+            self.emitted += 1
+
+        bands = np.array(bands, dtype=np.float32).reshape(-1, len(self.slices))
+        return FeatureTimeline(len(energy), energy, beats, spectral=spectral,
+                               beat_strength=beat_strength, bands=bands)
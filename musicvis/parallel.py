@@ -0,0 +1,192 @@
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from musicvis.features import FRAME_BATCH, BandEnergies, ChunkFeatureStream, WindowFeatureStream
+
+# === Segment-parallel feature extraction ===
+# The signal is split into runs of frames, one per task. Each task maps the
+# shared signal (no copy per worker), starts its stream a few frames early so
+# every carried state - high-pass sample, previous spectrum, onset history -
+# is warm by its first real frame, and returns only the frames it owns.
+# Every per-frame feature is a pure function of its own samples plus that
+# warm state, so the stitched result is identical to the serial pass;
+# normalization and beat picking run afterwards on the merged arrays.
+
+MIN_SEGMENT_FRAMES = 4 * FRAME_BATCH
+TASKS_PER_WORKER = 4  # Smaller tasks than workers keep the pool balanced
+
+
+def resolve_workers(workers):
+    """Worker count from a CLI value: 0 or less means one per CPU core"""
+    return workers if workers and workers > 0 else (os.cpu_count() or 1)
+
+
+class SharedSignal:
+    """A mono float32 signal that worker processes can map without copying.
+
+    Memory-mapped arrays opened from a file (such as PCM cache entries) are
+    shared through that file; anything else is copied once into a shared
+    memory block, released by close().
+    """
+
+    def __init__(self, audio, length=None):
+        self.memory = None
+        if isinstance(audio, np.memmap) and isinstance(audio.base, mmap.mmap) and audio.dtype == np.float32:
+            self.source = ('file', audio.filename, audio.offset, len(audio))
+            return
+        if audio is None:
+            # Blank block for workers to write into
+            size = length
+        else:
+            audio = np.asarray(audio, dtype=np.float32)
+            size = len(audio)
+        self.memory = shared_memory.SharedMemory(create=True, size=max(1, size * 4))
+        self.source = ('memory', self.memory.name, 0, size)
+        if audio is not None:
+            self.array()[:] = audio
+
+    def array(self):
+        return np.ndarray((self.source[3],), dtype=np.float32, buffer=self.memory.buf)
+
+    def close(self):
+        if self.memory is not None:
+            self.memory.close()
+            self.memory.unlink()
+            self.memory = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _attach(source):
+    """Map a SharedSignal source inside a worker; returns (array, handle)"""
+    kind, name, offset, length = source
+    if kind == 'file':
+        return np.memmap(name, dtype=np.float32, mode='r', offset=offset, shape=(length,)), None
+    memory = shared_memory.SharedMemory(name=name)
+    return np.ndarray((length,), dtype=np.float32, buffer=memory.buf), memory
+
+
+def _release(signal, memory):
+    del signal
+    if memory is not None:
+        memory.close()
+
+
+def _segment_features(source, start, stop, skip, count, stream_type, stream_args):
+    """Run one stream over signal[start:stop] and keep frames skip..skip+count"""
+    signal, memory = _attach(source)
+    try:
+        stream = stream_type(*stream_args)
+        stream.push(signal[start:stop])
+        features = stream.finish()
+        bands = stream.band_energies()
+    finally:
+        _release(signal, memory)
+    kept = slice(skip, skip + count)
+    return tuple(np.array(values[kept]) for values in features), \
+        BandEnergies(np.array(bands.energy[kept]), np.array(bands.onset[kept]))
+
+
+def _segment_frames(total_frames, workers):
+    return max(MIN_SEGMENT_FRAMES, -(-total_frames // (workers * TASKS_PER_WORKER)))
+
+
+def _run_segments(audio, segments, stream_type, stream_args, workers):
+    """Analyze (start, stop, skip, count) segments in a process pool and stitch them"""
+    with SharedSignal(audio) as shared, ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_segment_features, shared.source, start, stop, skip, count,
+                               stream_type, stream_args)
+                   for start, stop, skip, count in segments]
+        results = [future.result() for future in futures]
+
+    columns = zip(*(features for features, _ in results))
+    features = tuple(np.concatenate(values) for values in columns)
+    bands = BandEnergies(np.concatenate([b.energy for _, b in results]),
+                         np.concatenate([b.onset for _, b in results]))
+    return features, bands
+
+
+def chunk_features(audio, chunk_size, sample_rate, workers):
+    """ChunkFeatureStream energy, spectral and bands of a signal, computed in parallel.
+
+    One chunk of warm-up carries the high-pass sample and the band onset
+    state into each segment.
+    """
+    samples = len(audio)
+    total = -(-samples // chunk_size)
+    step = _segment_frames(total, workers)
+    segments = []
+    for first in range(0, total, step):
+        last = min(total, first + step)
+        warmup = 1 if first else 0
+        segments.append(((first - warmup) * chunk_size, min(samples, last * chunk_size), warmup, last - first))
+    (energy, spectral), bands = _run_segments(audio, segments, ChunkFeatureStream,
+                                              (chunk_size, True, sample_rate), workers)
+    return energy, spectral, bands
+
+
+def window_features(audio, hop_size, sample_rate, workers):
+    """WindowFeatureStream energy, spectral, flux and bands of a signal, computed in parallel.
+
+    Two windows of warm-up cover the flux start-up (zero for a stream's
+    first two windows) and the previous spectrum the flux is measured against.
+    """
+    samples = len(audio)
+    window = 2 * hop_size
+    # Windows must end strictly before the last sample, as in the serial stream
+    total = max(0, (samples - 1 - window) // hop_size + 1)
+    step = max(2, _segment_frames(total, workers))
+    segments = []
+    for first in range(0, total, step):
+        last = min(total, first + step)
+        warmup = min(2, first)
+        stop = min(samples, (last - 1) * hop_size + window + 1)
+        segments.append(((first - warmup) * hop_size, stop, warmup, last - first))
+    if not segments:
+        segments = [(0, samples, 0, 0)]
+    (energy, spectral, flux), bands = _run_segments(audio, segments, WindowFeatureStream,
+                                                    (hop_size, sample_rate), workers)
+    return energy, spectral, flux, bands
+
+
+def _stft_segment(source, target, first, last, n_fft, hop_length, window):
+    """Magnitude spectra of frames first..last, written into the shared target"""
+    signal, memory = _attach(source)
+    output, output_memory = _attach(target)
+    try:
+        bins = n_fft // 2 + 1
+        total = target[3] // bins
+        spectra = output.reshape(bins, total)
+        frames = np.lib.stride_tricks.sliding_window_view(signal, n_fft)[::hop_length]
+        for start in range(first, last, FRAME_BATCH):
+            stop = min(last, start + FRAME_BATCH)
+            batch = frames[start:stop].T
+            spectra[:, start:stop] = np.abs(np.fft.rfft(batch * window[:, np.newaxis], axis=0))
+    finally:
+        _release(output, output_memory)
+        _release(signal, memory)
+
+
+def stft_magnitude(padded, n_fft, hop_length, window, workers):
+    """|rfft| of every hop_length-spaced, windowed n_fft frame of an already
+    padded signal, as a (bins, frames) float32 array, computed in parallel"""
+    bins = n_fft // 2 + 1
+    total = max(0, (len(padded) - n_fft) // hop_length + 1)
+    step = _segment_frames(total, workers)
+    window = np.asarray(window, dtype=np.float32)
+    with SharedSignal(padded) as shared, SharedSignal(None, bins * total) as output:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_stft_segment, shared.source, output.source, first,
+                                   min(total, first + step), n_fft, hop_length, window)
+                       for first in range(0, total, step)]
+            for future in futures:
+                future.result()
+        return output.array().reshape(bins, total).copy()
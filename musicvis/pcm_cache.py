@@ -0,0 +1,176 @@
+import hashlib
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+from musicvis.audio import decode_audio
+
+# === Content-addressed PCM cache ===
+# Decoded audio is stored as a float32 .npy file named after the input file's
+# content hash, sample rate and channel count, and handed back as a read-only
+# memory map. Entries are evicted least-recently-used once the cache grows
+# past its size cap. Content hashes are remembered across runs in a small
+# SQLite index in the cache directory, keyed by path, size and mtime, so a
+# cache hit does not rehash a large video.
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    'MUSICVIS_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'musicvis'))
+DEFAULT_MAX_BYTES = 4 * 1024 ** 3  # 4 GiB
+HASH_CHUNK_BYTES = 1 << 20
+STALE_TEMP_SECONDS = 15 * 60  # Unfinished entries untouched this long were left by an interrupted run
+
+_digest_memo = {}
+
+
+def _connect_digests(index):
+    os.makedirs(os.path.dirname(index), exist_ok=True)
+    db = sqlite3.connect(index, timeout=30)
+    db.execute('CREATE TABLE IF NOT EXISTS digests ('
+               'path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, digest TEXT)')
+    return db
+
+
+def file_digest(path, index=None):
+    """SHA-256 of a file's contents, memoized per path/size/mtime.
+
+    With index (an SQLite file) digests are also remembered across runs. The
+    index is only a shortcut: if it cannot be read or written the file is
+    simply hashed.
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    memo_key = (path, stat.st_size, stat.st_mtime_ns)
+    digest = _digest_memo.get(memo_key)
+    if digest is not None:
+        return digest
+
+    row = None
+    if index is not None:
+        try:
+            with _connect_digests(index) as db:
+                row = db.execute('SELECT size, mtime_ns, digest FROM digests WHERE path = ?',
+                                 (path,)).fetchone()
+        except (OSError, sqlite3.Error):
+            pass
+    if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+        digest = row[2]
+    else:
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        if index is not None:
+            try:
+                with _connect_digests(index) as db:
+                    db.execute('INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?)', memo_key + (digest,))
+            except (OSError, sqlite3.Error):
+                pass
+    _digest_memo[memo_key] = digest
+    return digest
+
+
+class PCMCache:
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory or os.path.join(DEFAULT_CACHE_DIR, 'pcm')
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+        self.digest_index = os.path.join(self.directory, 'digests.sqlite')
+
+    def entry_path(self, path, sample_rate, channels=1):
+        """Cache file for a given input and decode layout"""
+        name = f"{file_digest(path, self.digest_index)}-{sample_rate}hz-{channels}ch.npy"
+        return os.path.join(self.directory, name)
+
+    def get(self, path, sample_rate, channels=1):
+        """Return cached samples as a read-only memmap, or None on a miss"""
+        entry = self.entry_path(path, sample_rate, channels)
+        try:
+            audio = np.load(entry, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        # Bump the timestamp so eviction sees this entry as recently used
+        os.utime(entry)
+        return audio
+
+    def put(self, path, sample_rate, channels, audio):
+        """Store decoded samples and return them as a memmap"""
+        entry = self.entry_path(path, sample_rate, channels)
+        temp_entry = f"{entry}.{os.getpid()}.tmp"
+
+        stored = np.lib.format.open_memmap(temp_entry, mode='w+', dtype=np.float32, shape=audio.shape)
+        stored[...] = audio
+        stored.flush()
+        del stored
+        os.replace(temp_entry, entry)
+
+        self.evict(keep=entry)
+        return np.load(entry, mmap_mode='r')
+
+    def load(self, path, sample_rate=22050, channels=1, **decode_kwargs):
+        """Decode through the cache: memmap on a hit, decode and store on a miss"""
+        audio = self.get(path, sample_rate, channels)
+        if audio is None:
+            audio, sample_rate = decode_audio(path, sample_rate, channels, **decode_kwargs)
+            audio = self.put(path, sample_rate, channels, audio)
+        return audio, sample_rate
+
+    def evict(self, keep=None):
+        """Delete least-recently-used entries until the cache fits its cap.
+
+        Unfinished .tmp entries count toward the cap too; stale ones, left
+        behind by an interrupted run, are deleted.
+        """
+        entries = []
+        pending = 0
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if not name.endswith(('.npy', '.tmp')):
+                continue
+            entry = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(entry)
+            except OSError:
+                continue
+            if name.endswith('.npy'):
+                entries.append((stat.st_mtime, stat.st_size, entry))
+                continue
+            if now - stat.st_mtime > STALE_TEMP_SECONDS:
+                try:
+                    os.unlink(entry)
+                    continue
+                except OSError:
+                    pass
+            # Another run may still be writing it
+            pending += stat.st_size
+
+        total = pending + sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if entry == keep:
+                continue
+            try:
+                os.unlink(entry)
+                total -= size
+            except OSError:
+                pass
+
+
+def add_cache_arguments(parser):
+    """Register the PCM cache command line options on an argparse parser"""
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Always decode audio with ffmpeg instead of using the PCM cache')
+    parser.add_argument('--cache-dir', default=None,
+                        help='Directory for cached decoded audio')
+    parser.add_argument('--cache-size-mb', type=int, default=DEFAULT_MAX_BYTES // 1024 ** 2,
+                        help='Size cap for the PCM cache in MiB (least recently used entries are evicted)')
+
+
+def cache_from_args(args):
+    """Build the PCMCache selected on the command line (None when disabled)"""
+    if args.no_cache:
+        return None
+    return PCMCache(args.cache_dir, args.cache_size_mb * 1024 ** 2)
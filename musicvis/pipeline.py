@@ -0,0 +1,143 @@
+import threading
+
+import numpy as np
+
+from musicvis.features import BANDS
+from musicvis.online import OnlineAnalyzer
+from musicvis.timeline import FeatureTimeline, rise_strength
+
+# === Pipelined analysis ===
+# Rendering does not have to wait for the whole track: a background thread
+# streams decoded blocks through the causal OnlineAnalyzer and publishes
+# every finalized run of frames into a preallocated FeatureTimeline. The
+# render loop reads frames as they are published and only waits when it has
+# caught up with the analysis. Decoding (ffmpeg) and the FFTs release the
+# GIL, so analysis and rendering overlap.
+
+PIPELINE_BLOCK_SECONDS = 1.0  # Small blocks keep the time to first frame short
+
+
+def frame_aligned_rate(sample_rate, fps):
+    """Smallest sample rate >= sample_rate whose hop at fps is a whole number of samples"""
+    return -(-int(sample_rate) // int(fps)) * int(fps)
+
+
+class PipelinedFeatures:
+    """FeatureTimeline-style frame lookups that fill in while the render loop runs.
+
+    blocks is an iterator of mono sample blocks (e.g. musicvis.audio.stream_audio).
+    Indexing returns one frame's (energy, is_beat, beat_strength, spectral,
+    bands), blocking until the analysis has reached that frame; frames past
+    the end of the audio read as silence. With rise=True beat strength is
+    the energy-plus-rise of rise_strength instead of the analyzer's decay.
+
+    If decoding or analysis fails, the error is logged and the frames not
+    yet published are filled from fallback(), a FeatureTimeline of synthetic
+    features; without a fallback the error is raised on the next lookup.
+    """
+
+    def __init__(self, blocks, sample_rate, fps, frame_count, rise=False, fallback=None):
+        self.analyzer = OnlineAnalyzer(sample_rate, fps=fps)
+        self.timeline = FeatureTimeline(frame_count, bands=np.zeros((0, len(BANDS)), dtype=np.float32))
+        self.rise = rise
+        self.fallback = fallback
+        self.previous_energy = None
+        self.ready = 0
+        self.done = False
+        self.stopped = False
+        self.error = None
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._run, args=(blocks,), daemon=True)
+        self.thread.start()
+
+    @property
+    def tempo_factor(self):
+        return self.analyzer.tempo_factor
+
+    @property
+    def beat_frames(self):
+        """Indices of the beat frames published so far"""
+        return self.timeline.beat_frames
+
+    def __len__(self):
+        return len(self.timeline)
+
+    def __getitem__(self, index):
+        if index >= self.ready and not self.done:
+            with self.condition:
+                self.condition.wait_for(lambda: index < self.ready or self.done)
+        if self.error is not None:
+            raise self.error
+        return self.timeline[index]
+
+    def close(self):
+        """Stop the analysis early (e.g. when rendering is aborted)"""
+        self.stopped = True
+        self.thread.join()
+
+    def _run(self, blocks):
+        try:
+            for block in blocks:
+                if self.stopped:
+                    break
+                self._publish(self.analyzer.push(block))
+            else:
+                self._publish(self.analyzer.flush())
+        except Exception as e:
+            self._fall_back(e)
+        except BaseException as e:
+            self.error = e
+        finally:
+            close = getattr(blocks, 'close', None)
+            if close is not None:
+                close()
+            with self.condition:
+                self.done = True
+                self.condition.notify_all()
+
+    def _fall_back(self, error):
+        if self.fallback is None:
+            self.error = error
+            return
+        print(f"Pipelined audio analysis failed, using synthetic features: {error}")
+        try:
+            synthetic = self.fallback()
+        except Exception as e:
+            self.error = e
+            return
+        start = self.ready
+        stop = min(len(self.timeline), len(synthetic))
+        target = self.timeline
+        target.energy[start:stop] = synthetic.energy[start:stop]
+        target.spectral[start:stop] = synthetic.spectral[start:stop]
+        target.beat_strength[start:stop] = synthetic.beat_strength[start:stop]
+        target.beat_mask[start:stop] = synthetic.beat_mask[start:stop]
+        if synthetic.bands is not None:
+            target.bands[start:stop] = synthetic.bands[start:stop]
+        with self.condition:
+            self.ready = max(start, stop)
+            self.condition.notify_all()
+
+    def _publish(self, chunk):
+        start = self.ready
+        count = min(len(chunk), len(self.timeline) - start)
+        if count <= 0:
+            return
+        chunk = chunk[:count]
+        stop = start + count
+        target = self.timeline
+        target.energy[start:stop] = chunk.energy
+        target.spectral[start:stop] = chunk.spectral
+        target.bands[start:stop] = chunk.bands
+        target.beat_mask[start:stop] = chunk.beat_mask
+        if self.rise:
+            # Rise over the last published frame carries across chunks
+            previous = chunk.energy[:1] if self.previous_energy is None else self.previous_energy
+            energy = np.concatenate((previous, chunk.energy))
+            target.beat_strength[start:stop] = rise_strength(energy, chunk.beat_frames + 1)[1:]
+            self.previous_energy = chunk.energy[-1:]
+        else:
+            target.beat_strength[start:stop] = chunk.beat_strength
+        with self.condition:
+            self.ready = stop
+            self.condition.notify_all()
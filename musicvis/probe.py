@@ -0,0 +1,130 @@
+import json
+import os
+import subprocess
+from fractions import Fraction
+
+# === Single-pass media probing ===
+# One ffprobe call with JSON output answers every timing question the
+# visualizers ask (duration, frame rate, frame count, audio layout). Results
+# are memoized per path and modification time.
+
+FFPROBE_BINARY = 'ffprobe'
+PROBE_TIMEOUT = 30
+
+_probe_memo = {}
+
+
+class ProbeError(RuntimeError):
+    """Raised when ffprobe cannot read a media file"""
+
+
+class MediaInfo:
+    def __init__(self, path, duration=None, fps=None, frame_count=None,
+                 sample_rate=None, channels=None):
+        self.path = path
+        self.duration = duration        # seconds (float)
+        self.fps = fps                  # video frame rate (Fraction)
+        self.frame_count = frame_count  # video frames (int)
+        self.sample_rate = sample_rate  # audio sample rate (Hz)
+        self.channels = channels        # audio channel count
+
+    @property
+    def has_video(self):
+        return self.fps is not None
+
+    @property
+    def has_audio(self):
+        return self.sample_rate is not None
+
+    def __repr__(self):
+        return (f"MediaInfo({self.path!r}, duration={self.duration}, fps={self.fps}, "
+                f"frame_count={self.frame_count}, sample_rate={self.sample_rate}, "
+                f"channels={self.channels})")
+
+
+def _parse_rate(value):
+    """Parse an ffprobe rational such as '30000/1001' (None for 0/0 or junk)"""
+    try:
+        rate = Fraction(value)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    return rate if rate > 0 else None
+
+
+def _parse_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_probe_output(path, data):
+    """Build a MediaInfo from ffprobe's -show_format -show_streams JSON"""
+    streams = data.get('streams', [])
+    video = next((s for s in streams if s.get('codec_type') == 'video'
+                  and not s.get('disposition', {}).get('attached_pic')), None)
+    audio = next((s for s in streams if s.get('codec_type') == 'audio'), None)
+
+    duration = _parse_float(data.get('format', {}).get('duration'))
+    fps = None
+    frame_count = None
+
+    if video is not None:
+        fps = _parse_rate(video.get('avg_frame_rate')) or _parse_rate(video.get('r_frame_rate'))
+        frame_count = _parse_int(video.get('nb_frames'))
+        if duration is None:
+            duration = _parse_float(video.get('duration'))
+        if duration is None and frame_count and fps:
+            duration = float(frame_count / fps)
+        if frame_count is None and duration and fps:
+            frame_count = int(round(duration * fps))
+
+    sample_rate = None
+    channels = None
+    if audio is not None:
+        sample_rate = _parse_int(audio.get('sample_rate'))
+        channels = _parse_int(audio.get('channels'))
+        if duration is None:
+            duration = _parse_float(audio.get('duration'))
+
+    return MediaInfo(path, duration, fps, frame_count, sample_rate, channels)
+
+
+def probe_media(path):
+    """Probe a media file once with ffprobe (memoized per path/mtime)"""
+    try:
+        stat = os.stat(path)
+    except OSError as e:
+        raise ProbeError(f"Cannot access {path}: {e}") from e
+
+    memo_key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    info = _probe_memo.get(memo_key)
+    if info is not None:
+        return info
+
+    cmd = [
+        FFPROBE_BINARY, '-v', 'error', '-print_format', 'json',
+        '-show_format', '-show_streams', path
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=PROBE_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        raise ProbeError(f"ffprobe failed on {path}: {e}") from e
+    if result.returncode != 0:
+        raise ProbeError(result.stderr.strip() or f"ffprobe exited with status {result.returncode}")
+
+    try:
+        data = json.loads(result.stdout)
+    except ValueError as e:
+        raise ProbeError(f"Unreadable ffprobe output for {path}: {e}") from e
+
+    info = parse_probe_output(path, data)
+    _probe_memo[memo_key] = info
+    return info
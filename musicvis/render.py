@@ -0,0 +1,302 @@
+import math
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pygame
+
+# === Cached rendering helpers ===
+# Per-frame work in the visualizers should scale with what changes, not with
+# how much there is to draw. Static artwork is built once; what the music
+# changes every frame is applied to it as one array operation.
+
+TEXT_CACHE_SIZE = 256  # Rendered strings kept by TextCache
+SURFACE_POOL_BYTES = 64 * 1024 ** 2  # Pixel memory a SurfacePool may hold
+SPRITE_ATLAS_BYTES = 16 * 1024 ** 2  # Pixel memory a SpriteAtlas may hold
+ROTATION_STEP_DEGREES = 2.0  # Angular resolution of RotationCache
+
+
+class GradientBackground:
+    """Full-screen vertical gradient of horizontal strips, drawn from a cached column.
+
+    Strip i of strip_height pixels has color base_color + i / strips * ramp
+    (truncated to integers, as the original per-strip loops did). draw()
+    adds a tint to every strip's color in one NumPy operation, writes the
+    resulting 1-pixel-wide column once and stretches it across the target,
+    so a frame costs two blits instead of one draw call per strip.
+    """
+
+    def __init__(self, size, strip_height, base_color, ramp):
+        self.width, self.height = size
+        self.strip_height = strip_height
+        self.strips = self.height // strip_height
+        self.progress = np.arange(self.strips) / self.strips
+        base = np.asarray(base_color, dtype=np.float64)
+        self.colors = (base + self.progress[:, np.newaxis] * np.asarray(ramp, dtype=np.float64)).astype(np.int32)
+        # Rows past the last whole strip are left as they are
+        self.filled = self.strips * strip_height
+        self.target = pygame.Rect(0, 0, self.width, self.filled)
+        self.column = None
+        self.rows = np.zeros((1, self.filled, 3), dtype=np.uint8)
+
+    def draw(self, surface, tint=0):
+        """Fill surface with the gradient plus tint, clipped to 255.
+
+        tint is added to the strip colors: a scalar or (r, g, b) for the
+        whole screen, or one value (or RGB triple) per strip.
+        """
+        tint = np.asarray(tint, dtype=np.int32)
+        if tint.ndim == 1 and len(tint) == self.strips:
+            tint = tint[:, np.newaxis]
+        colors = np.clip(self.colors + tint, 0, 255)
+        self.rows[0] = np.repeat(colors, self.strip_height, axis=0)
+
+        if self.column is None or self.column.get_bitsize() != surface.get_bitsize():
+            self.column = pygame.Surface((1, self.filled), 0, surface)
+        pygame.surfarray.blit_array(self.column, self.rows)
+        pygame.transform.scale(self.column, (self.width, self.filled), surface.subsurface(self.target))
+
+
+class TextCache:
+    """Rendered text surfaces keyed by (font, text, color, alpha), least recently used evicted first.
+
+    The returned surfaces are shared: blit them, never draw on them or
+    change their alpha (pass alpha here instead).
+    """
+
+    def __init__(self, max_entries=TEXT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.surfaces = OrderedDict()
+
+    def render(self, font, text, color, alpha=None):
+        key = (font, text, color, alpha)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            return surface
+        surface = font.render(text, True, color)
+        if alpha is not None:
+            surface.set_alpha(alpha)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last=False)
+        return surface
+
+
+class HudLayer:
+    """HUD blits that are rebuilt only when the values they show change.
+
+    update(state, build) calls build(*state) - which returns a list of
+    (surface, position) or (surface, position, area) blits - only when state
+    differs from the previous call; draw() replays the cached list in one
+    Surface.blits call. Keeping blits rather than one composited layer
+    leaves every blended pixel exactly as direct drawing would.
+    """
+
+    def __init__(self):
+        self.state = None
+        self.blits = []
+
+    def update(self, state, build):
+        if state != self.state:
+            self.state = state
+            self.blits = build(*state)
+
+    def draw(self, surface):
+        surface.blits(self.blits, doreturn=False)
+
+
+class Gauge:
+    """Horizontal level bar blitted from pre-rendered surfaces.
+
+    track is drawn at the gauge position and the fill at fill_offset from
+    it. fill is either a full-width surface, blitted clipped to the level,
+    or a function that renders the fill at a given pixel width (for shapes
+    clipping would cut, such as rounded bars), called once per width.
+    """
+
+    def __init__(self, track, fill, fill_width, fill_offset=(0, 0)):
+        self.track = track
+        self.fill = fill
+        self.fill_width = fill_width
+        self.fill_offset = fill_offset
+        self.fills = {}
+
+    def draw(self, surface, position, level):
+        """Draw the gauge with its fill int(level * fill_width) pixels wide"""
+        width = min(self.fill_width, max(0, int(level * self.fill_width)))
+        if self.track is not None:
+            surface.blit(self.track, position)
+        if width == 0:
+            return
+        target = (position[0] + self.fill_offset[0], position[1] + self.fill_offset[1])
+        if isinstance(self.fill, pygame.Surface):
+            surface.blit(self.fill, target, (0, 0, width, self.fill.get_height()))
+            return
+        fill = self.fills.get(width)
+        if fill is None:
+            fill = self.fills[width] = self.fill(width)
+        surface.blit(fill, target)
+
+
+def _surface_bytes(surface):
+    return surface.get_width() * surface.get_height() * surface.get_bytesize()
+
+
+class SurfacePool:
+    """Pre-allocated surfaces for per-frame effects.
+
+    get() hands out a surface of the given size and flags, filled with
+    color and with the given surface alpha. Flat surfaces (never drawn on)
+    are kept per fill color, so they are filled once; pass drawn=True to get
+    a scratch surface, shared per size and flags and refilled on every
+    call, to draw on. A surface stays valid until the next get() of the
+    same key: draw it, blit it, move on. Least recently used surfaces are
+    dropped once the pool holds more than max_bytes of pixels.
+    """
+
+    def __init__(self, max_bytes=SURFACE_POOL_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.surfaces = OrderedDict()
+
+    def get(self, size, flags=0, color=None, alpha=None, drawn=False):
+        key = (tuple(size), flags, None if drawn else color)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = self.surfaces[key] = pygame.Surface(size, flags)
+            self.bytes += _surface_bytes(surface)
+            if color is not None and not drawn:
+                surface.fill(color)
+            self._evict()
+        else:
+            self.surfaces.move_to_end(key)
+        if drawn and color is not None:
+            surface.fill(color)
+        surface.set_alpha(alpha)
+        return surface
+
+    def _evict(self):
+        while self.bytes > self.max_bytes and len(self.surfaces) > 1:
+            _, surface = self.surfaces.popitem(last=False)
+            self.bytes -= _surface_bytes(surface)
+
+
+def blend_toward(surface, color, alpha, pool):
+    """Blend the whole surface toward color by alpha / 255, in place.
+
+    Gives what blitting a full-size solid overlay with that surface alpha
+    gives, to within one level per channel for every color, alpha and pixel
+    value, as a multiply and an add blend blit of flat pooled surfaces,
+    which are much cheaper than an alpha blit.
+    """
+    size = surface.get_size()
+    keep = 255 - alpha
+    surface.blit(pool.get(size, color=(keep, keep, keep)), (0, 0), special_flags=pygame.BLEND_RGB_MULT)
+    # The multiply blend rounds up ((x * keep + 255) >> 8), so the added
+    # share is rounded down to match SDL's alpha blend
+    added = tuple((c * alpha) >> 8 for c in color)
+    if any(added):
+        surface.blit(pool.get(size, color=added), (0, 0), special_flags=pygame.BLEND_RGB_ADD)
+
+
+class SpriteAtlas:
+    """Pre-rendered sprites keyed by pose, baked by render(key) on first use.
+
+    render returns (surface, (origin_x, origin_y)): a per-pixel alpha
+    surface and where the drawing's origin lies on it. Sprites are trimmed
+    to their visible pixels and the least recently used are dropped once
+    the atlas holds more than max_bytes, so memory stays bounded however
+    many poses occur; report() sums up size, bake time and hit rate.
+    """
+
+    def __init__(self, render, max_bytes=SPRITE_ATLAS_BYTES):
+        self.render = render
+        self.max_bytes = max_bytes
+        self.sprites = OrderedDict()
+        self.bytes = 0
+        self.bake_seconds = 0.0
+        self.baked = 0
+        self.hits = 0
+
+    def bake(self, keys):
+        """Render sprites ahead of time (e.g. the poses every run needs)"""
+        for key in keys:
+            if key not in self.sprites:
+                self._bake(key)
+
+    def get(self, key):
+        """(surface, (origin_x, origin_y)) of the sprite for key"""
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            return self._bake(key)
+        self.hits += 1
+        self.sprites.move_to_end(key)
+        return sprite
+
+    def draw(self, surface, key, position):
+        """Blit the sprite for key with its origin at position"""
+        sprite, (origin_x, origin_y) = self.get(key)
+        surface.blit(sprite, (position[0] - origin_x, position[1] - origin_y))
+
+    def _bake(self, key):
+        start = time.perf_counter()
+        surface, (origin_x, origin_y) = self.render(key)
+        visible = surface.get_bounding_rect()
+        surface = surface.subsurface(visible).copy()
+        sprite = self.sprites[key] = (surface, (origin_x - visible.x, origin_y - visible.y))
+        self.bytes += _surface_bytes(surface)
+        while self.bytes > self.max_bytes and len(self.sprites) > 1:
+            _, (dropped, _) = self.sprites.popitem(last=False)
+            self.bytes -= _surface_bytes(dropped)
+        self.baked += 1
+        self.bake_seconds += time.perf_counter() - start
+        return sprite
+
+    def report(self):
+        lookups = self.hits + self.baked
+        hit_rate = self.hits / lookups * 100 if lookups else 0.0
+        return (f"{len(self.sprites)} sprites, {self.bytes / 1024 ** 2:.1f} MiB, "
+                f"{self.baked} baked in {self.bake_seconds * 1000:.0f} ms, {hit_rate:.1f}% hits")
+
+
+class RotationCache:
+    """Upright sprites pre-rotated in fixed angular steps with rotozoom.
+
+    upright(key) renders a sprite the way SpriteAtlas.render does, its
+    origin being the point to rotate about; it is called once per key and
+    the upright sprite is kept in its own atlas, so every angle is turned
+    from the same surface. Angles snap to the nearest multiple of
+    step_degrees and each (key, angle) copy is made once and kept in a
+    SpriteAtlas; a finer step turns more smoothly but can hold up to
+    360 / step_degrees copies per upright sprite.
+    """
+
+    def __init__(self, upright, step_degrees=ROTATION_STEP_DEGREES, max_bytes=SPRITE_ATLAS_BYTES):
+        self.step = step_degrees
+        self.uprights = SpriteAtlas(upright, max_bytes)
+        self.atlas = SpriteAtlas(self._rotate, max_bytes)
+
+    def angle(self, degrees):
+        """The cached angle a rotation by degrees is drawn at"""
+        return round(degrees / self.step) * self.step % 360
+
+    def draw(self, surface, key, degrees, position):
+        """Blit the sprite for key turned clockwise by degrees, its origin at position"""
+        self.atlas.draw(surface, (key, self.angle(degrees)), position)
+
+    def report(self):
+        return f"{self.atlas.report()}; {self.uprights.baked} upright renders"
+
+    def _rotate(self, key_angle):
+        key, angle = key_angle
+        sprite, (origin_x, origin_y) = self.uprights.get(key)
+        if angle == 0:
+            return sprite, (origin_x, origin_y)
+        rotated = pygame.transform.rotozoom(sprite, -angle, 1)
+        # rotozoom turns about the sprite's center; carry the origin along
+        radians = math.radians(angle)
+        dx = origin_x - sprite.get_width() / 2
+        dy = origin_y - sprite.get_height() / 2
+        return rotated, (rotated.get_width() / 2 + dx * math.cos(radians) - dy * math.sin(radians),
+                         rotated.get_height() / 2 + dx * math.sin(radians) + dy * math.cos(radians))
@@ -0,0 +1,109 @@
+import numpy as np
+
+# === Autocorrelation tempo tracking ===
+# The tempo is the autocorrelation peak of an onset envelope inside a
+# bounded BPM range (weighted towards a prior tempo). A beat grid is then
+# phase-locked to the envelope with dynamic programming: every frame's
+# score is its onset strength plus the best score of a predecessor roughly
+# one beat period earlier, penalized for deviating from the period.
+
+MIN_BPM = 60.0
+MAX_BPM = 200.0
+PRIOR_BPM = 120.0   # Centre of the log-tempo prior
+PRIOR_OCTAVES = 1.0  # Width of the prior, in octaves
+TIGHTNESS = 100.0   # How strongly beat spacing is held to the period
+
+
+def onset_envelope(values):
+    """Half-wave rectified first difference of a per-frame feature"""
+    values = np.asarray(values, dtype=np.float32)
+    if len(values) == 0:
+        return values
+    return np.maximum(0, np.diff(values, prepend=values[:1]))
+
+
+def autocorrelate(values):
+    """Autocorrelation for non-negative lags, computed via FFT"""
+    n = len(values)
+    size = 1 << int(2 * n - 1).bit_length()
+    spectrum = np.fft.rfft(values, size)
+    return np.fft.irfft(spectrum * np.conj(spectrum), size)[:n]
+
+
+def estimate_tempo(envelope, frame_rate, min_bpm=MIN_BPM, max_bpm=MAX_BPM, prior_bpm=PRIOR_BPM):
+    """Tempo in BPM of an onset envelope sampled at frame_rate frames per second"""
+    envelope = np.asarray(envelope, dtype=np.float64)
+    min_lag = max(1, int(np.floor(60.0 * frame_rate / max_bpm)))
+    max_lag = min(len(envelope) - 2, int(np.ceil(60.0 * frame_rate / min_bpm)))
+    if max_lag <= min_lag or not np.any(envelope):
+        return prior_bpm
+
+    correlation = autocorrelate(envelope - envelope.mean())
+    lags = np.arange(min_lag, max_lag + 1)
+    bpms = 60.0 * frame_rate / lags
+    prior = np.exp(-0.5 * (np.log2(bpms / prior_bpm) / PRIOR_OCTAVES) ** 2)
+    best = lags[np.argmax(correlation[lags] * prior)]
+
+    # Parabolic interpolation for a sub-frame period
+    left, centre, right = correlation[best - 1], correlation[best], correlation[best + 1]
+    curvature = left - 2 * centre + right
+    offset = 0.5 * (left - right) / curvature if curvature < 0 else 0.0
+    period = best + float(np.clip(offset, -0.5, 0.5))
+    return float(np.clip(60.0 * frame_rate / period, min_bpm, max_bpm))
+
+
+def track_beats(envelope, frame_rate, bpm, tightness=TIGHTNESS):
+    """Phase-lock a beat grid at bpm to an onset envelope; returns frame indices.
+
+    Predecessors lie between half and twice the beat period back, so all
+    frames within half a period of each other only depend on earlier scores
+    and are solved together as one vectorized step.
+    """
+    envelope = np.asarray(envelope, dtype=np.float64)
+    n = len(envelope)
+    if n == 0 or not np.any(envelope):
+        return np.zeros(0, dtype=np.int64)
+
+    period = 60.0 * frame_rate / bpm
+    # Smooth the envelope with a Gaussian about 1/32 of a period wide
+    width = max(1, int(round(period / 32.0)))
+    taps = np.arange(-4 * width, 4 * width + 1)
+    local_score = np.convolve(envelope / (envelope.std() or 1.0),
+                              np.exp(-0.5 * (taps / width) ** 2), mode='same')
+
+    min_lag = max(1, int(round(period / 2)))
+    max_lag = max(min_lag, int(round(2 * period)))
+    lags = np.arange(min_lag, max_lag + 1)
+    penalty = -tightness * np.log(lags / period) ** 2
+
+    score = np.zeros(n)
+    backlink = np.full(n, -1, dtype=np.int64)
+    for start in range(0, n, min_lag):
+        frames = np.arange(start, min(n, start + min_lag))
+        previous = frames[:, np.newaxis] - lags
+        valid = previous >= 0
+        candidates = np.where(valid, score[np.maximum(previous, 0)] + penalty, -np.inf)
+        best = np.argmax(candidates, axis=1)
+        best_score = candidates[np.arange(len(frames)), best]
+        has_previous = np.isfinite(best_score)
+        score[frames] = local_score[frames] + np.where(has_previous, best_score, 0.0)
+        backlink[frames] = np.where(has_previous, previous[np.arange(len(frames)), best], -1)
+
+    # Last beat: best cumulative score within the final period
+    tail = max(0, n - int(np.ceil(period)))
+    beat = tail + int(np.argmax(score[tail:]))
+    beats = []
+    while beat >= 0:
+        beats.append(beat)
+        beat = backlink[beat]
+    beats = np.array(beats[::-1], dtype=np.int64)
+
+    # Drop grid beats in leading/trailing silence
+    active = np.flatnonzero(local_score > 0.1 * local_score.max())
+    return beats[(beats >= active[0] - min_lag) & (beats <= active[-1] + min_lag)]
+
+
+def beat_track(envelope, frame_rate, min_bpm=MIN_BPM, max_bpm=MAX_BPM):
+    """Estimate the tempo and track beats; returns (bpm, beat frame indices)"""
+    bpm = estimate_tempo(envelope, frame_rate, min_bpm, max_bpm)
+    return bpm, track_beats(envelope, frame_rate, bpm)
@@ -0,0 +1,87 @@
+import numpy as np
+
+# === Per-frame feature timeline ===
+# Render loops read one video frame's audio features at a time. Keeping them
+# in contiguous typed arrays (with beats as a mask rather than a list) makes
+# every lookup O(1) and lets whole stretches be sliced out in bulk.
+
+
+class FeatureTimeline:
+    """Audio features for every video frame.
+
+    energy, spectral and beat_strength are float32 arrays, bands is a
+    (frames, 3) float32 array of bass/mid/treble levels (or None) and
+    beat_mask is a uint8 array that is 1 on beat frames. Frames past the end
+    of the analyzed audio read as silence.
+    """
+
+    def __init__(self, frame_count, energy=None, beats=(), spectral=None, beat_strength=None, bands=None):
+        self.energy = self._fit(energy, frame_count)
+        self.spectral = self._fit(spectral, frame_count)
+        self.beat_strength = self._fit(beat_strength, frame_count)
+        self.bands = None if bands is None else self._fit(bands, frame_count, width=bands.shape[1])
+
+        # Beats only count where there is analyzed audio
+        analyzed = min(frame_count, len(energy)) if energy is not None else frame_count
+        beats = np.asarray(beats, dtype=np.int64)
+        self.beat_mask = np.zeros(frame_count, dtype=np.uint8)
+        self.beat_mask[beats[(beats >= 0) & (beats < analyzed)]] = 1
+
+    @staticmethod
+    def _fit(values, frame_count, width=None):
+        """Copy values into a zero-padded float32 array of frame_count rows"""
+        shape = frame_count if width is None else (frame_count, width)
+        fitted = np.zeros(shape, dtype=np.float32)
+        if values is not None:
+            count = min(frame_count, len(values))
+            fitted[:count] = values[:count]
+        return fitted
+
+    @classmethod
+    def _view(cls, energy, spectral, beat_strength, bands, beat_mask):
+        timeline = cls.__new__(cls)
+        timeline.energy = energy
+        timeline.spectral = spectral
+        timeline.beat_strength = beat_strength
+        timeline.bands = bands
+        timeline.beat_mask = beat_mask
+        return timeline
+
+    def __len__(self):
+        return len(self.energy)
+
+    def __getitem__(self, index):
+        """A slice gives a FeatureTimeline view; an int gives that frame's values.
+
+        Frame values are (energy, is_beat, beat_strength, spectral, bands)
+        with bands a (bass, mid, treble) tuple or None.
+        """
+        if isinstance(index, slice):
+            return self._view(self.energy[index], self.spectral[index], self.beat_strength[index],
+                              None if self.bands is None else self.bands[index], self.beat_mask[index])
+        bands = None if self.bands is None else tuple(self.bands[index].tolist())
+        return (float(self.energy[index]), bool(self.beat_mask[index]),
+                float(self.beat_strength[index]), float(self.spectral[index]), bands)
+
+    def is_beat(self, index):
+        return 0 <= index < len(self.beat_mask) and bool(self.beat_mask[index])
+
+    @property
+    def beat_frames(self):
+        return np.flatnonzero(self.beat_mask)
+
+
+def rise_strength(energy, beats):
+    """Beat strength from the energy plus its rise over the previous frame.
+
+    Non-zero only on beat frames; clipped to [0, 1].
+    """
+    energy = np.asarray(energy, dtype=np.float32)
+    strength = np.zeros(len(energy), dtype=np.float32)
+    beats = np.asarray(beats, dtype=np.int64)
+    beats = beats[(beats >= 0) & (beats < len(energy))]
+    rise = np.zeros(len(beats), dtype=np.float32)
+    later = beats > 0
+    rise[later] = energy[beats[later]] - energy[beats[later] - 1]
+    strength[beats] = np.clip(energy[beats] + rise, 0, 1)
+    return strength
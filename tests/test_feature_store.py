@@ -0,0 +1,69 @@
+import os
+
+import numpy as np
+import pytest
+
+from musicvis.feature_store import FeatureStore, FeatureStoreError, load_features, resolve_features, save_features
+
+
+def make_input(tmp_path):
+    source = tmp_path / 'input.mp4'
+    source.write_bytes(os.urandom(1000))
+    return str(source)
+
+
+def features():
+    return {'rms': np.linspace(0, 1, 500, dtype=np.float32), 'beats': np.arange(0, 500, 15), 'tempo': 120.0}
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / 'features.npz')
+    save_features(path, features(), {'analyzer': 'robot'})
+    loaded, meta = load_features(path, 'robot')
+    assert meta == {'analyzer': 'robot'}
+    assert loaded['tempo'] == 120.0
+    np.testing.assert_array_equal(loaded['rms'], features()['rms'])
+    with pytest.raises(FeatureStoreError):
+        load_features(path, 'mk1')
+
+
+@pytest.mark.parametrize('damage', ['truncate', 'empty', 'garbage'])
+def test_unreadable_entry_is_a_miss_and_removed(tmp_path, damage):
+    store = FeatureStore(str(tmp_path / 'store'))
+    key = store.key(make_input(tmp_path), 'robot', 1, {})
+    store.put(key, features(), {'analyzer': 'robot'})
+    entry = store.entry_path(key)
+    data = open(entry, 'rb').read()
+    with open(entry, 'wb') as f:
+        f.write({'truncate': data[:len(data) // 2], 'empty': b'', 'garbage': b'not a zip file'}[damage])
+
+    assert store.get(key) is None
+    assert not os.path.exists(entry)
+    assert store.get(key) is None
+
+
+def test_resolve_features_analyzes_once(tmp_path):
+    store = FeatureStore(str(tmp_path / 'store'))
+    source = make_input(tmp_path)
+    calls = []
+
+    def analyze():
+        calls.append(1)
+        return features(), True
+
+    first = resolve_features(source, 'robot', 1, {'fps': 30}, analyze, store)
+    second = resolve_features(source, 'robot', 1, {'fps': 30}, analyze, store)
+    assert len(calls) == 1
+    np.testing.assert_array_equal(first['rms'], second['rms'])
+    resolve_features(source, 'robot', 1, {'fps': 24}, analyze, store)
+    assert len(calls) == 2
+
+
+def test_eviction_keeps_the_newest_entry(tmp_path):
+    store = FeatureStore(str(tmp_path / 'store'), max_bytes=1)
+    source = make_input(tmp_path)
+    keys = [store.key(source, 'robot', 1, {'fps': fps}) for fps in (24, 30)]
+    for key in keys:
+        store.put(key, features(), {'analyzer': 'robot'})
+    assert store.get(keys[0]) is None
+    assert store.get(keys[1]) is not None
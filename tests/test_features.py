@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from musicvis.features import ChunkFeatureStream, SpectralFeatureStream, WindowFeatureStream
+
+SAMPLE_RATE = 22050
+BLOCK_SECONDS = [0.01, 0.37, 1.0, 30.0]
+
+
+def gated_tone(seconds=12.0):
+    rng = np.random.default_rng(1)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    signal = 0.3 * np.sin(2 * np.pi * 220 * t) * (np.sin(2 * np.pi * 2 * t) > 0)
+    return (signal + 0.05 * rng.standard_normal(len(t))).astype(np.float32)
+
+
+def stream(make, signal, block_seconds):
+    size = int(block_seconds * SAMPLE_RATE)
+    analyzer = make()
+    for start in range(0, len(signal), size):
+        analyzer.push(signal[start:start + size])
+    return analyzer
+
+
+def spectral(signal, block_seconds):
+    features = stream(lambda: SpectralFeatureStream(SAMPLE_RATE, 735), signal, block_seconds).finish()
+    bands = features.pop('bands')
+    features['band_energy'], features['band_onset'] = bands.energy, bands.onset
+    return features
+
+
+def chunk(signal, block_seconds):
+    analyzer = stream(lambda: ChunkFeatureStream(735, sample_rate=SAMPLE_RATE), signal, block_seconds)
+    energy, spectral = analyzer.finish()
+    bands = analyzer.band_energies()
+    return {'energy': energy, 'spectral': spectral, 'band_energy': bands.energy, 'band_onset': bands.onset}
+
+
+def window(signal, block_seconds):
+    analyzer = stream(lambda: WindowFeatureStream(735, SAMPLE_RATE), signal, block_seconds)
+    energy, spectral, flux = analyzer.finish()
+    bands = analyzer.band_energies()
+    return {'energy': energy, 'spectral': spectral, 'flux': flux,
+            'band_energy': bands.energy, 'band_onset': bands.onset}
+
+
+@pytest.mark.parametrize('block_seconds', BLOCK_SECONDS)
+@pytest.mark.parametrize('analyze', [spectral, chunk, window])
+def test_features_do_not_depend_on_block_size(analyze, block_seconds):
+    signal = gated_tone()
+    reference = analyze(signal, 0.1)
+    features = analyze(signal, block_seconds)
+    assert features.keys() == reference.keys()
+    for name in reference:
+        np.testing.assert_array_equal(features[name], reference[name], err_msg=name)
+
+
+def test_spectral_frames_are_centered():
+    signal = gated_tone()
+    features = spectral(signal, 1.0)
+    assert len(features['rms']) == 1 + len(signal) // 735
+    assert len(features['band_energy']) == len(features['rms'])
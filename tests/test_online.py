@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from musicvis.online import OnlineAnalyzer
+
+SAMPLE_RATE = 22050
+
+
+def pulse_signal(seconds=10.0, bpm=120.0):
+    """Noise with a loud tone burst on every beat"""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    on_beat = (t * bpm / 60.0) % 1.0 < 0.1
+    signal = 0.02 * rng.standard_normal(len(t)) + 0.5 * on_beat * np.sin(2 * np.pi * 330 * t)
+    return signal.astype(np.float32)
+
+
+def analyze(signal, block_seconds):
+    size = max(1, int(block_seconds * SAMPLE_RATE))
+    analyzer = OnlineAnalyzer(SAMPLE_RATE)
+    return list(analyzer.frames(signal[i:i + size] for i in range(0, len(signal), size)))
+
+
+@pytest.mark.parametrize('block_seconds', [0.001, 0.05, 0.37, 1.0, 10.0])
+def test_frames_do_not_depend_on_block_size(block_seconds):
+    signal = pulse_signal()
+    assert analyze(signal, block_seconds) == analyze(signal, 0.1)
+
+
+def test_one_frame_per_hop_and_beats_on_the_pulses():
+    signal = pulse_signal()
+    frames = analyze(signal, 0.1)
+    analyzer = OnlineAnalyzer(SAMPLE_RATE)
+    assert len(frames) == -(-len(signal) // analyzer.hop_length)
+    assert analyzer.latency == pytest.approx(analyzer.lookahead / 30)
+
+    beats = np.flatnonzero([frame[1] for frame in frames])
+    assert len(beats) >= 15
+    # 120 BPM at 30 fps is one beat every 15 frames
+    assert np.median(np.diff(beats)) == 15
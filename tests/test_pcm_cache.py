@@ -0,0 +1,63 @@
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+from musicvis.pcm_cache import STALE_TEMP_SECONDS, PCMCache, file_digest
+
+
+def write_input(path, size=1000):
+    path.write_bytes(os.urandom(size))
+    return str(path)
+
+
+def test_digest_index_lives_in_the_cache_directory(tmp_path):
+    source = write_input(tmp_path / 'input.mp4')
+    cache = PCMCache(str(tmp_path / 'custom'))
+    cache.entry_path(source, 22050)
+
+    index = tmp_path / 'custom' / 'digests.sqlite'
+    assert index.exists()
+    with sqlite3.connect(str(index)) as db:
+        rows = db.execute('SELECT path, digest FROM digests').fetchall()
+    assert rows == [(os.path.abspath(source), file_digest(source))]
+
+
+
+def age(path, seconds):
+    stamp = time.time() - seconds
+    os.utime(path, (stamp, stamp))
+
+
+def test_eviction_keeps_the_cache_under_its_cap(tmp_path):
+    cache = PCMCache(str(tmp_path), max_bytes=10000)
+    audio = np.zeros(1000, dtype=np.float32)  # 4 kB per entry
+    for i in range(4):
+        cache.put(write_input(tmp_path / f'input{i}.mp4'), 22050, 1, audio)
+
+    entries = sorted(name for name in os.listdir(tmp_path) if name.endswith('.npy'))
+    assert len(entries) == 2
+    assert os.path.exists(cache.entry_path(str(tmp_path / 'input3.mp4'), 22050))
+
+
+def test_stale_temp_files_are_deleted(tmp_path):
+    cache = PCMCache(str(tmp_path), max_bytes=10 ** 6)
+    orphan = tmp_path / 'abc-22050hz-1ch.npy.1234.tmp'
+    orphan.write_bytes(bytes(5000))
+    age(orphan, STALE_TEMP_SECONDS + 60)
+    cache.evict()
+    assert not orphan.exists()
+
+
+def test_unfinished_temp_files_count_toward_the_cap(tmp_path):
+    cache = PCMCache(str(tmp_path), max_bytes=10000)
+    audio = np.zeros(1000, dtype=np.float32)
+    first = cache.put(write_input(tmp_path / 'first.mp4'), 22050, 1, audio).filename
+    age(first, 60)
+    in_progress = tmp_path / 'def-22050hz-1ch.npy.4321.tmp'
+    in_progress.write_bytes(bytes(5000))
+
+    cache.put(write_input(tmp_path / 'second.mp4'), 22050, 1, audio)
+    assert in_progress.exists()
+    assert not os.path.exists(first)
@@ -0,0 +1,95 @@
+import os
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import numpy as np
+import pygame
+import pytest
+
+from musicvis.render import RotationCache, SurfacePool, blend_toward
+
+
+def every_level():
+    """A surface whose pixels cover every (red, green) level pair, blue following red"""
+    levels = np.arange(256)
+    pixels = np.zeros((256, 256, 3), dtype=np.uint8)
+    pixels[:, :, 0] = levels[:, np.newaxis]
+    pixels[:, :, 1] = levels[np.newaxis, :]
+    pixels[:, :, 2] = levels[:, np.newaxis]
+    surface = pygame.Surface((256, 256))
+    pygame.surfarray.blit_array(surface, pixels)
+    return surface
+
+
+@pytest.mark.parametrize('color', [(255, 255, 255), (0, 0, 0), (200, 30, 90)])
+def test_blend_toward_matches_an_alpha_overlay_within_one_level(color):
+    pool = SurfacePool()
+    base = every_level()
+    overlay = pygame.Surface(base.get_size())
+    overlay.fill(color)
+    for alpha in range(256):
+        expected = base.copy()
+        overlay.set_alpha(alpha)
+        expected.blit(overlay, (0, 0))
+        blended = base.copy()
+        blend_toward(blended, color, alpha, pool)
+        difference = np.abs(pygame.surfarray.array3d(expected).astype(int) - pygame.surfarray.array3d(blended))
+        assert difference.max() <= 1, f"alpha {alpha}"
+
+
+def test_surface_pool_reuses_flat_surfaces():
+    pool = SurfacePool(max_bytes=2 * 100 * 100 * 4)
+    red = pool.get((100, 100), color=(255, 0, 0), alpha=10)
+    assert pool.get((100, 100), color=(255, 0, 0), alpha=20) is red
+    assert red.get_alpha() == 20
+    assert pool.get((100, 100), color=(0, 255, 0)) is not red
+    pool.get((100, 100), color=(0, 0, 255))
+    assert pool.bytes <= pool.max_bytes
+
+
+def upright_arrow(key):
+    """A 20x40 bar with a marked top end, origin at its center"""
+    width, height = key
+    sprite = pygame.Surface((width, height), pygame.SRCALPHA)
+    sprite.fill((255, 255, 255))
+    sprite.fill((255, 0, 0), (0, 0, width, 5))
+    return sprite, (width // 2, height // 2)
+
+
+def visible_box(surface):
+    return surface.get_bounding_rect(min_alpha=1)
+
+
+def test_rotation_cache_renders_each_upright_once():
+    calls = []
+
+    def upright(key):
+        calls.append(key)
+        return upright_arrow(key)
+
+    cache = RotationCache(upright, step_degrees=2)
+    target = pygame.Surface((200, 200), pygame.SRCALPHA)
+    for degrees in range(0, 360, 2):
+        cache.draw(target, (20, 40), degrees, (100, 100))
+    cache.draw(target, (10, 30), 90, (100, 100))
+    assert calls == [(20, 40), (10, 30)]
+    assert cache.atlas.baked == 181
+
+
+def test_rotation_cache_snaps_angles_and_keeps_the_origin():
+    cache = RotationCache(upright_arrow, step_degrees=5)
+    assert cache.angle(92.4) == 90
+    assert cache.angle(-2) == 0
+    assert cache.angle(358) == 0
+
+    upright = pygame.Surface((200, 200), pygame.SRCALPHA)
+    cache.draw(upright, (20, 40), 1, (100, 100))
+    assert visible_box(upright) == pygame.Rect(90, 80, 20, 40)
+
+    turned = pygame.Surface((200, 200), pygame.SRCALPHA)
+    cache.draw(turned, (20, 40), 90, (100, 100))
+    box = visible_box(turned)
+    assert abs(box.width - 40) <= 2 and abs(box.height - 20) <= 2
+    assert abs(box.centerx - 100) <= 1 and abs(box.centery - 100) <= 1
+    # Clockwise: the marked top end now points right
+    assert turned.get_at((box.right - 2, box.centery))[:3] == (255, 0, 0)
@@ -0,0 +1,39 @@
+import numpy as np
+
+from musicvis.tempo import autocorrelate, beat_track, onset_envelope
+
+
+FRAME_RATE = 30
+
+
+def click_envelope(bpm, seconds=20, offset=7):
+    envelope = np.zeros(seconds * FRAME_RATE)
+    period = 60.0 * FRAME_RATE / bpm
+    envelope[np.round(np.arange(offset, len(envelope), period)).astype(int)] = 1.0
+    return envelope
+
+
+def test_onset_envelope_keeps_only_rises():
+    assert list(onset_envelope(np.array([1.0, 3.0, 2.0, 5.0]))) == [0, 2, 0, 3]
+
+
+def test_autocorrelate_matches_direct_sum():
+    values = np.random.default_rng(0).standard_normal(50)
+    direct = [np.dot(values[:len(values) - lag], values[lag:]) for lag in range(len(values))]
+    assert np.allclose(autocorrelate(values), direct)
+
+
+def test_beat_track_finds_tempo_and_clicks():
+    for bpm in (90, 120, 150):
+        envelope = click_envelope(bpm)
+        found, beats = beat_track(envelope, FRAME_RATE)
+        assert abs(found - bpm) < 3
+        clicks = np.flatnonzero(envelope)
+        assert len(beats) == len(clicks)
+        # The first beat has nothing before it to anchor the backtrack
+        assert np.all(np.abs(beats[1:] - clicks[1:]) <= 1)
+
+
+def test_beat_track_on_silence():
+    bpm, beats = beat_track(np.zeros(300), FRAME_RATE)
+    assert len(beats) == 0